@@ -0,0 +1,208 @@
+"""
+无界面批量转换：从文件或标准输入读取文章链接（每行一个），
+用进程池并行处理，每篇文章生成一个 PDF，最后写出 summary.json 汇总报告。
+
+用法：
+    python batch.py urls.txt -o out
+    cat urls.txt | python batch.py - -o out -j 4 -w 8
+"""
+import sys
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from core import convert_article
+from downloader import DEFAULT_WORKERS, SessionPool
+from dedup import DEFAULT_THRESHOLD
+from profiles import PROFILES
+from img_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, ImageCache
+from metrics import Metrics, write_prometheus
+from page_cache import STAT_KEYS as PAGE_COUNTERS, PageCache, stats_delta
+from probe import DEFAULT_MAX_ASPECT, DEFAULT_MIN_HEIGHT, DEFAULT_MIN_WIDTH, Prober
+from throttle import Throttler
+from variants import VARIANTS
+
+CACHE_COUNTERS = ('hits', 'misses', 'bytes_saved', 'bytes_downloaded')
+
+# 每个工作进程各自持有的连接池、限速器与缓存，在该进程处理的多篇文章之间复用
+_sessions = None
+_throttler = None
+_cache = None
+_prober = None
+_page_cache = None
+
+
+def _init_worker(workers, cache_dir, cache_bytes, skip_small=None):
+    global _sessions, _throttler, _cache, _prober, _page_cache
+    _sessions = SessionPool(per_host=workers)
+    _throttler = Throttler()
+    if cache_dir:
+        _cache = ImageCache(cache_dir, max_bytes=cache_bytes)
+        _page_cache = PageCache(os.path.join(cache_dir, 'pages'))
+    if skip_small:
+        # skip_small 为 (最小宽, 最小高, 最大宽高比)
+        _prober = Prober(*skip_small, cache=_cache)
+
+
+def _convert(url, out_dir, workers, profile=None, dedup=False, dedup_threshold=None, metrics_path=None,
+             trace_memory=False, optimize=False, split_tall=False, variant=None):
+    start = time.monotonic()
+    before = _cache.stats() if _cache else None
+    pages_before = _page_cache.stats() if _page_cache else None
+    metrics = Metrics(metrics_path, trace_memory=trace_memory, labels={'article': url})
+    try:
+        # 文章之间已经按进程并行，图片规范化就在本进程内做，避免嵌套进程池
+        summary = convert_article(url, out_dir, workers=workers, sessions=_sessions,
+                                  throttler=_throttler, cache=_cache, normalize_processes=1,
+                                  profile=profile, dedup=dedup,
+                                  dedup_threshold=dedup_threshold, metrics=metrics, prober=_prober,
+                                  optimize=optimize, split_tall=split_tall, variant=variant,
+                                  page_cache=_page_cache)
+        # 写进 PDF 的页数为 0 时 convert_article 会抛出异常；有图片下载失败时算部分成功
+        summary['ok'] = bool(summary['pages'])
+        summary['partial'] = bool(summary['failed'])
+    except Exception as e:
+        summary = {'url': url, 'ok': False, 'error': str(e)}
+    summary['metrics'] = metrics.close()
+    if _cache:
+        # 每个进程同一时间只处理一篇文章，前后差值就是这篇文章的缓存统计
+        after = _cache.stats()
+        summary['cache'] = {k: after[k] - before[k] for k in CACHE_COUNTERS}
+        summary['page_cache'] = stats_delta(pages_before, _page_cache.stats())
+    summary['seconds'] = round(time.monotonic() - start, 3)
+    return summary
+
+
+def read_urls(source):
+    lines = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    try:
+        urls = []
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith('#') and line not in urls:
+                urls.append(line)
+        return urls
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def run_batch(urls, out_dir, processes=None, workers=DEFAULT_WORKERS,
+              cache_dir=DEFAULT_CACHE_DIR, cache_bytes=DEFAULT_MAX_BYTES, profile=None,
+              dedup=False, dedup_threshold=None, metrics_path=None, trace_memory=False, skip_small=None,
+              optimize=False, split_tall=False, variant=None):
+    """
+    并行转换多篇文章，返回与 urls 顺序一致的汇总列表。
+    cache_dir 为 None 时不使用缓存。dedup 为 True 时去掉重复图片：dedup_threshold 为 None 时
+    只去掉完全相同的，否则还去掉 dHash 汉明距离不超过它的近似重复图片（见 dedup.py）。
+    metrics_path 为 JSON lines 文件时，各进程把每篇文章的计时事件追加到其中。
+    skip_small 为 (最小宽, 最小高, 最大宽高比) 时先探测尺寸，跳过小图标与分隔线。
+    optimize 为 True 时输出线性化、带缩略图和书签的 PDF（需要 pikepdf）。
+    split_tall 为 True 时超长图按页高切成多页（见 tiles.py）。
+    variant 为下载变体名（见 variants.py），请求更小的格式或宽度以减少下载量。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(workers, cache_dir, cache_bytes, skip_small)) as pool:
+        futures = {pool.submit(_convert, url, out_dir, workers, profile, dedup, dedup_threshold,
+                               metrics_path, trace_memory, optimize, split_tall, variant): url for url in urls}
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            status = summary.get('pdf') if summary['ok'] else summary.get('error', '没有可转换的图片')
+            if summary.get('partial'):
+                status = f"{status}（{len(summary['failed'])} 张图片下载失败）"
+            print(f"[{len(summaries)}/{len(urls)}] {summary['url']} -> {status}", flush=True)
+    return [summaries[url] for url in urls]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量将公众号文章转换为 PDF')
+    parser.add_argument('source', help='文章链接列表文件，每行一个；- 表示从标准输入读取')
+    parser.add_argument('-o', '--out', default='转换图像', help='输出目录')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='并行处理的文章数（进程数）')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS, help='每篇文章的图片下载线程数')
+    parser.add_argument('--report', default=None, help='汇总报告路径，默认 <输出目录>/summary.json')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='图片缓存目录')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help='图片缓存上限（MB），超出后按最近最少使用淘汰')
+    parser.add_argument('--no-cache', action='store_true', help='不使用图片缓存')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='archive',
+                        help='输出体积配置：screen / print 会缩小并重新压缩图片，archive 保留原图')
+    parser.add_argument('--no-dedup', action='store_true', help='保留重复图片')
+    parser.add_argument('--dedup-threshold', type=int, default=None,
+                        help='同时去掉近似重复的图片：256 位 dHash 的汉明距离不超过该值即视为重复'
+                             f'（建议 {DEFAULT_THRESHOLD}，0 表示 dHash 完全相同）；默认只去掉完全相同的图片')
+    parser.add_argument('--skip-small', action='store_true',
+                        help='先用 Range 请求探测图片尺寸，跳过小图标、表情与分隔线')
+    parser.add_argument('--min-width', type=int, default=DEFAULT_MIN_WIDTH, help='--skip-small 的最小宽度（像素）')
+    parser.add_argument('--min-height', type=int, default=DEFAULT_MIN_HEIGHT, help='--skip-small 的最小高度（像素）')
+    parser.add_argument('--max-aspect', type=float, default=DEFAULT_MAX_ASPECT,
+                        help='--skip-small 的最大宽高比（宽 / 高），超过视为分隔线')
+    parser.add_argument('--optimize', action='store_true',
+                        help='输出线性化（快速 Web 查看）、带缩略图和书签的 PDF，需要 pikepdf')
+    parser.add_argument('--split-tall', action='store_true',
+                        help='超长图（高度超过宽度 3 倍）按页高切成多页；非隔行的 8 位 PNG 解码时只占用一页的内存，'
+                             '其他格式仍整张解码')
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='original',
+                        help='下载变体：screen 请求最宽 640 像素的 WebP，webp / jpeg 只换格式，失败时自动改用原图')
+    parser.add_argument('--metrics', default=None, help='把各阶段计时与每张图片的统计追加到该 JSON lines 文件')
+    parser.add_argument('--prometheus', default=None, help='写出 Prometheus textfile（每篇文章一组指标）')
+    parser.add_argument('--trace-memory', action='store_true', help='用 tracemalloc 统计内存峰值（会变慢）')
+    args = parser.parse_args(argv)
+
+    urls = read_urls(args.source)
+    if not urls:
+        print('没有读取到文章链接。')
+        return 1
+
+    start = time.monotonic()
+    summaries = run_batch(urls, args.out, processes=args.processes, workers=args.workers,
+                          cache_dir=None if args.no_cache else args.cache_dir,
+                          cache_bytes=args.cache_size * 1024 ** 2, profile=args.profile,
+                          dedup=not args.no_dedup, dedup_threshold=args.dedup_threshold,
+                          metrics_path=args.metrics, trace_memory=args.trace_memory,
+                          skip_small=(args.min_width, args.min_height, args.max_aspect)
+                          if args.skip_small else None, optimize=args.optimize,
+                          split_tall=args.split_tall, variant=args.variant)
+    pages = {k: sum(s.get('page_cache', {}).get(k, 0) for s in summaries) for k in PAGE_COUNTERS}
+    lookups = pages['hits'] + pages['misses']
+    pages['hit_rate'] = round(pages['hits'] / lookups, 4) if lookups else 0.0
+    report = {
+        'total': len(summaries),
+        'succeeded': sum(1 for s in summaries if s['ok']),
+        'failed': sum(1 for s in summaries if not s['ok']),
+        'partial': sum(1 for s in summaries if s['ok'] and s.get('partial')),
+        'seconds': round(time.monotonic() - start, 3),
+        'cache': {k: sum(s.get('cache', {}).get(k, 0) for s in summaries) for k in CACHE_COUNTERS},
+        'page_cache': pages,
+        'profile': args.profile,
+        'bytes_before': sum(s.get('sizes', {}).get('bytes_before', 0) for s in summaries),
+        'bytes_after': sum(s.get('sizes', {}).get('bytes_after', 0) for s in summaries),
+        'duplicates_removed': sum(len(s.get('removed', [])) for s in summaries),
+        'small_skipped': sum(len(s.get('skipped', [])) for s in summaries),
+        'tall_split': sum(len(s.get('split', [])) for s in summaries),
+        'variant': args.variant,
+        'variant_bytes_saved': sum((s.get('variants') or {}).get('bytes_saved', 0) for s in summaries),
+        'variant_fallbacks': sum((s.get('variants') or {}).get('fallbacks', 0) for s in summaries),
+        'articles': summaries,
+    }
+    if args.prometheus:
+        write_prometheus(args.prometheus, [({'article': s['url']}, s['metrics']) for s in summaries])
+    report_path = args.report or os.path.join(args.out, 'summary.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    partial = f"（{report['partial']} 篇缺少部分图片）" if report['partial'] else ''
+    print(f"完成 {report['succeeded']}/{report['total']}{partial}，耗时 {report['seconds']} 秒，报告：{report_path}")
+    if args.variant != 'original':
+        print(f"下载变体 {args.variant} 节省 {report['variant_bytes_saved'] / 1024 ** 2:.1f} MB，"
+              f"{report['variant_fallbacks']} 张退回原图")
+    return 0 if report['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
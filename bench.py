@@ -0,0 +1,452 @@
+"""
+离线基准测试：在本地模拟服务器（mock_server.py）上测量各个环节，
+结果写成 JSON，便于在不同提交之间比较。
+
+- extract：图片地址提取（流式提取器对比 BeautifulSoup，见 bench_extract.py）；
+- clean_url：clean_img_url 每条地址的耗时；
+- download：整篇文章图片下载的吞吐（可注入延迟 / 带宽限制 / 429、5xx）；
+- pdf：与“转成PDF”按钮相同的 list_images + build_pdf，耗时与内存峰值；
+- pipeline：边下载边生成 PDF（download_article_to_pdf）的总耗时；
+- optimize：普通输出与线性化输出（optimize.py）的对比：显示第一页前要读取的字节数，
+  以及按 --link-speed 换算的首页耗时；
+- tiles：一张 --tall-size 的超长图整张写成一页与切块（tiles.py）的对比，
+  内存峰值在单独的进程中统计（Pillow 的像素内存 tracemalloc 统计不到，Windows 上为 null）；
+- thumbs：预览缩略图（thumbs.py）每张的耗时：首次生成、磁盘缓存命中、内存命中，
+  以及不用 draft 模式整张解码的对照；
+- variants：在模拟 CDN 变体的服务器上，按 --variant 下载（variants.py）与下载原图的
+  传输字节数、耗时对比；
+- pages：同一批图片第二次 build_pdf 时复用页面对象缓存（page_cache.py）与首次生成的耗时对比。
+
+用法：
+    python bench.py -o results.json
+    python bench.py --images 100 --latency 0.05 --error-rate 0.05 -o results.json
+    python bench.py --only download,pdf --compare old.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from bench_extract import bench as bench_extract_page, synthetic_article
+from core import (build_pdf, clean_img_url, download_article, download_article_to_pdf,
+                  extract_img_urls, list_images)
+from mock_server import FORMATS, MockWechatServer, synthetic_image
+from optimize import first_page_bytes
+from page_cache import PageCache
+from pdf_writer import PdfWriter
+from probe import Prober
+from thumbs import THUMB_SIZE, ThumbnailCache
+from tiles import split_tall
+from throttle import RetryPolicy, Throttler
+from variants import MMBIZ_HOSTS, VARIANTS, VariantPolicy
+
+BENCHMARKS = ('extract', 'clean_url', 'download', 'pdf', 'pipeline', 'optimize', 'tiles', 'thumbs',
+              'variants', 'pages')
+# 比较结果时，这些指标变大说明变慢了
+LOWER_IS_BETTER = ('seconds', 'ms', 'ns_per_url', 'peak_mb', 'stream_ms', 'first_page_ms')
+REGRESSION_RATIO = 1.10
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def best_of(func, repeat):
+    """重复 repeat 次，返回最快一次的 (秒数, 返回值)。"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, value)
+    return best
+
+
+def bench_extract(args, server):
+    return bench_extract_page(f'synthetic-{args.images}', synthetic_article(args.images), args.repeat)
+
+
+def bench_clean_url(args, server):
+    html = synthetic_article(args.images)
+    urls = [url for _, url in extract_img_urls(html)] * max(1, 10000 // max(1, args.images))
+    seconds, _ = best_of(lambda: [clean_img_url(url) for url in urls], args.repeat)
+    return {'urls': len(urls), 'ms': round(seconds * 1000, 2),
+            'ns_per_url': round(seconds / len(urls) * 1e9)}
+
+
+def _download_once(args, server, folder):
+    shutil.rmtree(folder, ignore_errors=True)
+    before = dict(server.stats)
+    start = time.perf_counter()
+    results = download_article(server.article_url, folder, workers=args.workers,
+                               throttler=Throttler(), retry=RetryPolicy())
+    seconds = time.perf_counter() - start
+    size = sum(r.size or 0 for r in results if not r.error)
+    return {
+        'seconds': round(seconds, 3),
+        'images': sum(1 for r in results if not r.error),
+        'failed': sum(1 for r in results if r.error),
+        'mb': round(size / 1024 ** 2, 2),
+        'mb_per_s': round(size / 1024 ** 2 / seconds, 2) if seconds else None,
+        'images_per_s': round(len(results) / seconds, 2) if seconds else None,
+        'requests': server.stats['requests'] - before['requests'],
+        'injected_errors': server.stats['errors'] - before['errors'],
+    }
+
+
+def bench_download(args, server):
+    folder = os.path.join(args.work_dir, 'download')
+    # 不使用图片缓存，每次都真正下载；取最快一次
+    runs = [_download_once(args, server, folder) for _ in range(args.repeat)]
+    return min(runs, key=lambda r: r['seconds'])
+
+
+def bench_pdf(args, server):
+    folder = os.path.join(args.work_dir, 'download')
+    if not os.path.isdir(folder) or not list_images(folder):
+        _download_once(args, server, folder)
+    img_paths = list_images(folder)
+    pdf_path = os.path.join(args.work_dir, 'bench.pdf')
+
+    def run():
+        return build_pdf(img_paths, pdf_path, processes=args.processes, profile=args.profile)
+
+    # 先跑一次预热，规范化 / 压缩结果进入缓存后各次测量条件一致
+    run()
+    seconds, report = best_of(run, args.repeat)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'images': len(img_paths),
+        'seconds': round(seconds, 3),
+        'peak_mb': round(peak / 1024 ** 2, 2),
+        'pdf_mb': round(os.path.getsize(pdf_path) / 1024 ** 2, 2),
+        'bytes_before': report['bytes_before'],
+        'bytes_after': report['bytes_after'],
+    }
+
+
+def bench_pipeline(args, server):
+    folder = os.path.join(args.work_dir, 'pipeline')
+    pdf_path = os.path.join(args.work_dir, 'pipeline.pdf')
+
+    def run():
+        shutil.rmtree(folder, ignore_errors=True)
+        return download_article_to_pdf(server.article_url, folder, pdf_path, workers=args.workers,
+                                       throttler=Throttler(), retry=RetryPolicy(),
+                                       normalize_processes=args.processes, profile=args.profile)
+
+    seconds, (results, pages, _) = best_of(run, args.repeat)
+    return {'seconds': round(seconds, 3), 'pages': pages,
+            'failed': sum(1 for r in results if r.error)}
+
+
+def bench_optimize(args, server):
+    folder = os.path.join(args.work_dir, 'download')
+    if not os.path.isdir(folder) or not list_images(folder):
+        _download_once(args, server, folder)
+    img_paths = list_images(folder)
+    plain = os.path.join(args.work_dir, 'plain.pdf')
+    fast = os.path.join(args.work_dir, 'fast.pdf')
+    # 先生成普通输出，规范化结果进入缓存；之后测量的是写 PDF 加改写（线性化 + 缩略图）的耗时
+    build_pdf(img_paths, plain, processes=args.processes, profile=args.profile)
+    seconds, _ = best_of(lambda: build_pdf(img_paths, fast, processes=args.processes,
+                                           profile=args.profile, optimize=True), args.repeat)
+    speed = args.link_speed * 1024
+    plain_bytes, fast_bytes = first_page_bytes(plain), first_page_bytes(fast)
+    return {
+        'images': len(img_paths),
+        'seconds': round(seconds, 3),
+        'plain_mb': round(os.path.getsize(plain) / 1024 ** 2, 2),
+        'pdf_mb': round(os.path.getsize(fast) / 1024 ** 2, 2),
+        'plain_first_page_kb': round(plain_bytes / 1024, 1),
+        'first_page_kb': round(fast_bytes / 1024, 1),
+        'plain_first_page_ms': round(plain_bytes / speed * 1000, 1),
+        'first_page_ms': round(fast_bytes / speed * 1000, 1),
+    }
+
+
+def _peak_rss_mb(reset=False):
+    """
+    当前进程的内存峰值（MB）。Linux 上读取 VmHWM，reset 为 True 时先把峰值重置为当前值：
+    子进程会继承父进程的 ru_maxrss，不重置就只能看到父进程的峰值。
+    """
+    try:
+        if reset:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:     # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _tall_pdf(src, pdf_path, tile_dir):
+    # 在新启动的进程中运行，进程的内存峰值只来自这一张长图
+    before = _peak_rss_mb(reset=True)
+    start = time.perf_counter()
+    with PdfWriter(pdf_path) as writer:
+        for path in split_tall(src, tile_dir) if tile_dir else [src]:
+            writer.add_image(path)
+    seconds = time.perf_counter() - start
+    after = _peak_rss_mb()
+    return seconds, writer.page_count, round(after - before, 1) if before is not None else None
+
+
+def bench_tiles(args, server):
+    width, height = (int(v) for v in args.tall_size.lower().split('x'))
+    context = multiprocessing.get_context('spawn')
+    result = {'size': args.tall_size}
+    for fmt in ('png', 'jpeg'):
+        src = os.path.join(args.work_dir, f'tall.{fmt}')
+        with open(src, 'wb') as f:
+            f.write(synthetic_image(1, fmt, (width, height), args.seed))
+        for mode in ('page', 'tiles'):
+            tile_dir = os.path.join(args.work_dir, 'tiles') if mode == 'tiles' else None
+            if tile_dir:
+                shutil.rmtree(tile_dir, ignore_errors=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, pages, peak = pool.submit(_tall_pdf, src, os.path.join(args.work_dir, 'tall.pdf'),
+                                                   tile_dir).result()
+            # 流式切分的 PNG 作为主要指标，其余用于对照
+            prefix = '' if (fmt, mode) == ('png', 'tiles') else f'{fmt}_{mode}_'
+            result.update({f'{prefix}seconds': round(seconds, 3), f'{prefix}peak_mb': peak,
+                           f'{prefix}pages': pages})
+    return result
+
+
+def _full_decode_thumbnail(path):
+    # 对照组：整张解码后再缩小
+    from PIL import Image
+    with Image.open(path) as im:
+        im = im.convert('RGB')
+    im.thumbnail((THUMB_SIZE, THUMB_SIZE))
+    return im
+
+
+def bench_thumbs(args, server):
+    folder = os.path.join(args.work_dir, 'download')
+    if not os.path.isdir(folder) or not list_images(folder):
+        _download_once(args, server, folder)
+    img_paths = list_images(folder)
+    root = os.path.join(args.work_dir, 'thumbs')
+
+    def per_image(func):
+        start = time.perf_counter()
+        for path in img_paths:
+            func(path)
+        return round((time.perf_counter() - start) / len(img_paths) * 1000, 2)
+
+    shutil.rmtree(root, ignore_errors=True)
+    cache = ThumbnailCache(root)
+    cold = per_image(cache.get)
+    memory = per_image(cache.get)
+    disk = per_image(ThumbnailCache(root).get)     # 新实例：内存为空，只有磁盘缓存
+    return {
+        'images': len(img_paths),
+        'ms': cold,
+        'disk_ms': disk,
+        'memory_ms': memory,
+        'full_decode_ms': per_image(_full_decode_thumbnail),
+    }
+
+
+def bench_variants(args, server):
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    cdn = MockWechatServer(images=args.images, formats=args.formats.split(','), image_size=(width, height),
+                           latency=args.latency, bandwidth=args.bandwidth * 1024 or None, seed=args.seed,
+                           variants=True)
+    cdn.warm()
+
+    def run(variant):
+        folder = os.path.join(args.work_dir, f'variant_{variant}')
+        shutil.rmtree(folder, ignore_errors=True)
+        before = cdn.stats['bytes_sent']
+        start = time.perf_counter()
+        # 与界面默认的“跳过小图标”相同先探测尺寸，原图大小直接取自探测结果；
+        # 模拟服务器不是 mmbiz 的主机，把它加进允许改写的主机
+        prober = Prober()
+        policy = variant if variant == 'original' else \
+            VariantPolicy(variant, prober=prober, hosts=MMBIZ_HOSTS + (urlparse(cdn.base_url).hostname,))
+        results = download_article(cdn.article_url, folder, workers=args.workers, throttler=Throttler(),
+                                   retry=RetryPolicy(), prober=prober, variant=policy)
+        return time.perf_counter() - start, cdn.stats['bytes_sent'] - before, results
+
+    with cdn:
+        # 先各跑一次，让服务器生成好变体图片，不计入下载耗时
+        run(args.variant)
+        original_seconds, original_bytes, _ = run('original')
+        seconds, sent, results = run(args.variant)
+    return {
+        'variant': args.variant,
+        'images': sum(1 for r in results if not r.error),
+        'seconds': round(seconds, 3),
+        'mb': round(sent / 1024 ** 2, 2),
+        'original_seconds': round(original_seconds, 3),
+        'original_mb': round(original_bytes / 1024 ** 2, 2),
+        'saved_ratio': round(1 - sent / original_bytes, 4) if original_bytes else None,
+    }
+
+
+def bench_pages(args, server):
+    folder = os.path.join(args.work_dir, 'download')
+    if not os.path.isdir(folder) or not list_images(folder):
+        _download_once(args, server, folder)
+    img_paths = list_images(folder)
+    pdf_path = os.path.join(args.work_dir, 'pages.pdf')
+    root = os.path.join(args.work_dir, 'pages')
+
+    def run(cache):
+        # incremental=False：每次都整本重写，只比较页面对象是否来自缓存
+        return build_pdf(img_paths, pdf_path, processes=args.processes, profile=args.profile,
+                         incremental=False, page_cache=cache)
+
+    # 预热规范化 / 压缩结果的缓存，两边只差页面对象缓存
+    run(None)
+    shutil.rmtree(root, ignore_errors=True)
+    start = time.perf_counter()
+    run(PageCache(root))
+    cold = time.perf_counter() - start
+    seconds, report = best_of(lambda: run(PageCache(root)), args.repeat)
+    return {
+        'images': len(img_paths),
+        'seconds': round(seconds, 3),
+        'cold_seconds': round(cold, 3),
+        'hit_rate': report['page_cache']['hit_rate'],
+        'bypassed': report['page_cache']['bypassed'],
+    }
+
+
+RUNNERS = {
+    'extract': bench_extract,
+    'clean_url': bench_clean_url,
+    'download': bench_download,
+    'pdf': bench_pdf,
+    'pipeline': bench_pipeline,
+    'optimize': bench_optimize,
+    'tiles': bench_tiles,
+    'thumbs': bench_thumbs,
+    'variants': bench_variants,
+    'pages': bench_pages,
+}
+
+
+def compare(results, baseline):
+    """逐项比较耗时类指标，返回 [(基准, 指标, 旧值, 新值, 比值), ...]。"""
+    rows = []
+    for name, current in results['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        for key, value in current.items():
+            if key in LOWER_IS_BETTER and isinstance(old.get(key), (int, float)) and old[key]:
+                rows.append((name, key, old[key], value, round(value / old[key], 3)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线基准测试（本地模拟服务器）')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help='要运行的基准，逗号分隔：' + ','.join(BENCHMARKS))
+    parser.add_argument('--images', type=int, default=40, help='合成文章中的图片数')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='图片格式，逗号分隔，轮流使用')
+    parser.add_argument('--size', default='1080x1440', help='图片尺寸，宽x高')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的延迟（秒）')
+    parser.add_argument('--bandwidth', type=float, default=0, help='单个响应的带宽上限（KB/s），0 为不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='图片请求返回 429 / 503 的概率')
+    parser.add_argument('--retry-after', type=float, default=None, help='429 响应的 Retry-After（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='图片内容与错误注入的随机种子')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='下载线程数')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='PDF 阶段的进程数（默认 1，内存峰值只统计当前进程）')
+    parser.add_argument('--profile', choices=('screen', 'print', 'archive'), default=None)
+    parser.add_argument('--link-speed', type=float, default=1024,
+                        help='optimize 基准换算首页耗时用的网速（KB/s）')
+    parser.add_argument('--tall-size', default='1080x30000', help='tiles 基准使用的长图尺寸，宽x高')
+    parser.add_argument('--variant', choices=sorted(VARIANTS), default='screen',
+                        help='variants 基准与原图对比的下载变体')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件，默认输出到标准输出')
+    parser.add_argument('--compare', help='与之前保存的结果 JSON 比较')
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.only.split(',') if name.strip()]
+    for name in names:
+        if name not in RUNNERS:
+            parser.error(f'未知的基准: {name}')
+    width, height = (int(v) for v in args.size.lower().split('x'))
+
+    params = {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'only')}
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'params': params,
+        },
+        'results': {},
+    }
+
+    args.work_dir = tempfile.mkdtemp(prefix='wechat_bench_')
+    server = MockWechatServer(images=args.images, formats=args.formats.split(','),
+                              image_size=(width, height), latency=args.latency,
+                              bandwidth=args.bandwidth * 1024 or None, error_rate=args.error_rate,
+                              retry_after=args.retry_after, seed=args.seed)
+    try:
+        server.warm()
+        server.start()
+        for name in names:
+            print(f'运行 {name} ...', file=sys.stderr)
+            results['results'][name] = RUNNERS[name](args, server)
+    finally:
+        server.stop()
+        shutil.rmtree(args.work_dir, ignore_errors=True)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f'结果已保存到 {args.output}', file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        slower = 0
+        for name, key, old, new, ratio in compare(results, baseline):
+            flag = '  变慢' if ratio > REGRESSION_RATIO else ''
+            slower += bool(flag)
+            print(f'{name}.{key}: {old} → {new}（{ratio}x）{flag}', file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+对比 BeautifulSoup 整树解析与流式提取器（extractor.py）提取图片地址的耗时。
+
+用法：
+    python bench_extract.py 保存的文章1.html 保存的文章2.html
+    python bench_extract.py --images 500 --repeat 10      # 没有保存的页面时使用合成页面
+"""
+import sys
+import json
+import time
+import argparse
+
+from extractor import _bs4_img_urls, extract_img_urls
+
+
+def synthetic_article(images=300, paragraphs_per_image=4):
+    # 结构仿照公众号文章：大量内联脚本和样式、层层嵌套的 section/span、带很多属性的 <img>
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8">',
+             '<script>' + 'var x = "<img src=fake>";' * 2000 + '</script>',
+             '<style>' + '.rich_media p { margin: 0 }' * 500 + '</style></head><body>',
+             '<h1 class="rich_media_title">合成 测试 文章</h1><div id="js_content">']
+    for i in range(1, images + 1):
+        for _ in range(paragraphs_per_image):
+            parts.append('<section style="margin: 0 8px;"><p><span style="font-size: 15px;">'
+                         '这是一段用于测试的正文内容 &amp; 文字。</span></p></section>')
+        parts.append(f'<p><img class="rich_pages wxw-img" data-ratio="1.5" data-type="jpeg" data-w="1080" '
+                     f'data-src="https://mmbiz.qpic.cn/mmbiz_jpg/abc{i}/640?wx_fmt=jpeg&amp;from=appmsg" '
+                     f'style="width: 100%;"></p>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def best_of(func, html, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(html)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench(name, html, repeat):
+    bs4_time, expected = best_of(_bs4_img_urls, html, repeat)
+    stream_time, actual = best_of(extract_img_urls, html, repeat)
+    return {
+        'page': name,
+        'bytes': len(html.encode('utf-8')),
+        'images': len(expected),
+        'same_result': expected == actual,
+        'bs4_ms': round(bs4_time * 1000, 2),
+        'stream_ms': round(stream_time * 1000, 2),
+        'speedup': round(bs4_time / stream_time, 2) if stream_time else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='图片地址提取基准测试')
+    parser.add_argument('pages', nargs='*', help='保存的文章 HTML 文件')
+    parser.add_argument('--images', type=int, default=300, help='合成页面中的图片数')
+    parser.add_argument('--repeat', type=int, default=5, help='每种方法重复次数，取最快一次')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args(argv)
+
+    pages = []
+    for path in args.pages:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append((path, f.read()))
+    if not pages:
+        pages.append((f'synthetic-{args.images}', synthetic_article(args.images)))
+
+    results = [bench(name, html, args.repeat) for name, html in pages]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for r in results:
+            print(f"{r['page']}: {r['bytes'] / 1024:.0f} KB, {r['images']} 张图片, "
+                  f"bs4 {r['bs4_ms']} ms, 流式 {r['stream_ms']} ms, "
+                  f"提速 {r['speedup']}x, 结果一致: {r['same_result']}")
+    return 0 if all(r['same_result'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
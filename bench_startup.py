@@ -0,0 +1,83 @@
+"""
+启动速度基准：从启动进程到窗口第一次显示（time-to-first-window）的耗时。
+
+通过环境变量 WECHAT_PDF_STARTUP_MARKER 把一个文件路径交给界面程序，
+窗口显示后界面程序把已加载的模块数写入该文件并立即退出；
+本脚本从创建进程开始计时，直到该文件出现。
+同样适用于打包后的 exe（--exe），不需要控制台输出。
+
+用法：
+    python bench_startup.py                       # 测 python mian.py
+    python bench_startup.py --script mian_update.py --repeat 10 --json
+    python bench_startup.py --exe dist/mian/mian.exe
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+MARKER_ENV = 'WECHAT_PDF_STARTUP_MARKER'
+
+
+def measure_once(cmd, timeout=60):
+    fd, marker = tempfile.mkstemp(prefix='startup_', suffix='.json')
+    os.close(fd)
+    os.remove(marker)
+    env = dict(os.environ, **{MARKER_ENV: marker})
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while not os.path.exists(marker):
+            if proc.poll() is not None:
+                raise RuntimeError(f'程序在窗口显示前退出: {proc.stderr.read().decode(errors="replace")}')
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError('等待窗口显示超时')
+            time.sleep(0.002)
+        elapsed = time.perf_counter() - start
+        # 文件可能刚创建还没写完，稍等进程退出再读
+        proc.wait(timeout=timeout)
+        with open(marker, encoding='utf-8') as f:
+            info = json.load(f)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        if os.path.exists(marker):
+            os.remove(marker)
+    info['seconds'] = elapsed
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='界面启动速度基准测试')
+    parser.add_argument('--script', default='mian.py', help='要测试的界面脚本')
+    parser.add_argument('--exe', default=None, help='改为测试打包后的可执行文件')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args(argv)
+
+    if args.exe:
+        cmd = [args.exe]
+    else:
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), args.script)]
+    runs = [measure_once(cmd) for _ in range(args.repeat)]
+    times = sorted(r['seconds'] for r in runs)
+    result = {
+        'command': cmd,
+        'runs': len(runs),
+        'first_window_ms_min': round(times[0] * 1000, 1),
+        'first_window_ms_median': round(times[len(times) // 2] * 1000, 1),
+        'modules_at_first_window': runs[-1].get('modules'),
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(f"{' '.join(cmd)}: 首个窗口 {result['first_window_ms_median']} ms（中位数，最快 "
+              f"{result['first_window_ms_min']} ms），此时已加载 {result['modules_at_first_window']} 个模块")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,446 @@
+"""
+公众号文章转 PDF 的核心流程：抓取文章 → 提取图片 → 下载 → 生成 PDF。
+不依赖 PyQt，可供 GUI、命令行批处理或其他脚本直接调用。
+"""
+import os
+import queue
+import hashlib
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse, parse_qs, urlunparse
+
+from downloader import DEFAULT_WORKERS, SessionPool, download_images, fetch
+from dedup import Deduper, _hash_or_none, dedup_images
+from extractor import extract_img_urls, extract_title
+from incremental import update_pdf
+from manifest import Manifest
+from normalize import DEFAULT_NORMALIZE_DIR, _normalize_or_keep, normalize_images
+from optimize import optimize_pdf
+from page_cache import stats_delta
+from pdf_writer import PdfWriter
+from profiles import DEFAULT_PROFILE_DIR, ProfileResult, apply_profile_all, get_profile, summarize, _apply_or_keep
+from shards import write_volumes
+from tiles import DEFAULT_TILE_DIR, _split_or_keep, split_images
+from variants import describe, make_policy, variant_url
+
+VALID_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def clean_img_url(url: str, variant=None) -> str:
+    """
+    仅保留 wx_fmt（格式）和 tp（类型）两个查询参数，
+    以确保下载到正确的图片格式。
+    variant 为变体名（见 variants.py）时再改写为对应的格式与宽度；
+    下载流程中由 VariantPolicy 改写，变体失败时可以退回这里返回的原地址。
+    """
+    parsed = urlparse(url)
+    qs = parse_qs(parsed.query)
+    allowed = {k: v[0] for k, v in qs.items() if k in ('wx_fmt', 'tp')}
+    new_query = '&'.join(f"{k}={v}" for k, v in allowed.items())
+    return variant_url(urlunparse(parsed._replace(query=new_query)), variant)
+
+
+def fetch_article(url, sessions, retry=None):
+    resp = fetch(sessions, url, retry=retry)
+    # 服务器未声明编码时 requests 默认按 ISO-8859-1 解码，中文标题会乱码
+    if not resp.encoding or resp.encoding.lower() == 'iso-8859-1':
+        resp.encoding = resp.apparent_encoding
+    return resp.text
+
+
+def _span(metrics, stage, **fields):
+    # 没有传入 Metrics 时不计时
+    return metrics.span(stage, **fields) if metrics else nullcontext()
+
+
+def _observe(on_result, metrics):
+    # 把每张图片的结果同时交给 Metrics 和调用方的回调
+    if metrics is None:
+        return on_result
+
+    def callback(result):
+        metrics.image(result)
+        if on_result:
+            on_result(result)
+    return callback
+
+
+def _probe_jobs(prober, jobs, sessions, workers, throttler, retry, metrics, executor=None):
+    """用 prober（见 probe.py）跳过小图标与分隔线，返回 (要下载的 jobs, 跳过的记录)。"""
+    if prober is None:
+        return jobs, []
+    with _span(metrics, 'probe', images=len(jobs)):
+        jobs, skipped = prober.filter(jobs, sessions, workers=workers, throttler=throttler, retry=retry,
+                                      executor=executor)
+    if metrics:
+        for record in skipped:
+            metrics.emit('skip', **record)
+    return jobs, skipped
+
+
+def article_title(html, default='wechat_article'):
+    # 获取文章标题，并清理非法字符
+    title = extract_title(html) or ''
+    title = ''.join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
+    return title or default
+
+
+def download_article(url, folder, workers=DEFAULT_WORKERS, sessions=None, throttler=None,
+                     retry=None, on_result=None, stop_on_error=False, html=None, cache=None,
+                     metrics=None, prober=None, executor=None, variant=None):
+    """
+    下载文章中的全部图片到 folder，返回按文档顺序排列的 DownloadResult 列表。
+    metrics 为 Metrics 时记录各阶段耗时与每张图片的统计（见 metrics.py）。
+    prober 为 Prober 时先探测尺寸，跳过小图标与分隔线（见 probe.py）。
+    executor 为多篇文章共享的线程池（见 downloader.FairExecutor.queue）。
+    variant 为下载变体名（见 variants.py），请求更小的格式或宽度，失败时退回原图。
+    """
+    own_sessions = sessions is None
+    if own_sessions:
+        sessions = SessionPool(per_host=workers)
+    try:
+        if html is None:
+            with _span(metrics, 'fetch_html', url=url):
+                html = fetch_article(url, sessions, retry)
+        with _span(metrics, 'extract'):
+            jobs = [(idx, clean_img_url(raw_url)) for idx, raw_url in extract_img_urls(html)]
+        jobs, skipped = _probe_jobs(prober, jobs, sessions, workers, throttler, retry, metrics, executor)
+        if skipped:
+            print(f'跳过 {len(skipped)} 张小图标 / 分隔线')
+        if metrics:
+            metrics.set_total(len(jobs))
+        os.makedirs(folder, exist_ok=True)
+        variants = make_policy(variant, cache, prober)
+        with _span(metrics, 'download', images=len(jobs)):
+            results = download_images(jobs, folder, workers=workers, sessions=sessions,
+                                      on_result=_observe(on_result, metrics), stop_on_error=stop_on_error,
+                                      throttler=throttler, retry=retry, cache=cache,
+                                      manifest=Manifest(folder, url), executor=executor, variants=variants)
+        if variants and variants.summary()['images']:
+            print(describe(variants.summary()))
+        return results
+    finally:
+        if own_sessions:
+            sessions.close()
+
+
+def _prepare_page(path, normalize_dir, profile, with_hash=False, split_tall=False):
+    """
+    写入 PDF 前的单页准备，在进程池中执行：去重用的哈希（按原图计算）、
+    超长图切块、规范化、按体积配置缩放。
+    返回 (ProfileResult 列表（每块一项，不切分时只有一项）, ImageHash 或 None)。
+    """
+    h = _hash_or_none(path) if with_hash else None
+    results = []
+    for part in _split_or_keep(path, DEFAULT_TILE_DIR) if split_tall else [path]:
+        if normalize_dir:
+            part = _normalize_or_keep(part, normalize_dir)
+        result = _apply_or_keep(part, profile, DEFAULT_PROFILE_DIR) if profile else None
+        if result is None:
+            size = os.path.getsize(part)
+            result = ProfileResult(part, part, size, size, False)
+        results.append(result._replace(src=path))
+    return results, h
+
+
+def download_article_to_pdf(url, folder, pdf_path, workers=DEFAULT_WORKERS, sessions=None,
+                            throttler=None, retry=None, on_result=None, stop_on_error=False,
+                            html=None, cache=None, normalize_processes=None,
+                            normalize_dir=DEFAULT_NORMALIZE_DIR, profile=None, dedup=False,
+                            dedup_threshold=None, metrics=None, prober=None,
+                            executor=None, optimize=False, pool=None, split_tall=False, variant=None,
+                            page_cache=None):
+    """
+    流水线模式：图片一边下载，一边按文档顺序写入 PDF。
+
+    下载线程池把完成的图片放进队列，组装线程按序号取出，
+    下一页一到就立即写入，最后一张图片落盘后很快就能得到 PDF。
+    失败的图片跳过（stop_on_error 为 True 时整篇中止并删除未完成的 PDF）。
+
+    每张图片下载完成后立即提交规范化（见 normalize.py）：normalize_processes
+    为 None 或大于 1 时使用进程池，为 1 时在组装线程内处理，为 0 时不做规范化；
+    传入 pool 时复用已有的进程池，不再单独创建。
+    profile 为输出体积配置名（见 profiles.py），与规范化在同一步中完成。
+    dedup 为 True 时按文档顺序去掉重复图片（见 dedup.py），只保留第一次出现的；
+    dedup_threshold 为 None（默认）时只去掉完全相同的图片，给出距离时也去掉近似重复。
+    prober 为 Prober 时先探测尺寸，跳过小图标与分隔线（见 probe.py）。
+    返回 (DownloadResult 列表, PDF 页数, 报告)，报告包含体积统计、removed（去掉的重复图片）
+    与 skipped（探测后跳过的图片）。
+    metrics 为 Metrics 时记录各阶段耗时与每张图片的统计（见 metrics.py）。
+    executor 为多篇文章共享的线程池（见 downloader.FairExecutor.queue）。
+    optimize 为 True 时最后改写为线性化、带缩略图和书签的 PDF（见 optimize.py）。
+    split_tall 为 True 时超长图按页高切成多页（见 tiles.py），报告的 split 记录切分过的图片。
+    variant 为下载变体名（见 variants.py），报告的 variants 为下载量统计（不使用变体时为 None）。
+    page_cache 为 PageCache 时复用以前写好的页面对象（见 page_cache.py）。
+    """
+    own_sessions = sessions is None
+    if own_sessions:
+        sessions = SessionPool(per_host=workers)
+    try:
+        if html is None:
+            with _span(metrics, 'fetch_html', url=url):
+                html = fetch_article(url, sessions, retry)
+        with _span(metrics, 'extract'):
+            jobs = [(idx, clean_img_url(raw_url)) for idx, raw_url in extract_img_urls(html)]
+        jobs, skipped = _probe_jobs(prober, jobs, sessions, workers, throttler, retry, metrics, executor)
+        if metrics:
+            metrics.set_total(len(jobs))
+        os.makedirs(folder, exist_ok=True)
+        on_result = _observe(on_result, metrics)
+
+        profile = get_profile(profile)
+        if normalize_processes == 0:
+            normalize_dir = None
+        done = queue.Queue()
+        failures = []
+        prepared = {}
+        pages = []
+        split = []
+        deduper = Deduper(dedup_threshold) if dedup else None
+        variants = make_policy(variant, cache, prober)
+        own_pool = pool is None and (normalize_processes is None or normalize_processes > 1)
+        if own_pool:
+            pool = ProcessPoolExecutor(max_workers=normalize_processes)
+
+        def prepare(result):
+            # 返回要写入 PDF 的 ProfileResult 列表（长图切块后有多项）；重复图片返回空列表
+            future = prepared.pop(result.idx, None)
+            start = time.perf_counter()
+            parts, h = future.result() if future is not None else \
+                _prepare_page(result.path, normalize_dir, profile, dedup, split_tall)
+            if metrics:
+                metrics.add_time('prepare', time.perf_counter() - start)
+            if deduper is not None and h is not None and deduper.check(result.path, h):
+                return []
+            return parts
+
+        def assemble(writer):
+            # 按文档顺序写页：还没轮到的结果先暂存在 pending 里
+            order = [idx for idx, _ in jobs]
+            pending = {}
+            pos = 0
+            while pos < len(order):
+                result = done.get()
+                if result is None:
+                    break
+                pending[result.idx] = result
+                while pos < len(order) and order[pos] in pending:
+                    ready = pending.pop(order[pos])
+                    pos += 1
+                    if ready.error:
+                        continue
+                    try:
+                        parts = prepare(ready)
+                        for part in parts:
+                            start = time.perf_counter()
+                            writer.add_image(part.path, cache=page_cache)
+                            if metrics:
+                                metrics.add_time('write_pdf', time.perf_counter() - start)
+                            # 写入成功后才记下，体积统计与书签只包含 PDF 中真实存在的页面
+                            pages.append(part)
+                        if len(parts) > 1:
+                            split.append({'src': ready.path, 'tiles': len(parts)})
+                    except Exception as e:
+                        if stop_on_error:
+                            raise
+                        print(f'无法加入 PDF {ready.path}: {e}')
+
+        def collect(result):
+            if pool is not None and not result.error:
+                prepared[result.idx] = pool.submit(_prepare_page, result.path, normalize_dir, profile, dedup,
+                                                   split_tall)
+            done.put(result)
+            if on_result:
+                on_result(result)
+
+        def run_assembler(writer):
+            try:
+                assemble(writer)
+            except Exception as e:
+                failures.append(e)
+
+        writer = PdfWriter(pdf_path)
+        try:
+            assembler = threading.Thread(target=run_assembler, args=(writer,), daemon=True)
+            assembler.start()
+            try:
+                with _span(metrics, 'download', images=len(jobs)):
+                    results = download_images(jobs, folder, workers=workers, sessions=sessions,
+                                              on_result=collect, stop_on_error=stop_on_error,
+                                              throttler=throttler, retry=retry, cache=cache,
+                                              manifest=Manifest(folder, url), executor=executor,
+                                              variants=variants)
+            finally:
+                done.put(None)
+                # 下载结束后还没写完的页面，耗时计入 finish_pdf
+                with _span(metrics, 'finish_pdf'):
+                    assembler.join()
+                if own_pool:
+                    pool.shutdown(cancel_futures=True)
+            if failures:
+                raise failures[0]
+            if stop_on_error:
+                for result in results:
+                    if result.error:
+                        raise result.error
+            if not writer.page_count:
+                raise ValueError('没有下载到可转换的图片。')
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+        if optimize:
+            with _span(metrics, 'optimize', pages=writer.page_count):
+                # 书签：顶层为文章标题，下面每张图片一项（长图只在第一块上）
+                outline = [os.path.basename(r.src) if i == 0 or r.src != pages[i - 1].src else None
+                           for i, r in enumerate(pages)]
+                optimize_pdf(pdf_path, outline=outline, title=(extract_title(html) or '').strip() or None)
+        report = summarize(pages)
+        report['removed'] = deduper.removed if deduper else []
+        report['skipped'] = skipped
+        report['split'] = split
+        report['variants'] = variants.summary() if variants else None
+        return results, writer.page_count, report
+    finally:
+        if own_sessions:
+            sessions.close()
+
+
+def sort_key(x):
+    # 数字文件名按数值排在前面，其余按名称排序；统一返回元组，避免 int 与 str 混合比较
+    name_without_ext, _ = os.path.splitext(x)
+    try:
+        return (0, int(name_without_ext), '')
+    except ValueError:
+        return (1, 0, name_without_ext)
+
+
+def list_images(folder):
+    """
+    返回文件夹中要转换的图片：有下载清单时先按清单的页序，清单里没有的文件
+    （用户手动放进来的图片）按文件名排序接在后面；没有清单时全部按文件名排序。
+    """
+    pages = Manifest(folder).pages() if Manifest.exists(folder) else []
+    listed = {os.path.basename(path) for path in pages}
+    images = [f for f in os.listdir(folder) if f.lower().endswith(VALID_EXTS) and f not in listed]
+    images.sort(key=sort_key)
+    return pages + [os.path.join(folder, img) for img in images]
+
+
+def build_pdf(img_paths, pdf_path, normalize=True, processes=None, profile=None, dedup=False,
+              dedup_threshold=None, incremental=False, metrics=None,
+              max_pages=None, max_bytes=None, optimize=False, split_tall=False, page_cache=None):
+    """
+    （可选）去掉重复图片，并行规范化（WebP / GIF / 透明图）并按体积配置缩放，
+    再逐页流式写出，内存占用不随页数增长；页数多时分片并行生成再合并（见 shards.py）。
+    返回报告：体积统计（见 profiles.summarize）、removed（去掉的图片）与 volumes（写出的文件）。
+    incremental 为 True 时只把新增的图片追加到已有 PDF（见 incremental.update_pdf）。
+    max_pages / max_bytes 按页数 / 体积分卷，分卷时总是整份重新生成。
+    optimize 为 True 时把每个文件改写为线性化、带缩略图和书签（每张图片一项）的 PDF，
+    见 optimize.py；线性化的文件不能增量追加，同样整份重新生成。
+    split_tall 为 True 时超长图按页高切成多页（见 tiles.py），报告的 split 记录切分过的图片。
+    page_cache 为 PageCache 时复用以前写好的页面对象（见 page_cache.py），
+    报告的 page_cache 为本次的命中统计（不使用时为 None）。
+    """
+    before = page_cache.stats() if page_cache is not None else None
+    if incremental and not (max_pages or max_bytes or optimize):
+        with _span(metrics, 'update_pdf', images=len(img_paths)):
+            report = update_pdf(img_paths, pdf_path, normalize=normalize, processes=processes,
+                                profile=profile, dedup=dedup, dedup_threshold=dedup_threshold,
+                                split_tall=split_tall, page_cache=page_cache)
+        report['volumes'] = [pdf_path]
+        report['page_cache'] = stats_delta(before, page_cache.stats()) if page_cache is not None else None
+        return report
+    removed = []
+    if dedup:
+        with _span(metrics, 'dedup', images=len(img_paths)):
+            img_paths, removed = dedup_images(img_paths, threshold=dedup_threshold, processes=processes)
+    names = [os.path.basename(path) for path in img_paths]     # 书签用来源文件名
+    split = []
+    if split_tall:
+        with _span(metrics, 'split_tall', images=len(img_paths)):
+            parts = split_images(img_paths, processes=processes)
+        # 长图切出的各块只在第一块上放书签
+        names = [name if i == 0 else None for name, group in zip(names, parts) for i in range(len(group))]
+        split = [{'src': src, 'tiles': len(group)} for src, group in zip(img_paths, parts) if len(group) > 1]
+        img_paths = [path for group in parts for path in group]
+    if normalize:
+        with _span(metrics, 'normalize', images=len(img_paths)):
+            img_paths = normalize_images(img_paths, processes=processes)
+    with _span(metrics, 'profile', images=len(img_paths)):
+        results = apply_profile_all(img_paths, profile, processes=processes)
+    with _span(metrics, 'write_pdf', images=len(results)):
+        volumes = write_volumes([r.path for r in results], pdf_path, processes=processes,
+                                max_pages=max_pages, max_bytes=max_bytes, page_cache=page_cache)
+    if optimize:
+        with _span(metrics, 'optimize', images=len(results)):
+            for volume in volumes:
+                names = names[optimize_pdf(volume, outline=names):]
+    report = summarize(results)
+    report['removed'] = removed
+    report['split'] = split
+    report['volumes'] = volumes
+    report['page_cache'] = stats_delta(before, page_cache.stats()) if page_cache is not None else None
+    return report
+
+
+def article_name(url, html):
+    # 文件夹 / PDF 名：文章标题 + URL 摘要，保证并行处理多篇同名文章时不会互相覆盖
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+    return f"{article_title(html)}_{digest}"
+
+
+def convert_article(url, out_dir, workers=DEFAULT_WORKERS, sessions=None, throttler=None,
+                    retry=None, cache=None, normalize_processes=None, profile=None, dedup=False,
+                    dedup_threshold=None, metrics=None, prober=None, executor=None,
+                    optimize=False, pool=None, html=None, stop_on_error=False, split_tall=False,
+                    variant=None, page_cache=None):
+    """
+    处理一篇文章：图片保存到 out_dir/<名称>/，PDF 保存为 out_dir/<名称>.pdf，
+    下载与 PDF 组装以流水线方式重叠进行。html 为已经取得的文章页面时不再请求。
+    返回一条汇总信息（dict），失败的图片会被跳过并记录在 failed 中
+    （stop_on_error 为 True 时任何一张失败都中止整篇文章）。
+    """
+    own_sessions = sessions is None
+    if own_sessions:
+        sessions = SessionPool(per_host=workers)
+    try:
+        if html is None:
+            with _span(metrics, 'fetch_html', url=url):
+                html = fetch_article(url, sessions, retry)
+        name = article_name(url, html)
+        folder = os.path.join(out_dir, name)
+        pdf_path = os.path.join(out_dir, f'{name}.pdf')
+        results, pages, report = download_article_to_pdf(url, folder, pdf_path, workers=workers,
+                                                         sessions=sessions, throttler=throttler,
+                                                         retry=retry, html=html, cache=cache,
+                                                         normalize_processes=normalize_processes,
+                                                         profile=profile, dedup=dedup,
+                                                         dedup_threshold=dedup_threshold,
+                                                         metrics=metrics, prober=prober,
+                                                         executor=executor, optimize=optimize,
+                                                         pool=pool, stop_on_error=stop_on_error,
+                                                         split_tall=split_tall, variant=variant,
+                                                         page_cache=page_cache)
+    finally:
+        if own_sessions:
+            sessions.close()
+
+    return {
+        'url': url,
+        'name': name,
+        'folder': folder,
+        'pdf': pdf_path,
+        'pages': pages,
+        'images': sum(1 for r in results if not r.error),
+        'cached': sum(1 for r in results if r.cached),
+        'failed': [{'idx': r.idx, 'url': r.url, 'error': str(r.error)} for r in results if r.error],
+        'sizes': {k: v for k, v in report.items()
+                  if k not in ('per_image', 'removed', 'skipped', 'split', 'variants')},
+        'removed': report['removed'],
+        'skipped': report['skipped'],
+        'split': report['split'],
+        'variants': report['variants'],
+    }
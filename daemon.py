@@ -0,0 +1,535 @@
+"""
+常驻后台的本地转换服务，提供只监听 localhost 的 JSON API。
+
+每次启动界面程序都要解压、导入模块、和 mp.weixin.qq.com / mmbiz.qpic.cn 重新握手；
+服务常驻后这些都只发生一次：HTTP 连接池、文章页面缓存、图片缓存、探测结果、
+下载线程池与规范化进程池在各个请求之间一直保持“热”的状态。
+界面（mian.py）检测到服务在运行时只负责提交任务和显示进度。
+
+API（请求和响应都是 JSON）：
+    GET  /health            服务状态
+    POST /jobs              提交文章：{"url": ..., "pdf": true, "profile": "screen", "dedup": true,
+                            "near_dup": false, "optimize": false, "skip_small": true, "strict": false, "split_tall": false,
+                            "variant": "screen", "out_dir": ...}
+                            out_dir 只能是服务的输出目录（或 --allow-dir 允许的目录）之内的路径
+    GET  /jobs              全部任务
+    GET  /jobs/<id>         任务状态与进度
+    GET  /jobs/<id>/pdf     下载生成的 PDF
+    POST /shutdown          停止服务
+
+只接受 Host 为 127.0.0.1 / localhost 加本服务端口的请求，防止网页通过 DNS rebinding 访问。
+
+用法：
+    python daemon.py serve --out 转换图像 [--allow-dir 其他输出目录]
+    python daemon.py submit <文章链接> --wait -o 文章.pdf
+    python daemon.py status [任务编号]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import itertools
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8766
+DAEMON_ENV = 'WECHAT_PDF_DAEMON'    # 覆盖默认地址，例如 http://127.0.0.1:9000
+MAX_ACTIVE_JOBS = 3     # 同时处理的文章数；图片下载的总并发由共享线程池限制
+HTML_TTL = 600          # 文章页面缓存的有效期（秒）
+HTML_CACHE_SIZE = 64
+MAX_BODY = 64 * 1024
+MAX_FINISHED_JOBS = 200     # 保留的已结束任务数，更早的按提交顺序删除
+# dedup 只去掉完全相同的图片，near_dup 为 true 时还去掉近似重复的（dHash，见 dedup.py）
+JOB_OPTIONS = {'pdf': True, 'profile': None, 'dedup': True, 'near_dup': False, 'optimize': False,
+               'skip_small': True, 'strict': False, 'split_tall': False, 'variant': None, 'out_dir': None}
+BOOL_OPTIONS = ('pdf', 'dedup', 'near_dup', 'optimize', 'skip_small', 'strict', 'split_tall')
+LOCAL_HOSTS = ('127.0.0.1', 'localhost')
+
+
+def default_url():
+    return os.environ.get(DAEMON_ENV) or f'http://{DEFAULT_HOST}:{DEFAULT_PORT}'
+
+
+def is_inside(path, roots):
+    """path（解析符号链接后）是否在 roots 中某个目录之内。"""
+    path = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        try:
+            if os.path.commonpath([path, root]) == root:
+                return True
+        except ValueError:
+            continue    # Windows 上不在同一个盘
+    return False
+
+
+class ConversionService:
+    """
+    在各个请求之间共享的状态与工作线程。网络、图片与 PDF 相关模块在这里才导入，
+    只使用 DaemonClient 的界面和脚本不需要加载它们。
+    """
+
+    def __init__(self, out_dir, workers=None, max_jobs=MAX_ACTIVE_JOBS, cache_dir=None,
+                 use_cache=True, processes=None, allowed_dirs=()):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        from downloader import DEFAULT_WORKERS, FairExecutor, SessionPool
+        from img_cache import DEFAULT_CACHE_DIR, ImageCache
+        from page_cache import PageCache
+        from probe import Prober
+        from throttle import Throttler
+
+        self.out_dir = os.path.abspath(out_dir)
+        # 任务只能写到这些目录之内，本机网页或其他程序不能借服务写任意位置
+        self.out_dirs = [os.path.realpath(d) for d in (self.out_dir, *allowed_dirs)]
+        self.workers = workers or DEFAULT_WORKERS
+        self.sessions = SessionPool(per_host=self.workers)
+        self.executor = FairExecutor(self.workers)
+        self.throttler = Throttler()
+        self.cache = ImageCache(cache_dir or DEFAULT_CACHE_DIR) if use_cache else None
+        # 同一张图片在不同任务中写好的页面对象直接复用，见 page_cache.py
+        self.page_cache = PageCache(os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'pages')) if use_cache else None
+        self.prober = Prober(cache=self.cache)
+        self.pool = ProcessPoolExecutor(max_workers=processes)  # 规范化 / 压缩图片，常驻
+        self.runner = ThreadPoolExecutor(max_workers=max_jobs)  # 每篇文章一个线程
+        self.started = time.time()
+        self.jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._html = OrderedDict()      # url -> (取得时间, 页面)
+        self._lock = threading.Lock()
+
+    def _check_options(self, options):
+        from profiles import PROFILES
+        from variants import VARIANTS
+
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"未知的选项: {', '.join(sorted(unknown))}")
+        for key in BOOL_OPTIONS:
+            if key in options and not isinstance(options[key], bool):
+                raise ValueError(f'{key} 必须是 true 或 false')
+        if options.get('profile') is not None and options['profile'] not in PROFILES:
+            raise ValueError(f"未知的 profile: {options['profile']}")
+        if options.get('variant') is not None and options['variant'] not in VARIANTS:
+            raise ValueError(f"未知的 variant: {options['variant']}")
+        out_dir = options.get('out_dir')
+        if out_dir is None:
+            return self.out_dir
+        if not isinstance(out_dir, str) or not out_dir:
+            raise ValueError('out_dir 必须是路径字符串')
+        out_dir = os.path.abspath(os.path.join(self.out_dir, out_dir))     # 相对路径按输出目录计算
+        if not is_inside(out_dir, self.out_dirs):
+            raise ValueError(f'out_dir 不在允许的输出目录中: {out_dir}')
+        return out_dir
+
+    def submit(self, url, **options):
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            raise ValueError('url 必须是 http(s) 链接')
+        out_dir = self._check_options(options)
+        job = dict(JOB_OPTIONS, **options)
+        job['out_dir'] = out_dir
+        with self._lock:
+            job_id = str(next(self._ids))
+            job.update(id=job_id, url=url, state='queued', name=None, done=0, total=None,
+                       mb_per_s=0.0, pdf_path=None, folder=None, error=None, result=None,
+                       metrics=None, submitted=time.time(), finished=None)
+            self.jobs[job_id] = job
+        self.runner.submit(self._run, job)
+        return self.job(job_id)
+
+    def job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list_jobs(self):
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def health(self):
+        with self._lock:
+            states = [job['state'] for job in self.jobs.values()]
+        return {
+            'ok': True,
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 1),
+            'out_dir': self.out_dir,
+            'out_dirs': self.out_dirs,
+            'jobs': {state: states.count(state) for state in ('queued', 'running', 'done', 'failed')},
+            'cache': self.cache.stats() if self.cache else None,
+            'probe': dict(self.prober.stats),
+            'page_cache': self.page_cache.stats() if self.page_cache else None,
+        }
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _progress(self, job, done, total, mb_per_s):
+        self._update(job, done=done, total=total, mb_per_s=round(mb_per_s, 3))
+
+    def article_html(self, url, metrics=None):
+        """文章页面按 URL 缓存 HTML_TTL 秒，同一篇文章重复提交时不再请求。"""
+        from core import fetch_article
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._html.get(url)
+            if cached and now - cached[0] < HTML_TTL:
+                self._html.move_to_end(url)
+                return cached[1]
+        if metrics is not None:
+            with metrics.span('fetch_html', url=url):
+                html = fetch_article(url, self.sessions)
+        else:
+            html = fetch_article(url, self.sessions)
+        with self._lock:
+            self._html[url] = (now, html)
+            while len(self._html) > HTML_CACHE_SIZE:
+                self._html.popitem(last=False)
+        return html
+
+    def _run(self, job):
+        from core import article_name, convert_article, download_article
+        from dedup import DEFAULT_THRESHOLD
+        from metrics import DEFAULT_LOG_BYTES, DEFAULT_METRICS_LOG, Metrics
+
+        self._update(job, state='running')
+        metrics = Metrics(DEFAULT_METRICS_LOG, on_progress=partial(self._progress, job),
+                          labels={'job': job['id']}, max_bytes=DEFAULT_LOG_BYTES)
+        prober = self.prober if job['skip_small'] else None
+        executor = self.executor.queue(job['id'])
+        try:
+            html = self.article_html(job['url'], metrics)
+            name = article_name(job['url'], html)
+            self._update(job, name=name, folder=os.path.join(job['out_dir'], name))
+            if job['pdf']:
+                summary = convert_article(job['url'], job['out_dir'], workers=self.workers,
+                                          sessions=self.sessions, throttler=self.throttler,
+                                          cache=self.cache, profile=job['profile'], dedup=job['dedup'],
+                                          dedup_threshold=DEFAULT_THRESHOLD if job['near_dup'] else None,
+                                          metrics=metrics, prober=prober, executor=executor,
+                                          optimize=job['optimize'], pool=self.pool, html=html,
+                                          stop_on_error=job['strict'], split_tall=job['split_tall'],
+                                          variant=job['variant'], page_cache=self.page_cache)
+                self._update(job, pdf_path=summary['pdf'],
+                             result={k: summary[k] for k in ('pages', 'images', 'cached', 'failed', 'sizes',
+                                                             'split', 'variants')})
+            else:
+                results = download_article(job['url'], job['folder'], workers=self.workers,
+                                           sessions=self.sessions, throttler=self.throttler,
+                                           cache=self.cache, stop_on_error=job['strict'], html=html,
+                                           metrics=metrics, prober=prober, executor=executor,
+                                           variant=job['variant'])
+                failed = [{'idx': r.idx, 'url': r.url, 'error': str(r.error)} for r in results if r.error]
+                if failed and job['strict']:
+                    raise RuntimeError(f"{len(failed)} 张图片下载失败: {failed[0]['error']}")
+                self._update(job, result={'images': len(results) - len(failed), 'failed': failed})
+            self._update(job, state='done')
+        except Exception as e:
+            self._update(job, state='failed', error=str(e))
+        finally:
+            self._update(job, metrics=metrics.close(), finished=time.time())
+            self._prune()
+
+    def _prune(self):
+        # 任务表只保留最近 MAX_FINISHED_JOBS 个已结束的任务，长期运行时不会一直增长
+        with self._lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job['state'] in ('done', 'failed')]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+
+    def close(self):
+        self.runner.shutdown(wait=False, cancel_futures=True)
+        self.executor.shutdown(wait=False)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.sessions.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _host_allowed(self):
+        # 浏览器经 DNS rebinding 访问时 Host 是攻击者的域名；本机客户端总是用本机地址
+        return self.headers.get('Host') in self.server.allowed_hosts
+
+    def _read_json(self):
+        # 只接受 application/json：浏览器跨站提交这种请求必须先预检，本服务不应答预检，
+        # 因此网页无法借用户的浏览器向本地服务提交任务
+        if self.headers.get_content_type() != 'application/json':
+            raise TypeError('Content-Type 必须是 application/json')
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            raise ValueError('请求太大')
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('请求体必须是 JSON 对象')
+        return data
+
+    def do_GET(self):
+        if not self._host_allowed():
+            return self._json(403, {'error': '只接受本机地址的请求'})
+        service = self.server.service
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if parts == ['health']:
+            return self._json(200, service.health())
+        if parts == ['jobs']:
+            return self._json(200, service.list_jobs())
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = service.job(parts[1])
+            if job is None:
+                return self._json(404, {'error': '没有这个任务'})
+            if len(parts) == 2:
+                return self._json(200, job)
+            if parts[2] == 'pdf':
+                return self._send_pdf(job)
+        self._json(404, {'error': '未知的地址'})
+
+    def _send_pdf(self, job):
+        if job['state'] != 'done' or not job['pdf_path']:
+            return self._json(409, {'error': '任务还没有生成 PDF', 'state': job['state']})
+        try:
+            f = open(job['pdf_path'], 'rb')
+        except OSError as e:
+            return self._json(410, {'error': str(e)})
+        with f:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_POST(self):
+        if not self._host_allowed():
+            return self._json(403, {'error': '只接受本机地址的请求'})
+        service = self.server.service
+        path = self.path.split('?')[0].strip('/')
+        try:
+            data = self._read_json()
+            if path == 'jobs':
+                url = data.pop('url', None)
+                return self._json(202, service.submit(url, **data))
+            if path == 'shutdown':
+                self._json(200, {'ok': True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+        except TypeError as e:
+            return self._json(415, {'error': str(e)})
+        except ValueError as e:
+            return self._json(400, {'error': str(e)})
+        self._json(404, {'error': '未知的地址'})
+
+
+class ConversionServer:
+    """
+    HTTP 服务加 ConversionService，可以用作上下文管理器（测试时在后台线程中运行）：
+
+        with ConversionServer(out_dir, port=0) as server:
+            DaemonClient(server.url).submit(url)
+    """
+
+    def __init__(self, out_dir, host=DEFAULT_HOST, port=DEFAULT_PORT, **options):
+        self.service = ConversionService(out_dir, **options)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.service = self.service
+        port = self._httpd.server_address[1]
+        self._httpd.allowed_hosts = {f'{name}:{port}' for name in (*LOCAL_HOSTS, host)}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve_forever(self):
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            self.service.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class DaemonClient:
+    """只依赖标准库的客户端，界面和脚本用它与服务通信。"""
+
+    def __init__(self, base_url=None, timeout=10):
+        self.base_url = (base_url or default_url()).rstrip('/')
+        self.timeout = timeout
+
+    def _open(self, method, path, data=None, timeout=None):
+        body = None if data is None else json.dumps(data).encode('utf-8')
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if body is not None:
+            request.add_header('Content-Type', 'application/json')
+        try:
+            return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.load(e).get('error')
+            except ValueError:
+                message = None
+            raise RuntimeError(message or f'HTTP {e.code}') from None
+
+    def _request(self, method, path, data=None, timeout=None):
+        with self._open(method, path, data, timeout) as resp:
+            return json.load(resp)
+
+    def available(self, timeout=0.5, out_dir=None):
+        """服务是否在运行；给出 out_dir 时还要求服务允许写入这个目录。"""
+        try:
+            health = self._request('GET', '/health', timeout=timeout)
+        except (OSError, RuntimeError, ValueError):
+            return False
+        if not health.get('ok'):
+            return False
+        return out_dir is None or is_inside(out_dir, health.get('out_dirs') or [health['out_dir']])
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def submit(self, url, **options):
+        return self._request('POST', '/jobs', dict(options, url=url))
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def jobs(self):
+        return self._request('GET', '/jobs')
+
+    def wait(self, job_id, interval=0.2, timeout=None, on_update=None):
+        """轮询直到任务完成或失败，返回最终状态；on_update(任务) 在每次轮询后调用。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.job(job_id)
+            if on_update:
+                on_update(job)
+            if job['state'] in ('done', 'failed'):
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f'等待任务 {job_id} 超时')
+            time.sleep(interval)
+
+    def fetch_pdf(self, job_id, path):
+        with self._open('GET', f'/jobs/{job_id}/pdf') as resp, open(path, 'wb') as f:
+            shutil.copyfileobj(resp, f)
+        return path
+
+    def shutdown(self):
+        return self._request('POST', '/shutdown', {})
+
+
+def _print_job(job):
+    progress = f"{job['done']}/{job['total']}" if job['total'] is not None else '-'
+    target = job['error'] or job['pdf_path'] or job['folder'] or ''
+    print(f"[{job['id']}] {job['state']:<7} {progress:>9} {job['name'] or job['url']} {target}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='常驻后台的本地转换服务')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve = sub.add_parser('serve', help='启动服务')
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('-o', '--out', default='转换图像', help='默认输出目录')
+    serve.add_argument('-w', '--workers', type=int, default=None, help='共享的图片下载线程数')
+    serve.add_argument('-j', '--jobs', type=int, default=MAX_ACTIVE_JOBS, help='同时处理的文章数')
+    serve.add_argument('-p', '--processes', type=int, default=None, help='规范化图片的进程数')
+    serve.add_argument('--no-cache', action='store_true', help='不使用图片缓存')
+    serve.add_argument('--allow-dir', action='append', default=[],
+                       help='任务还可以写入的输出目录（可以重复），默认只能写 --out 之内')
+
+    submit = sub.add_parser('submit', help='提交文章')
+    submit.add_argument('urls', nargs='+')
+    submit.add_argument('--images', action='store_true', help='只保存图片，不生成 PDF')
+    submit.add_argument('--profile', choices=('screen', 'print', 'archive'), default=None)
+    submit.add_argument('--no-dedup', action='store_true', help='保留重复图片')
+    submit.add_argument('--near-dup', action='store_true', help='同时去掉近似重复的图片（默认只去掉完全相同的）')
+    submit.add_argument('--optimize', action='store_true', help='输出线性化、带缩略图和书签的 PDF')
+    submit.add_argument('--split-tall', action='store_true', help='超长图按页高切成多页')
+    submit.add_argument('--variant', choices=('original', 'webp', 'jpeg', 'screen'), default=None,
+                        help='下载变体，失败时自动改用原图')
+    submit.add_argument('--wait', action='store_true', help='等待完成')
+    submit.add_argument('-o', '--output', default=None, help='完成后把 PDF 下载到该路径（只提交一篇时）')
+
+    status = sub.add_parser('status', help='查看任务')
+    status.add_argument('job', nargs='?')
+
+    sub.add_parser('stop', help='停止服务')
+    for p in (submit, status, sub.choices['stop']):
+        p.add_argument('--url', default=None, help=f'服务地址，默认 {default_url()}')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = ConversionServer(args.out, host=args.host, port=args.port, workers=args.workers,
+                                  max_jobs=args.jobs, processes=args.processes, use_cache=not args.no_cache,
+                                  allowed_dirs=args.allow_dir)
+        print(f'转换服务已启动: {server.url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    client = DaemonClient(args.url)
+    if args.command == 'stop':
+        client.shutdown()
+        return 0
+    if args.command == 'status':
+        for job in [client.job(args.job)] if args.job else client.jobs():
+            _print_job(job)
+        return 0
+
+    jobs = [client.submit(url, pdf=not args.images, profile=args.profile, dedup=not args.no_dedup,
+                          near_dup=args.near_dup, optimize=args.optimize, split_tall=args.split_tall, variant=args.variant)
+            for url in args.urls]
+    if not args.wait and not args.output:
+        for job in jobs:
+            _print_job(job)
+        return 0
+    failed = 0
+    for job in jobs:
+        job = client.wait(job['id'])
+        _print_job(job)
+        failed += job['state'] == 'failed'
+        if args.output and len(jobs) == 1 and job['state'] == 'done' and job['pdf_path']:
+            print(f'已保存: {client.fetch_pdf(job["id"], args.output)}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+生成 PDF 前去掉重复图片：分隔线动图、作者头像、关注二维码、广告横幅
+往往在一篇文章里出现很多次，每次都会变成 PDF 中的一页。
+
+- 完全相同：sha256 相同；
+- 近似重复：差值哈希（dHash，16x16 = 256 位，NumPy 在缩小后的灰度图上计算），
+  汉明距离不超过 threshold、宽高比接近，且 8x8 的彩色缩略图也接近。
+  纯色或几乎没有明暗变化的图片 dHash 接近全 0，哈希不能区分它们，不做近似比较；
+- 黑名单：文件中列出的已知模板图片哈希，命中即删除。
+
+总是保留第一次出现的图片，保持其余页面的顺序不变。
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from img_cache import DEFAULT_CACHE_DIR
+from manifest import file_sha256
+
+HASH_SIZE = 16
+DEFAULT_THRESHOLD = 8       # 256 位中最多相差 8 位才算近似重复
+ASPECT_TOLERANCE = 0.02
+MIN_GRADIENT_BITS = 16      # dHash 中置位少于这个数的图片几乎没有明暗变化
+THUMB_SIZE = 8
+THUMB_TOLERANCE = 16        # 缩略图每个通道的平均差（0-255）不超过这个值才算近似
+DEFAULT_BLOCKLIST = os.path.join(DEFAULT_CACHE_DIR, 'blocklist.txt')
+
+# sha256: 内容摘要, phash: 256 位 dHash 打包成的 32 字节数组, aspect: 宽 / 高
+# thumb: 8x8 RGB 缩略图的 192 字节数组，排除哈希相同但颜色不同的图片
+ImageHash = namedtuple('ImageHash', ['sha256', 'phash', 'aspect', 'thumb'])
+
+
+def dhash(im, hash_size=HASH_SIZE):
+    small = im.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits.ravel())
+
+
+def thumbnail(im, size=THUMB_SIZE):
+    small = im.convert('RGB').resize((size, size), Image.Resampling.BOX)
+    return np.asarray(small, dtype=np.uint8).ravel()
+
+
+def hash_image(path):
+    with Image.open(path) as im:
+        aspect = im.size[0] / max(1, im.size[1])
+        if im.format == 'JPEG':
+            # 按 1/8 解码即可，哈希与缩略图只需要很小的图
+            im.draft('RGB', (HASH_SIZE * 4, HASH_SIZE * 4))
+        if getattr(im, 'is_animated', False):
+            im.seek(0)
+        phash, thumb = dhash(im), thumbnail(im)
+    return ImageHash(file_sha256(path), phash, aspect, thumb)
+
+
+def phash_hex(phash):
+    return 'phash:' + bytes(phash).hex()
+
+
+def hash_to_json(h):
+    return {'sha256': h.sha256, 'phash': phash_hex(h.phash), 'aspect': h.aspect, 'thumb': bytes(h.thumb).hex()}
+
+
+def hash_from_json(data):
+    phash = np.frombuffer(bytes.fromhex(data['phash'][6:]), dtype=np.uint8)
+    thumb = np.frombuffer(bytes.fromhex(data['thumb']), dtype=np.uint8)
+    return ImageHash(data['sha256'], phash, data['aspect'], thumb)
+
+
+def load_blocklist(path=DEFAULT_BLOCKLIST):
+    """
+    黑名单文件每行一个哈希：64 位十六进制为 sha256，
+    以 phash: 开头的为近似哈希（可以直接使用 dedup 报告中的 phash 字段）。
+    """
+    shas, phashes = set(), []
+    if not path or not os.path.exists(path):
+        return shas, phashes
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#')[0].strip().lower()
+            if line.startswith('phash:'):
+                phashes.append(np.frombuffer(bytes.fromhex(line[6:]), dtype=np.uint8))
+            elif line:
+                shas.add(line)
+    return shas, phashes
+
+
+class Deduper:
+    """按文档顺序逐张判断是否重复，保留第一次出现的图片。"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, blocklist=DEFAULT_BLOCKLIST):
+        self.threshold = threshold
+        self.blocked_shas, blocked = load_blocklist(blocklist)
+        self.blocked = np.array(blocked, dtype=np.uint8).reshape(-1, HASH_SIZE * HASH_SIZE // 8)
+        self.seen = {}          # sha256 -> 首次出现的路径
+        self.kept_paths = []
+        self.kept_hashes = np.empty((0, HASH_SIZE * HASH_SIZE // 8), dtype=np.uint8)
+        self.kept_aspects = np.empty(0)
+        self.kept_thumbs = np.empty((0, THUMB_SIZE * THUMB_SIZE * 3), dtype=np.uint8)
+        self.removed = []
+
+    def _distances(self, hashes, phash):
+        # 与所有已保留哈希的汉明距离，一次向量化计算
+        return np.unpackbits(np.bitwise_xor(hashes, phash), axis=1).sum(axis=1)
+
+    def check(self, path, h):
+        """返回 None 表示保留；否则返回删除原因，并记入 removed。"""
+        reason = None
+        # 纯色、渐变很平缓的图片哈希接近全 0，彼此之间距离都很小，只按 sha256 去重
+        textured = int(np.unpackbits(h.phash).sum()) >= MIN_GRADIENT_BITS
+        if h.sha256 in self.blocked_shas:
+            reason = {'reason': 'blocklist'}
+        elif h.sha256 in self.seen:
+            reason = {'reason': 'exact', 'duplicate_of': self.seen[h.sha256]}
+        elif textured and self.blocked.size and self._distances(self.blocked, h.phash).min() <= (self.threshold or 0):
+            reason = {'reason': 'blocklist'}
+        elif textured and self.threshold is not None and self.kept_paths:
+            distances = self._distances(self.kept_hashes, h.phash)
+            similar = (distances <= self.threshold) & \
+                (np.abs(self.kept_aspects - h.aspect) <= ASPECT_TOLERANCE * h.aspect)
+            if similar.any():
+                # 哈希只看明暗变化，再用缩略图确认颜色与大致内容也接近
+                diff = np.abs(self.kept_thumbs.astype(np.int16) - h.thumb).mean(axis=1)
+                similar &= diff <= THUMB_TOLERANCE
+            if similar.any():
+                i = int(np.argmax(similar))
+                reason = {'reason': 'similar', 'duplicate_of': self.kept_paths[i],
+                          'distance': int(distances[i])}
+
+        if reason is not None:
+            reason.update(path=path, sha256=h.sha256, phash=phash_hex(h.phash))
+            self.removed.append(reason)
+            return reason
+
+        self.keep(path, h)
+        return None
+
+    def keep(self, path, h):
+        """登记一张保留的图片，也用于从保存的状态恢复。"""
+        self.seen[h.sha256] = path
+        self.kept_paths.append(path)
+        self.kept_hashes = np.vstack([self.kept_hashes, h.phash])
+        self.kept_aspects = np.append(self.kept_aspects, h.aspect)
+        self.kept_thumbs = np.vstack([self.kept_thumbs, h.thumb])
+
+
+def _hash_or_none(path):
+    try:
+        return hash_image(path)
+    except Exception as e:
+        print(f'无法计算图片哈希 {path}: {e}')
+        return None
+
+
+def dedup_images(img_paths, threshold=DEFAULT_THRESHOLD, blocklist=DEFAULT_BLOCKLIST, processes=None):
+    """
+    返回 (保留的路径列表, 删除记录列表)。哈希在进程池中并行计算；
+    threshold 为 None 时只去除完全相同的图片。
+    """
+    if processes == 1 or len(img_paths) < 2:
+        hashes = [_hash_or_none(path) for path in img_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            hashes = list(pool.map(_hash_or_none, img_paths, chunksize=8))
+
+    deduper = Deduper(threshold, blocklist)
+    kept = []
+    for path, h in zip(img_paths, hashes):
+        # 无法计算哈希的图片原样保留，交给后续阶段处理
+        if h is None or deduper.check(path, h) is None:
+            kept.append(path)
+    return kept, deduper.removed
@@ -0,0 +1,366 @@
+import os
+import hashlib
+import mimetypes
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from throttle import RetryPolicy, Throttler, THROTTLE_STATUSES, parse_retry_after
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+}
+
+DEFAULT_WORKERS = 8     # 下载线程池大小
+PER_HOST_LIMIT = 8      # 每个主机的最大并发连接数
+DEFAULT_TIMEOUT = (10, 30)  # (连接超时, 读取超时)，单位秒
+CHUNK_SIZE = 64 * 1024      # 流式写盘的块大小
+
+# idx: 图片在文章中的序号, url: 清洗后的地址, path: 保存路径, error: 失败时的异常,
+# size / sha256: 写入文件的字节数与内容摘要, cached: 是否直接使用了本地缓存,
+# latency: 从开始到完成的秒数（含限速等待与重试）, retries: 重试次数, disk_seconds: 写盘耗时
+DownloadResult = namedtuple('DownloadResult', ['idx', 'url', 'path', 'error', 'size', 'sha256', 'cached',
+                                               'latency', 'retries', 'disk_seconds'],
+                            defaults=(None, None, False, None, 0, 0.0))
+
+
+class IncompleteDownload(IOError):
+    """响应体比 Content-Length 声明的短（或长），说明下载被截断。"""
+
+
+class SessionPool:
+    """
+    按主机复用 requests.Session，每个主机一个带连接池的 Session，
+    避免每张图片都重新建立 TCP + TLS 连接。
+    """
+
+    def __init__(self, per_host=PER_HOST_LIMIT, headers=None):
+        self.per_host = per_host
+        self.headers = headers or HEADERS
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                # pool_block=True：超过每主机上限的请求会等待空闲连接，而不是新开连接
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host, pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class FairExecutor:
+    """
+    多篇文章共享的有界下载线程池。每篇文章（key）有自己的任务队列，
+    工作线程按 key 轮流取任务，先提交了很多图片的文章不会饿死后来的文章，
+    而总并发始终不超过 workers。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self._queues = OrderedDict()    # key -> deque[(future, fn, args, kwargs)]
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, fn, *args, **kwargs):
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('线程池已关闭')
+            self._queues.setdefault(key, deque()).append((future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def queue(self, key):
+        """返回只提交到 key 队列的执行器，可以作为 download_images 的 executor。"""
+        return _KeyedExecutor(self, key)
+
+    def pending(self):
+        with self._cond:
+            return {key: len(tasks) for key, tasks in self._queues.items()}
+
+    def _next(self):
+        # 轮转：取队首 key 的一个任务，该 key 还有任务就排到末尾
+        key, tasks = next(iter(self._queues.items()))
+        item = tasks.popleft()
+        if tasks:
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        return item
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._shutdown:
+                    self._cond.wait()
+                if not self._queues:
+                    return
+                future, fn, args, kwargs = self._next()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class _KeyedExecutor:
+
+    def __init__(self, executor, key):
+        self.executor = executor
+        self.key = key
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(self.key, fn, *args, **kwargs)
+
+
+def guess_ext(content_type, url):
+    # 从 Content-Type 推断扩展名，fallback 到 URL 路径后缀或 .jpg
+    content_type = (content_type or '').split(';')[0].strip()
+    return mimetypes.guess_extension(content_type) \
+        or os.path.splitext(urlparse(url).path)[1] \
+        or '.jpg'
+
+
+def fetch(sessions, url, throttler=None, retry=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """
+    发送 GET 请求：先经过该主机的限速器，
+    对 429 / 5xx / 超时 / 连接错误按 retry 做带抖动的指数退避重试。
+    """
+    retry = retry or RetryPolicy()
+    throttle = throttler.get(url) if throttler else None
+    attempt = 0
+    while True:
+        if throttle:
+            throttle.acquire()
+        start = time.monotonic()
+        try:
+            resp = sessions.get(url).get(url, timeout=timeout, **kwargs)
+        except (requests.Timeout, requests.ConnectionError):
+            if throttle:
+                throttle.on_throttle()
+            if attempt >= retry.retries:
+                raise
+            time.sleep(retry.delay(attempt))
+            attempt += 1
+            continue
+
+        if resp.status_code in retry.statuses and attempt < retry.retries:
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            if throttle and resp.status_code in THROTTLE_STATUSES:
+                throttle.on_throttle(retry_after)
+            resp.close()
+            time.sleep(retry.delay(attempt, retry_after))
+            attempt += 1
+            continue
+
+        if throttle and resp.ok:
+            throttle.on_success(time.monotonic() - start)
+        if resp.status_code >= 400:
+            # stream=True 的错误响应不会被读完，必须关闭才能把连接还给连接池；
+            # 连接池 pool_block=True，泄漏 per_host 个连接后该主机的请求会永远等待
+            resp.close()
+            resp.raise_for_status()
+        resp.retries = attempt     # 供统计使用
+        return resp
+
+
+def stream_to_file(resp, filename, chunk_size=CHUNK_SIZE):
+    """
+    把响应体分块写入同目录下的临时文件，同一遍里计算 sha256 与字节数，
+    校验 Content-Length 后再原子地重命名为 filename，避免留下半截文件。
+    返回 (size, sha256, 写盘耗时秒数)。
+    """
+    folder = os.path.dirname(filename) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.', suffix='.part')
+    digest = hashlib.sha256()
+    size = 0
+    disk_seconds = 0.0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            try:
+                for chunk in resp.iter_content(chunk_size):
+                    digest.update(chunk)
+                    start = time.perf_counter()
+                    f.write(chunk)
+                    disk_seconds += time.perf_counter() - start
+                    size += len(chunk)
+            except (requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError) as e:
+                raise IncompleteDownload(f'下载中断: {resp.url}: {e}') from e
+
+        expected = resp.headers.get('Content-Length')
+        if expected is not None and 'Content-Encoding' not in resp.headers:
+            if int(expected) != size:
+                raise IncompleteDownload(f'下载不完整: {resp.url}: {size}/{expected} 字节')
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        resp.close()
+    return size, digest.hexdigest(), disk_seconds
+
+
+def download_one(sessions, idx, url, folder, throttler=None, retry=None, cache=None):
+    """下载一张图片，返回 (文件路径, 字节数, sha256, 是否来自缓存, 重试次数, 写盘耗时)。"""
+    entry = cache.lookup(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        filename = os.path.join(folder, f"{idx}{guess_ext(entry['content_type'], url)}")
+        return cache.materialize(url, entry, filename), entry['size'], entry['sha256'], True, 0, 0.0
+
+    retry = retry or RetryPolicy()
+    attempt = 0
+    retries = 0
+    while True:
+        resp = fetch(sessions, url, throttler, retry, stream=True,
+                     headers=cache.conditional_headers(entry) if cache else None)
+        retries += resp.retries
+        if resp.status_code == 304 and entry:
+            # 服务器确认缓存仍然有效
+            resp.close()
+            filename = os.path.join(folder, f"{idx}{guess_ext(entry['content_type'], url)}")
+            cache.materialize(url, entry, filename, revalidated=True)
+            return filename, entry['size'], entry['sha256'], True, retries, 0.0
+
+        ext = guess_ext(resp.headers.get('Content-Type'), url)
+        filename = os.path.join(folder, f'{idx}{ext}')
+        try:
+            size, sha256, disk_seconds = stream_to_file(resp, filename)
+        except IncompleteDownload:
+            # 截断的下载按网络错误处理，退避后重新下载
+            if attempt >= retry.retries:
+                raise
+            time.sleep(retry.delay(attempt))
+            attempt += 1
+            retries += 1
+            continue
+        if cache:
+            cache.store(url, filename, sha256, size, resp.headers)
+        return filename, size, sha256, False, retries, disk_seconds
+
+
+def _timed_download(*args, variants=None):
+    # 在下载线程中计时，得到每张图片的实际耗时（含排队后的限速等待与重试）
+    start = time.monotonic()
+    try:
+        download = variants.download if variants is not None else download_one
+        return download(*args) + (time.monotonic() - start,)
+    except Exception as e:
+        e.latency = time.monotonic() - start
+        raise
+
+
+def download_images(jobs, folder, workers=DEFAULT_WORKERS, sessions=None,
+                    on_result=None, stop_on_error=False, throttler=None, retry=None, cache=None,
+                    manifest=None, executor=None, variants=None):
+    """
+    用有界线程池并发下载图片。
+
+    jobs 为 [(idx, url), ...]，文件按 {idx}{ext} 保存，
+    返回值按文章中的顺序排列。on_result 在每张图片完成（或失败）时被调用。
+    stop_on_error 为 True 时，第一张失败的图片会取消其余尚未开始的任务。
+    throttler / retry 控制每主机限速与重试，传入同一个 Throttler 可在多篇文章间保留学到的速率。
+    cache 为 ImageCache 时先查本地缓存，并用条件请求再验证。
+    manifest 为 Manifest 时跳过清单中已完成且校验通过的图片，并记录每张图片的结果。
+    executor 为共享的线程池（例如 FairExecutor.queue(key)）时不再单独创建线程池，
+    此时并发由共享线程池决定，workers 不起作用。
+    variants 为 variants.VariantPolicy 时先下载改写后的变体地址，失败时退回原地址；
+    结果中的 url 仍为原地址。
+    """
+    own_sessions = sessions is None
+    if own_sessions:
+        sessions = SessionPool()
+    if throttler is None:
+        throttler = Throttler()
+
+    # 清单按实际请求的地址记录，换了变体配置时重新下载
+    def listed(url):
+        return variants.rewrite(url) if variants is not None else url
+
+    results = {}
+    pending = []
+    if manifest is not None:
+        manifest.plan([(idx, listed(url)) for idx, url in jobs])
+    for idx, url in jobs:
+        entry = manifest.verified(idx, listed(url)) if manifest is not None else None
+        if entry:
+            # 上次已经下载好且文件完好，直接复用
+            results[idx] = DownloadResult(idx, url, entry['path'], None, entry['size'], entry['sha256'], True)
+            if on_result:
+                on_result(results[idx])
+        else:
+            pending.append((idx, url))
+
+    pool = executor or ThreadPoolExecutor(max_workers=max(1, workers))
+    futures = {}
+    try:
+        try:
+            futures = {
+                pool.submit(_timed_download, sessions, idx, url, folder, throttler, retry, cache,
+                            variants=variants): (idx, url)
+                for idx, url in pending
+            }
+            for future in as_completed(futures):
+                idx, url = futures[future]
+                if future.cancelled():
+                    continue
+                try:
+                    path, size, sha256, cached, retries, disk_seconds, latency = future.result()
+                    result = DownloadResult(idx, url, path, None, size, sha256, cached,
+                                            latency, retries, disk_seconds)
+                except Exception as e:
+                    result = DownloadResult(idx, url, None, e, latency=getattr(e, 'latency', None))
+                results[idx] = result
+                if manifest is not None:
+                    manifest.record(result._replace(url=listed(url)))
+                if on_result:
+                    on_result(result)
+                if result.error and stop_on_error:
+                    for f in futures:
+                        f.cancel()
+        finally:
+            if executor is None:
+                pool.shutdown()
+            else:
+                # 共享线程池不会随本函数退出，中途出错时要撤回本篇文章还没开始的任务
+                for f in futures:
+                    f.cancel()
+    finally:
+        if own_sessions:
+            sessions.close()
+
+    return [results[idx] for idx, _ in jobs if idx in results]
@@ -0,0 +1,88 @@
+"""
+流式提取文章中的图片地址，替代 BeautifulSoup 整棵树的构建。
+
+基于 html.parser 的事件回调，只关心 <img> 与 <h1>，HTML 只扫描一遍，
+不建立任何节点对象。结果与
+    [img.get('data-src') or img.get('src') for img in soup.find_all('img')]
+一致（包括序号），解析出错时回退到 BeautifulSoup。
+"""
+from html.parser import HTMLParser
+
+
+class ImgUrlParser(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.count = 0          # 已遇到的 <img> 数量，即下一张图片的序号 - 1
+        self.found = []         # 尚未被取走的 [(idx, url), ...]
+        self.title = None
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            self.count += 1
+            attrs = dict(attrs)
+            url = attrs.get('data-src') or attrs.get('src')
+            if url:
+                self.found.append((self.count, url))
+        elif tag == 'h1' and self.title is None and self._title_parts is None:
+            self._title_parts = []
+
+    def handle_endtag(self, tag):
+        if tag == 'h1' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts).strip()
+            self._title_parts = None
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data.strip())
+
+    def take(self):
+        found, self.found = self.found, []
+        return found
+
+
+def iter_img_urls(chunks):
+    """
+    逐块喂入 HTML（str 的可迭代对象），按文档顺序边解析边产出 (idx, url)。
+    """
+    parser = ImgUrlParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.take()
+    parser.close()
+    yield from parser.take()
+
+
+def _bs4_img_urls(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    jobs = []
+    for idx, img in enumerate(soup.find_all('img'), start=1):
+        raw_url = img.get('data-src') or img.get('src')
+        if raw_url:
+            jobs.append((idx, raw_url))
+    return jobs
+
+
+def extract_img_urls(html):
+    """按文档顺序返回 [(idx, 原始图片地址), ...]，idx 与 <img> 标签的序号一致。"""
+    try:
+        return list(iter_img_urls([html]))
+    except Exception:
+        return _bs4_img_urls(html)
+
+
+def extract_title(html):
+    """返回第一个 <h1> 的文本（未清理），没有时返回 None。"""
+    parser = ImgUrlParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        from bs4 import BeautifulSoup
+
+        title_tag = BeautifulSoup(html, 'html.parser').find('h1')
+        return title_tag.get_text(strip=True) if title_tag else None
+    return parser.title
@@ -0,0 +1,581 @@
+"""
+界面程序：剪贴板里的文章链接排队下载 / 转成 PDF，文件夹里的图片预览后合成 PDF。
+
+mian.py 与 mian_update.py 是两个入口，区别只在 strict：
+宽松模式跳过下载失败的图片继续处理，严格模式任何一张失败都中止整篇文章。
+启动时只导入 PyQt，网络 / 图片 / PDF 相关模块在窗口显示后于后台预加载。
+"""
+import sys
+import os
+import re
+import json
+import threading
+from functools import partial
+from PyQt6.QtWidgets import (
+    QApplication, QWidget, QPushButton, QFileDialog, QHBoxLayout, QVBoxLayout,
+    QInputDialog, QMessageBox, QComboBox, QLabel, QCheckBox, QListWidget, QDialog
+)
+from PyQt6.QtGui import QIcon
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
+from throttle import Throttler
+
+MAX_ACTIVE_JOBS = 3     # 同时处理的文章数；图片下载的总并发由共享线程池限制
+URL_RE = re.compile(r'https?://\S+')
+
+
+def warm_up():
+    """
+    在后台线程中导入 requests、PIL、numpy 等较重的模块。
+    窗口先显示出来，等用户点按钮时这些模块通常已经加载好了。
+    """
+    try:
+        import core
+        import metrics
+        import img_cache
+        import probe
+        import preview
+    except Exception as e:
+        print(f'预加载模块失败: {e}')
+
+
+class DownloadThread(QThread):
+    finished = pyqtSignal(str)  # 下载完成信号，参数为文件夹路径
+    error = pyqtSignal(str)     # 错误信号
+    titled = pyqtSignal(str)    # 取得文章标题后发出输出名称（设置了 out_dir 时）
+    progress = pyqtSignal(int, int, float)  # 进度信号：已完成图片数、总数、MB/s
+
+    def __init__(self, url, folder=None, workers=None, throttler=None, retry=None, cache=None,
+                 pdf_path=None, profile=None, dedup=False, near_dup=False, metrics_path=None, prober=None,
+                 out_dir=None, to_pdf=False, sessions=None, executor=None, optimize=False,
+                 split_tall=False, variant=None, page_cache=None, strict=False, use_daemon=False):
+        super().__init__()
+        self.url = url
+        self.folder = folder
+        self.workers = workers
+        self.throttler = throttler
+        self.retry = retry
+        self.cache = cache
+        self.pdf_path = pdf_path    # 设置后边下载边生成 PDF，finished 发出 PDF 路径
+        self.profile = profile      # 输出体积配置，见 profiles.py
+        self.dedup = dedup          # 是否去掉完全相同的图片，见 dedup.py
+        self.near_dup = near_dup    # 同时去掉近似重复的图片（dHash 相近），需要 dedup
+        self.metrics_path = metrics_path    # 各阶段计时追加到该 JSON lines 文件，默认见 metrics.py
+        self.prober = prober        # 设置后先探测尺寸，跳过小图标与分隔线，见 probe.py
+        # 设置 out_dir 时按文章标题命名：图片保存到 out_dir/<名称>/，to_pdf 时 PDF 为 out_dir/<名称>.pdf
+        self.out_dir = out_dir
+        self.to_pdf = to_pdf
+        self.sessions = sessions    # 多个任务共享的 SessionPool，限制每主机的总连接数
+        self.executor = executor    # 多个任务共享的 FairExecutor，各篇文章轮流下载
+        self.optimize = optimize    # 输出线性化、带缩略图和书签的 PDF，见 optimize.py
+        self.split_tall = split_tall    # 超长图按页高切成多页，见 tiles.py
+        self.variant = variant      # 下载变体名，请求更小的格式或宽度，见 variants.py
+        self.page_cache = page_cache    # 复用以前写好的页面对象，见 page_cache.py
+        self.strict = strict        # 任何一张图片失败都中止整篇文章（并删除未完成的 PDF）
+        # 常驻转换服务（daemon.py）在运行、且允许写 out_dir 时交给它处理：连接、缓存和进程池都已经是热的
+        self.use_daemon = use_daemon
+
+    def run(self):
+        if self.use_daemon and self.out_dir:
+            # 健康检查最多要等 0.5 秒，放在工作线程中，不卡住界面
+            from daemon import DaemonClient
+            client = DaemonClient()
+            if client.available(out_dir=self.out_dir):
+                return self.run_remote(client)
+        self.run_local()
+
+    def run_remote(self, client):
+        """把文章交给常驻的转换服务，这里只提交并轮询进度，发出的信号与本地处理相同。"""
+        titled = []
+
+        def update(job):
+            if job['name'] and not titled:
+                titled.append(job['name'])
+                self.titled.emit(job['name'])
+            if job['total'] is not None:
+                self.progress.emit(job['done'], job['total'], job['mb_per_s'])
+
+        try:
+            job = client.submit(self.url, out_dir=self.out_dir, pdf=self.to_pdf, profile=self.profile,
+                                dedup=self.dedup, near_dup=self.near_dup, skip_small=self.prober is not None,
+                                optimize=self.optimize,
+                                strict=self.strict, split_tall=self.split_tall, variant=self.variant)
+            job = client.wait(job['id'], on_update=update)
+            if job['state'] == 'failed':
+                self.error.emit(job['error'])
+            else:
+                self.finished.emit(job['pdf_path'] or job['folder'])
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def run_local(self):
+        # 网络、图片与 PDF 相关模块在这里才导入，不拖慢窗口显示
+        from core import article_name, download_article, download_article_to_pdf, fetch_article
+        from dedup import DEFAULT_THRESHOLD
+        from downloader import DEFAULT_WORKERS, SessionPool
+        from metrics import DEFAULT_LOG_BYTES, DEFAULT_METRICS_LOG, Metrics
+        from variants import describe
+
+        workers = self.workers or DEFAULT_WORKERS
+        metrics = Metrics(self.metrics_path or DEFAULT_METRICS_LOG, on_progress=self.progress.emit,
+                          max_bytes=DEFAULT_LOG_BYTES)
+        sessions = self.sessions or SessionPool(per_host=workers)
+        executor = self.executor.queue(self.url) if self.executor is not None else None
+        try:
+            folder, pdf_path, html = self.folder, self.pdf_path, None
+            if self.out_dir:
+                with metrics.span('fetch_html', url=self.url):
+                    html = fetch_article(self.url, sessions, self.retry)
+                name = article_name(self.url, html)
+                self.titled.emit(name)
+                folder = os.path.join(self.out_dir, name)
+                if self.to_pdf:
+                    pdf_path = os.path.join(self.out_dir, f'{name}.pdf')
+
+            def report(result):
+                if result.error:
+                    print(f"无法下载图片 {result.url}: {result.error}")
+                else:
+                    print(f"成功下载: {result.path}")
+
+            if pdf_path:
+                _, _, pdf_report = download_article_to_pdf(self.url, folder, pdf_path, workers=workers,
+                                                           sessions=sessions, throttler=self.throttler,
+                                                           retry=self.retry, cache=self.cache, on_result=report,
+                                                           stop_on_error=self.strict, profile=self.profile,
+                                                           dedup=self.dedup, metrics=metrics, prober=self.prober,
+                                                           dedup_threshold=DEFAULT_THRESHOLD if self.near_dup else None,
+                                                           html=html, executor=executor, optimize=self.optimize,
+                                                           split_tall=self.split_tall, variant=self.variant,
+                                                           page_cache=self.page_cache)
+                if pdf_report['variants'] and pdf_report['variants']['images']:
+                    print(describe(pdf_report['variants']))
+                self.finished.emit(pdf_path)
+                return
+
+            results = download_article(self.url, folder, workers=workers, sessions=sessions,
+                                       throttler=self.throttler, retry=self.retry, cache=self.cache,
+                                       on_result=report, stop_on_error=self.strict, html=html,
+                                       metrics=metrics, prober=self.prober, executor=executor,
+                                       variant=self.variant)
+            if self.strict:
+                for result in results:
+                    if result.error:
+                        raise result.error
+            self.finished.emit(folder)
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            if self.sessions is None:
+                sessions.close()
+            summary = metrics.close()
+            print(f"用时 {summary['seconds']} 秒，{summary['images']} 张图片，"
+                  f"{summary['mb_per_s']} MB/s，各阶段：{summary['stages']}")
+
+
+class BuildThread(QThread):
+    finished = pyqtSignal(object)   # 生成完成信号，参数为 build_pdf 的报告
+    error = pyqtSignal(str)
+
+    def __init__(self, img_paths, pdf_path, profile=None, dedup=False, near_dup=False, max_pages=None,
+                 max_bytes=None, optimize=False, split_tall=False, page_cache=None):
+        super().__init__()
+        self.img_paths = img_paths
+        self.pdf_path = pdf_path
+        self.profile = profile
+        self.dedup = dedup
+        self.near_dup = near_dup
+        self.max_pages = max_pages  # 每卷最多页数，见 shards.py
+        self.max_bytes = max_bytes  # 每卷最大字节数
+        self.optimize = optimize
+        self.split_tall = split_tall
+        self.page_cache = page_cache
+
+    def run(self):
+        # 规范化、分片写 PDF 都在进程池中进行，窗口不会卡住
+        from core import build_pdf
+        from dedup import DEFAULT_THRESHOLD
+
+        try:
+            report = build_pdf(self.img_paths, self.pdf_path, profile=self.profile, dedup=self.dedup,
+                               dedup_threshold=DEFAULT_THRESHOLD if self.near_dup else None,
+                               incremental=True, max_pages=self.max_pages, max_bytes=self.max_bytes,
+                               optimize=self.optimize, split_tall=self.split_tall,
+                               page_cache=self.page_cache)
+            self.finished.emit(report)
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class ImageProcessor(QWidget):
+    def __init__(self, strict=False):
+        super().__init__()
+        self.strict = strict    # 见模块说明
+        # 限速器在多次下载之间共享，保留已经学到的每主机安全速率
+        self.throttler = Throttler()
+        self._cache = None
+        self._prober = None
+        self._pool = None
+        self._thumbs = None
+        self._page_cache = None
+        self.jobs = []      # 文章队列，见 add_job
+        # 每篇文章按标题命名：图片在 转换图像/<标题>/，PDF 为 转换图像/<标题>.pdf
+        self.out_dir = os.path.join(os.getcwd(), "转换图像")
+        self.initUI()
+        # 窗口显示之后再在后台预加载其余模块
+        QTimer.singleShot(0, self.start_warm_up)
+
+    @property
+    def cache(self):
+        # 图片缓存第一次用到时才打开
+        if self._cache is None:
+            from img_cache import ImageCache
+            self._cache = ImageCache()
+        return self._cache
+
+    @property
+    def prober(self):
+        # 探测结果按 URL 缓存，多次下载之间复用；勾掉“跳过小图标”时不探测
+        if not self.skip_box.isChecked():
+            return None
+        if self._prober is None:
+            from probe import Prober
+            self._prober = Prober(cache=self.cache)
+        return self._prober
+
+    @property
+    def thumbs(self):
+        # 预览用的缩略图缓存，多次预览之间保留内存中的缩略图
+        if self._thumbs is None:
+            from thumbs import ThumbnailCache
+            self._thumbs = ThumbnailCache()
+        return self._thumbs
+
+    @property
+    def page_cache(self):
+        # 写好的页面对象按图片内容缓存在磁盘上，单篇 PDF 与合订本之间复用
+        if self._page_cache is None:
+            from page_cache import PageCache
+            self._page_cache = PageCache()
+        return self._page_cache
+
+    def shared_pool(self):
+        # 所有任务共用一组连接与一个下载线程池：每主机连接数与总并发不随文章数增加
+        if self._pool is None:
+            from downloader import DEFAULT_WORKERS, FairExecutor, SessionPool
+            self._pool = (SessionPool(per_host=DEFAULT_WORKERS), FairExecutor(DEFAULT_WORKERS))
+        return self._pool
+
+    def start_warm_up(self):
+        threading.Thread(target=warm_up, daemon=True).start()
+
+    def initUI(self):
+
+        self.setWindowTitle('转换器')
+        self.setFixedSize(520, 360)
+        self.setWindowIcon(QIcon("1.ico"))  # 设置窗口图标
+
+        self.setWindowTitle('转换器')
+        self.setFixedSize(520, 360)
+        self.setWindowFlag(Qt.WindowType.WindowStaysOnTopHint)
+
+
+        button_layout = QHBoxLayout()
+        button_layout.setSpacing(40)
+
+        self.clipboard_button = QPushButton('保存图片', self)
+        self.clipboard_button.clicked.connect(self.process_clipboard)
+        button_layout.addWidget(self.clipboard_button)
+
+        self.folder_button = QPushButton('转成PDF', self)
+        self.folder_button.clicked.connect(self.convert_images_to_pdf)
+        button_layout.addWidget(self.folder_button)
+
+        self.pdf_button = QPushButton('直接转PDF', self)
+        self.pdf_button.clicked.connect(self.process_clipboard_to_pdf)
+        button_layout.addWidget(self.pdf_button)
+
+        # 输出体积配置：缩小并重新压缩图片，减小 PDF
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel('PDF 体积：', self))
+        self.profile_box = QComboBox(self)
+        self.profile_box.addItem('原图', 'archive')
+        self.profile_box.addItem('打印', 'print')
+        self.profile_box.addItem('屏幕阅读', 'screen')
+        profile_layout.addWidget(self.profile_box)
+
+        self.dedup_box = QCheckBox('去掉重复图片', self)
+        self.dedup_box.setChecked(True)
+        profile_layout.addWidget(self.dedup_box)
+
+        # 近似重复可能误删相似的图表、幻灯片，默认不开启
+        self.near_dup_box = QCheckBox('包括相似图片', self)
+        self.near_dup_box.setToolTip('同时去掉与前面某张图片几乎一样的图片（缩放、重新压缩过的副本）')
+        self.dedup_box.toggled.connect(self.near_dup_box.setEnabled)
+        profile_layout.addWidget(self.near_dup_box)
+
+        self.skip_box = QCheckBox('跳过小图标', self)
+        self.skip_box.setChecked(True)
+        profile_layout.addWidget(self.skip_box)
+
+        self.tall_box = QCheckBox('切分长图', self)
+        self.tall_box.setToolTip('高度超过宽度 3 倍的长图按页高切成多页；\n'
+                                 '非隔行的 8 位 PNG 解码时只占用一页的内存，其他格式仍整张解码')
+        profile_layout.addWidget(self.tall_box)
+
+        option_layout = QHBoxLayout()
+        self.auto_box = QCheckBox('自动识别剪贴板链接', self)
+        QApplication.clipboard().dataChanged.connect(self.on_clipboard_changed)
+        option_layout.addWidget(self.auto_box)
+
+        # “转成PDF”时按页数或体积分成多个文件
+        option_layout.addWidget(QLabel('分卷：', self))
+        self.volume_box = QComboBox(self)
+        self.volume_box.addItem('不分卷', {})
+        self.volume_box.addItem('每卷 200 页', {'max_pages': 200})
+        self.volume_box.addItem('每卷 500 页', {'max_pages': 500})
+        self.volume_box.addItem('每卷 50 MB', {'max_bytes': 50 * 1024 ** 2})
+        self.volume_box.addItem('每卷 200 MB', {'max_bytes': 200 * 1024 ** 2})
+        option_layout.addWidget(self.volume_box)
+
+        self.fast_box = QCheckBox('快速打开', self)
+        self.fast_box.setToolTip('线性化并附带缩略图和书签，大文件也能很快显示第一页（需要 pikepdf）')
+        option_layout.addWidget(self.fast_box)
+
+        self.saver_box = QCheckBox('省流量', self)
+        self.saver_box.setToolTip('下载最宽 640 像素的 WebP 版本，失败时自动改用原图（见 variants.py）')
+        option_layout.addWidget(self.saver_box)
+
+        self.job_list = QListWidget(self)
+
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(button_layout)
+        main_layout.addLayout(profile_layout)
+        main_layout.addLayout(option_layout)
+        main_layout.addWidget(self.job_list)
+        self.setLayout(main_layout)
+
+        self.center_window()
+        self.show()
+
+        self.setWindowFlag(Qt.WindowType.WindowStaysOnTopHint, False)
+        self.show()
+
+    def center_window(self):
+        screen = QApplication.primaryScreen()
+        screen_geometry = screen.geometry()
+        window_geometry = self.frameGeometry()
+        center_point = screen_geometry.center()
+        window_geometry.moveCenter(center_point)
+        self.move(window_geometry.topLeft())
+
+    def clipboard_urls(self):
+        # 剪贴板里可以一次粘贴多个链接（换行或空格分隔）
+        return URL_RE.findall(QApplication.clipboard().text())
+
+    def process_clipboard(self):
+        self.enqueue_clipboard(to_pdf=False)
+
+    def process_clipboard_to_pdf(self):
+        self.enqueue_clipboard(to_pdf=True)
+
+    def enqueue_clipboard(self, to_pdf):
+        urls = self.clipboard_urls()
+        if not urls:
+            print("剪贴板为空或不包含URL")
+            return
+        for url in urls:
+            self.add_job(url, to_pdf)
+
+    def on_clipboard_changed(self):
+        # 勾选“自动识别剪贴板链接”后，复制的文章链接直接加入队列并转成 PDF
+        if self.auto_box.isChecked():
+            for url in self.clipboard_urls():
+                self.add_job(url, to_pdf=True)
+
+    def add_job(self, url, to_pdf):
+        """把一篇文章加入队列；同一链接正在排队或下载时忽略。"""
+        if any(job['url'] == url and job['state'] in ('等待', '下载中') for job in self.jobs):
+            print(f"已在队列中: {url}")
+            return
+        job = {
+            'url': url,
+            'to_pdf': to_pdf,
+            'profile': self.profile_box.currentData(),
+            'dedup': self.dedup_box.isChecked(),
+            'near_dup': self.dedup_box.isChecked() and self.near_dup_box.isChecked(),
+            'optimize': self.fast_box.isChecked(),
+            'split_tall': self.tall_box.isChecked(),
+            'variant': 'screen' if self.saver_box.isChecked() else None,
+            'name': url,            # 取得文章标题后换成输出名称
+            'state': '等待',
+            'detail': '',
+            'thread': None,
+            'reported': False,
+        }
+        self.job_list.addItem(url)
+        job['item'] = self.job_list.item(self.job_list.count() - 1)
+        self.jobs.append(job)
+        self.update_job(job)
+        self.start_jobs()
+
+    def update_job(self, job):
+        kind = 'PDF' if job['to_pdf'] else '图片'
+        text = f"[{job['state']}] {kind} {job['name']}"
+        if job['detail']:
+            text += f"  {job['detail']}"
+        job['item'].setText(text)
+
+    def start_jobs(self):
+        # 最多同时处理 MAX_ACTIVE_JOBS 篇，其余排队；各篇的图片在共享线程池中轮流下载
+        active = sum(1 for job in self.jobs if job['state'] == '下载中')
+        waiting = [job for job in self.jobs if job['state'] == '等待']
+        for job in waiting:
+            if active >= MAX_ACTIVE_JOBS:
+                break
+            # 常驻转换服务在运行时由线程自己交给它处理（见 DownloadThread.run）
+            sessions, executor = self.shared_pool()
+            thread = DownloadThread(job['url'], throttler=self.throttler, cache=self.cache,
+                                    profile=job['profile'], dedup=job['dedup'], near_dup=job['near_dup'],
+                                    prober=self.prober,
+                                    out_dir=self.out_dir, to_pdf=job['to_pdf'],
+                                    sessions=sessions, executor=executor, optimize=job['optimize'],
+                                    split_tall=job['split_tall'], variant=job['variant'],
+                                    page_cache=self.page_cache, strict=self.strict, use_daemon=True)
+            thread.titled.connect(partial(self.on_job_titled, job))
+            thread.progress.connect(partial(self.on_job_progress, job))
+            thread.finished.connect(partial(self.on_job_finished, job))
+            thread.error.connect(partial(self.on_job_error, job))
+            job['thread'] = thread
+            job['state'] = '下载中'
+            self.update_job(job)
+            thread.start()
+            active += 1
+
+    def on_job_titled(self, job, name):
+        job['name'] = name
+        self.update_job(job)
+
+    def on_job_progress(self, job, done, total, speed):
+        # 在队列中显示每篇文章的进度与速度
+        job['detail'] = f"{done}/{total} {speed:.1f}MB/s"
+        self.update_job(job)
+
+    def on_job_finished(self, job, path):
+        job['state'] = '完成'
+        job['detail'] = ''
+        job['item'].setToolTip(path)
+        self.update_job(job)
+        print(f"已保存: {path}")
+        self.job_done()
+
+    def on_job_error(self, job, error_msg):
+        job['state'] = '失败'
+        job['detail'] = error_msg.splitlines()[0] if error_msg else ''
+        job['item'].setToolTip(error_msg)
+        self.update_job(job)
+        print(f"下载出错 {job['url']}: {error_msg}")
+        self.job_done()
+
+    def job_done(self):
+        self.start_jobs()
+        if any(job['state'] in ('等待', '下载中') for job in self.jobs):
+            return
+        # 队列全部处理完后只提示一次
+        finished = [job for job in self.jobs if not job['reported']]
+        for job in finished:
+            job['reported'] = True
+        failed = sum(1 for job in finished if job['state'] == '失败')
+        msg = QMessageBox(self)
+        msg.setWindowFlag(Qt.WindowType.WindowStaysOnTopHint)
+        msg.setIcon(QMessageBox.Icon.Warning if failed else QMessageBox.Icon.Information)
+        msg.setText(f"{len(finished) - failed} 篇完成，{failed} 篇失败\n保存路径：{self.out_dir}")
+        msg.setWindowTitle("队列完成")
+        msg.exec()
+
+    def convert_images_to_pdf(self):
+        from core import list_images
+
+        folder = QFileDialog.getExistingDirectory(self, '选择包含图片的文件夹')
+        if not folder:
+            return
+
+        img_paths = list_images(folder)
+
+        if not img_paths:
+            print('该文件夹下没有可转换的图片。')
+            return
+
+        # 预览缩略图，可以拖动调整页序、排除不需要的图片
+        from preview import PreviewDialog
+        dialog = PreviewDialog(img_paths, self, cache=self.thumbs)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        img_paths = dialog.paths()
+        if not img_paths:
+            print('没有选择要转换的图片。')
+            return
+
+        pdf_path, _ = QFileDialog.getSaveFileName(self, '保存PDF文件', os.path.join(folder, '转换图像.pdf'), "PDF Files (*.pdf)")
+        if not pdf_path:
+            return
+
+        self.build_thread = BuildThread(img_paths, pdf_path, profile=self.profile_box.currentData(),
+                                        dedup=self.dedup_box.isChecked(),
+                                        near_dup=self.dedup_box.isChecked() and self.near_dup_box.isChecked(),
+                                        optimize=self.fast_box.isChecked(),
+                                        split_tall=self.tall_box.isChecked(), page_cache=self.page_cache,
+                                        **self.volume_box.currentData())
+        self.build_thread.finished.connect(partial(self.on_build_finished, pdf_path))
+        self.build_thread.error.connect(self.on_build_error)
+        self.folder_button.setEnabled(False)
+        self.folder_button.setText("生成中...")
+        self.build_thread.start()
+
+    def on_build_finished(self, pdf_path, report):
+        self.folder_button.setEnabled(True)
+        self.folder_button.setText("转成PDF")
+        mode = report.get('mode', 'full')
+        if mode == 'unchanged':
+            print(f'没有新图片，PDF 保持不变: {pdf_path}')
+        elif mode == 'append':
+            print(f"已向 {pdf_path} 追加 {report['added']} 页")
+        elif len(report['volumes']) > 1:
+            print(f"PDF 分为 {len(report['volumes'])} 卷: {', '.join(report['volumes'])}")
+        else:
+            print(f'PDF 文件已保存为: {pdf_path}')
+        for removed in report['removed']:
+            print(f"去掉重复图片 {removed['path']}（{removed['reason']}）")
+        for split in report['split']:
+            print(f"长图 {split['src']} 切成了 {split['tiles']} 页")
+        if report['resized']:
+            print(f"压缩了 {report['resized']} 张图片，"
+                  f"{report['bytes_before'] / 1024 ** 2:.1f} MB → {report['bytes_after'] / 1024 ** 2:.1f} MB")
+        pages = report.get('page_cache')
+        if pages and pages['hits']:
+            print(f"复用了 {pages['hits']} 页已经写好的页面（命中率 {pages['hit_rate']:.0%}）")
+
+    def on_build_error(self, error_msg):
+        self.folder_button.setEnabled(True)
+        self.folder_button.setText("转成PDF")
+        print(f'合并图片时出错: {error_msg}')
+
+
+def report_startup(app):
+    # 启动速度基准（bench_startup.py）：窗口显示后写出标记文件并退出
+    marker = os.environ.get('WECHAT_PDF_STARTUP_MARKER')
+    if not marker:
+        return
+
+    def done():
+        with open(marker, 'w', encoding='utf-8') as f:
+            json.dump({'modules': len(sys.modules)}, f)
+        app.quit()
+    QTimer.singleShot(0, done)
+
+
+
+def main(strict=False):
+    app = QApplication(sys.argv)
+    win = ImageProcessor(strict=strict)
+    report_startup(app)
+    return app.exec()
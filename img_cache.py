@@ -0,0 +1,181 @@
+"""
+持久化的图片缓存：按清洗后的图片 URL（clean_img_url 的结果）索引，
+图片内容按 sha256 存放，多个 URL 指向同一内容时只存一份。
+
+命中时用 ETag / Last-Modified 发条件请求做再验证，304 直接用本地副本；
+总大小超过上限时按最近最少使用（LRU）淘汰。索引存放在 SQLite 中，
+可被批处理的多个进程同时使用。
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.wechat_img_cache')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3   # 2 GB
+
+
+class ImageCache:
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, fresh_for=0):
+        """
+        fresh_for: 缓存条目在这段时间（秒）内视为新鲜，直接使用而不再验证；
+        0 表示每次都向服务器再验证。
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.objects = os.path.join(root, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=30,
+                                   check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                validated REAL NOT NULL,
+                atime REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime);
+            CREATE TABLE IF NOT EXISTS probes (
+                url TEXT PRIMARY KEY,
+                width INTEGER,
+                height INTEGER,
+                format TEXT,
+                size INTEGER,
+                probed REAL NOT NULL
+            );
+        ''')
+        self._stats = {'hits': 0, 'revalidated': 0, 'misses': 0,
+                       'bytes_saved': 0, 'bytes_downloaded': 0, 'evicted': 0}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.objects, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """返回缓存条目（dict）或 None；内容文件丢失的条目视为未命中。"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT e.sha256, e.content_type, e.etag, e.last_modified, e.validated, b.size '
+                'FROM entries e JOIN blobs b ON b.sha256 = e.sha256 WHERE e.url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(('sha256', 'content_type', 'etag', 'last_modified', 'validated', 'size'), row))
+        if not os.path.exists(self._blob_path(entry['sha256'])):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return self.fresh_for > 0 and time.time() - entry['validated'] < self.fresh_for
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def materialize(self, url, entry, filename, revalidated=False):
+        """把缓存内容复制到 filename，并记为一次命中。"""
+        tmp = filename + '.part'
+        shutil.copyfile(self._blob_path(entry['sha256']), tmp)
+        os.replace(tmp, filename)
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._db.execute('UPDATE entries SET atime = ?, validated = ? WHERE url = ?', (now, now, url))
+            else:
+                self._db.execute('UPDATE entries SET atime = ? WHERE url = ?', (now, url))
+            self._stats['hits'] += 1
+            self._stats['revalidated'] += int(revalidated)
+            self._stats['bytes_saved'] += entry['size']
+        return filename
+
+    def store(self, url, filename, sha256, size, headers):
+        """把刚下载好的文件登记到缓存中，相同内容只保存一份。"""
+        blob = self._blob_path(sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(blob), suffix='.part')
+            os.close(fd)
+            shutil.copyfile(filename, tmp)
+            os.replace(tmp, blob)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO blobs (sha256, size) VALUES (?, ?)', (sha256, size))
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries '
+                '(url, sha256, content_type, etag, last_modified, validated, atime) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, sha256, headers.get('Content-Type'), headers.get('ETag'),
+                 headers.get('Last-Modified'), now, now))
+            self._stats['misses'] += 1
+            self._stats['bytes_downloaded'] += size
+        self.evict()
+
+    def lookup_probe(self, url):
+        """返回探测过的图片尺寸（见 probe.py），没有时返回 None。"""
+        with self._lock:
+            row = self._db.execute('SELECT width, height, format, size FROM probes WHERE url = ?',
+                                   (url,)).fetchone()
+        return dict(zip(('width', 'height', 'format', 'size'), row)) if row else None
+
+    def store_probe(self, url, width, height, fmt, size):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO probes (url, width, height, format, size, probed) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', (url, width, height, fmt, size, time.time()))
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def evict(self):
+        """按最近使用时间从旧到新淘汰条目，直到总大小不超过 max_bytes。"""
+        with self._lock:
+            total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._db.execute('SELECT url, sha256 FROM entries ORDER BY atime').fetchall()
+            for url, sha256 in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self._stats['evicted'] += 1
+                still_used = self._db.execute(
+                    'SELECT 1 FROM entries WHERE sha256 = ? LIMIT 1', (sha256,)).fetchone()
+                if still_used:
+                    continue
+                size = self._db.execute('SELECT size FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+                self._db.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                try:
+                    os.remove(self._blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+                total -= size[0] if size else 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['total_bytes'] = self.total_bytes()
+        return stats
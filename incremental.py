@@ -0,0 +1,139 @@
+"""
+增量更新已经生成过的 PDF。
+
+第一次生成时在 PDF 旁边保存一个状态文件（.<PDF 文件名>.pages.json），记录
+输入图片的文件名 / 大小 / 修改时间、生成选项、去重用的哈希以及 PDF 的
+对象编号与 xref 位置。之后同一个文件夹又多了图片时：
+
+- 原有图片都没变、只是末尾多了新图片，且 PDF 本身未被改动：
+  以 PDF 增量更新的方式只把新图片追加为新页面，旧图片不会被重新读取或写入；
+- 原有图片有改动、删除或顺序变化，或者选项不同：整份重新生成。
+"""
+import os
+import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from dedup import Deduper, _hash_or_none, hash_from_json, hash_to_json
+from normalize import normalize_images
+from pdf_writer import PdfWriter
+from profiles import apply_profile_all, get_profile, summarize
+from shards import write_pages
+from tiles import split_images
+
+STATE_VERSION = 2      # 2: 哈希中增加缩略图
+
+
+def state_path(pdf_path):
+    folder, name = os.path.split(pdf_path)
+    return os.path.join(folder, f'.{name}.pages.json')
+
+
+def source_info(path):
+    st = os.stat(path)
+    return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+
+
+def load_state(pdf_path):
+    try:
+        with open(state_path(pdf_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_state(pdf_path, state):
+    path = state_path(pdf_path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.part')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def can_append(state, pdf_path, options, sources):
+    """原有图片与 PDF 都没有变化、且只在末尾多了图片时才能增量追加。"""
+    if not state or state.get('options') != options:
+        return False
+    try:
+        st = os.stat(pdf_path)
+    except FileNotFoundError:
+        return False
+    if st.st_size != state['writer']['size'] or st.st_mtime_ns != state['pdf_mtime_ns']:
+        return False
+    old = state['sources']
+    return len(old) <= len(sources) and [list(s) for s in old] == sources[:len(old)]
+
+
+def update_pdf(img_paths, pdf_path, normalize=True, processes=None, profile=None, dedup=False,
+               dedup_threshold=None, split_tall=False, page_cache=None):
+    """
+    增量生成 PDF。返回报告：体积统计、removed（去掉的重复图片）、split（切分过的长图）、
+    mode（'append' / 'full' / 'unchanged'）以及 added（本次写入的页数）。
+    page_cache 为 PageCache 时复用以前写好的页面对象（见 page_cache.py）。
+    """
+    profile = get_profile(profile)
+    options = {
+        'version': STATE_VERSION,
+        'normalize': bool(normalize),
+        'profile': profile.name if profile else None,
+        'dedup_threshold': dedup_threshold if dedup else None,
+        'split_tall': bool(split_tall),
+    }
+    sources = [source_info(path) for path in img_paths]
+    state = load_state(pdf_path)
+    appending = can_append(state, pdf_path, options, sources)
+
+    if appending:
+        new_paths = img_paths[len(state['sources']):]
+        if not new_paths:
+            report = summarize([])
+            report.update(removed=[], split=[], mode='unchanged', added=0)
+            return report
+    else:
+        state = None
+        new_paths = list(img_paths)
+
+    removed = []
+    kept_hashes = list(state.get('kept', [])) if state else []
+    if dedup:
+        deduper = Deduper(dedup_threshold)
+        for entry in kept_hashes:
+            deduper.keep(entry['path'], hash_from_json(entry))
+        # 只为新图片计算哈希，已经写入的图片从状态文件恢复
+        if processes == 1 or len(new_paths) < 2:
+            hashes = [_hash_or_none(path) for path in new_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                hashes = list(pool.map(_hash_or_none, new_paths, chunksize=8))
+        kept = []
+        for path, h in zip(new_paths, hashes):
+            if h is None or deduper.check(path, h) is None:
+                kept.append(path)
+                if h is not None:
+                    kept_hashes.append(dict(hash_to_json(h), path=path))
+        removed = deduper.removed
+        new_paths = kept
+
+    split = []
+    if split_tall:
+        parts = split_images(new_paths, processes=processes)
+        split = [{'src': src, 'tiles': len(group)} for src, group in zip(new_paths, parts) if len(group) > 1]
+        new_paths = [path for group in parts for path in group]
+    if normalize:
+        new_paths = normalize_images(new_paths, processes=processes)
+    results = apply_profile_all(new_paths, profile, processes=processes)
+
+    writer = PdfWriter.resume(pdf_path, state['writer']) if appending else PdfWriter(pdf_path)
+    with writer:
+        write_pages(writer, [r.path for r in results], processes, page_cache=page_cache)
+
+    save_state(pdf_path, {
+        'options': options,
+        'sources': sources,
+        'kept': kept_hashes,
+        'writer': writer.state(),
+        'pdf_mtime_ns': os.stat(pdf_path).st_mtime_ns,
+    })
+    report = summarize(results)
+    report.update(removed=removed, split=split, mode='append' if appending else 'full', added=len(results))
+    return report
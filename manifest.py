@@ -0,0 +1,126 @@
+"""
+每个输出文件夹里的下载清单（manifest.json），记录每张图片的
+序号、来源地址、状态、大小与 sha256。
+
+重新运行同一篇文章时，清单中已完成且校验通过的图片直接复用，
+只下载缺失或损坏的部分；生成 PDF 时也可以直接按清单确定页序。
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+MANIFEST_NAME = 'manifest.json'
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+
+    def __init__(self, folder, article_url=None):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.article_url = article_url
+        self.images = {}        # idx -> {url, status, file, size, sha256, error}
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def exists(cls, folder):
+        return os.path.exists(os.path.join(folder, MANIFEST_NAME))
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        # 文件夹被另一篇文章复用时，旧清单作废
+        if self.article_url and data.get('url') != self.article_url:
+            return
+        self.article_url = data.get('url')
+        self.images = {int(idx): entry for idx, entry in data.get('images', {}).items()}
+
+    def save(self):
+        with self._lock:
+            data = {
+                'url': self.article_url,
+                'updated': time.time(),
+                'images': {str(idx): self.images[idx] for idx in sorted(self.images)},
+            }
+            os.makedirs(self.folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.folder, prefix='.manifest', suffix='.part')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+
+    def plan(self, jobs):
+        """登记本次要处理的 [(idx, url), ...]，地址变了的条目重置为 pending。"""
+        with self._lock:
+            for idx, url in jobs:
+                entry = self.images.get(idx)
+                if entry is None or entry.get('url') != url:
+                    self.images[idx] = {'url': url, 'status': PENDING}
+        self.save()
+
+    def verified(self, idx, url):
+        """
+        返回已完成且文件完好的条目（含 path），否则返回 None。
+        文件缺失、大小或 sha256 不符都视为损坏，需要重新下载。
+        """
+        with self._lock:
+            entry = self.images.get(idx)
+            if not entry or entry.get('status') != DONE or entry.get('url') != url:
+                return None
+            entry = dict(entry)
+        path = os.path.join(self.folder, entry['file'])
+        try:
+            if os.path.getsize(path) != entry['size'] or file_sha256(path) != entry['sha256']:
+                return None
+        except OSError:
+            return None
+        entry['path'] = path
+        return entry
+
+    def record(self, result):
+        """记录一张图片的下载结果（DownloadResult）并立即落盘。"""
+        with self._lock:
+            if result.error:
+                self.images[result.idx] = {'url': result.url, 'status': FAILED, 'error': str(result.error)}
+            else:
+                self.images[result.idx] = {
+                    'url': result.url,
+                    'status': DONE,
+                    'file': os.path.basename(result.path),
+                    'size': result.size,
+                    'sha256': result.sha256,
+                }
+        self.save()
+
+    def pages(self):
+        """按序号返回已完成且文件存在的图片路径，即 PDF 的页序。"""
+        with self._lock:
+            entries = [self.images[idx] for idx in sorted(self.images)]
+        paths = []
+        for entry in entries:
+            if entry.get('status') == DONE:
+                path = os.path.join(self.folder, entry['file'])
+                if os.path.exists(path):
+                    paths.append(path)
+        return paths
+
+    def missing(self):
+        with self._lock:
+            return [idx for idx in sorted(self.images) if self.images[idx].get('status') != DONE]
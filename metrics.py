@@ -0,0 +1,233 @@
+"""
+流程各阶段的计时与统计：
+
+- 阶段耗时（span）：抓取文章、提取图片、下载、去重、规范化、写 PDF 等；
+- 每张图片的耗时、字节数、重试次数、写盘耗时；
+- 吞吐（MB/s）与内存峰值（可选，tracemalloc）。
+
+事件以 JSON lines 写入 jsonl_path，每行一个对象（type 为 span / image / summary）；
+close() 时可以另外写出 Prometheus textfile（供 node_exporter 的 textfile collector 采集）。
+on_progress(已完成, 总数, MB/s) 在每张图片完成时被调用，GUI 用它显示进度。
+
+界面和常驻服务每次运行都写默认日志 DEFAULT_METRICS_LOG，它们传入 max_bytes：
+打开时文件已超过上限就改名为 <文件名>.1（覆盖上一个），另起一个新文件，
+磁盘上最多保留约两倍上限的日志。
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from img_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_METRICS_LOG = os.path.join(DEFAULT_CACHE_DIR, 'metrics.jsonl')
+DEFAULT_LOG_BYTES = 16 * 1024 ** 2
+PROM_PREFIX = 'wechat_pdf'
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 4)
+
+
+def rotate_log(path, max_bytes):
+    """path 超过 max_bytes 时改名为 path.1（覆盖旧的），返回是否轮换。"""
+    try:
+        if os.path.getsize(path) <= max_bytes:
+            return False
+        os.replace(path, path + '.1')
+    except FileNotFoundError:
+        # 文件不存在，或者刚被另一个进程轮换
+        return False
+    return True
+
+
+class Metrics:
+
+    def __init__(self, jsonl_path=None, prom_path=None, trace_memory=False, on_progress=None, labels=None,
+                 max_bytes=None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.on_progress = on_progress
+        self.labels = dict(labels or {})
+        self.stages = {}            # 阶段名 -> 累计秒数
+        self.total = None
+        self.done = 0
+        self.failed = 0
+        self.cached = 0
+        self.bytes = 0
+        self.retries = 0
+        self.disk_seconds = 0.0
+        self.latencies = []
+        self.peak_bytes = None
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        self._own_tracemalloc = trace_memory and not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start()
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+            if max_bytes:
+                rotate_log(jsonl_path, max_bytes)
+            self._file = open(jsonl_path, 'a', encoding='utf-8')
+
+    def emit(self, kind, **fields):
+        if self._file is None:
+            return
+        record = {'type': kind, 'time': round(time.time(), 3)}
+        record.update(self.labels)
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def add_time(self, stage, seconds):
+        """累加某个阶段的耗时，不单独写事件（用于逐页的小步骤）。"""
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage, **fields):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.add_time(stage, seconds)
+            if error is not None:
+                fields['error'] = str(error)
+            self.emit('span', stage=stage, seconds=round(seconds, 4), **fields)
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+        self._progress()
+
+    def image(self, result):
+        """记录一张图片的 DownloadResult，可以直接作为 on_result 回调使用。"""
+        with self._lock:
+            self.done += 1
+            if result.error:
+                self.failed += 1
+            else:
+                self.bytes += result.size or 0
+                self.cached += bool(result.cached)
+            self.retries += result.retries or 0
+            self.disk_seconds += result.disk_seconds or 0.0
+            if result.latency is not None:
+                self.latencies.append(result.latency)
+        self.emit('image', idx=result.idx, url=result.url, bytes=result.size,
+                  latency=None if result.latency is None else round(result.latency, 4),
+                  retries=result.retries, disk_seconds=round(result.disk_seconds or 0.0, 4),
+                  cached=result.cached, error=str(result.error) if result.error else None)
+        self._progress()
+
+    def throughput(self):
+        elapsed = time.monotonic() - self._start
+        return self.bytes / 1024 ** 2 / elapsed if elapsed > 0 else 0.0
+
+    def _progress(self):
+        if self.on_progress:
+            self.on_progress(self.done, self.total or 0, self.throughput())
+
+    def summary(self):
+        if tracemalloc.is_tracing():
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        with self._lock:
+            latencies = list(self.latencies)
+            return {
+                'seconds': round(time.monotonic() - self._start, 3),
+                'stages': {k: round(v, 4) for k, v in self.stages.items()},
+                'images': self.done,
+                'failed': self.failed,
+                'cached': self.cached,
+                'bytes': self.bytes,
+                'retries': self.retries,
+                'disk_seconds': round(self.disk_seconds, 4),
+                'mb_per_s': round(self.throughput(), 3),
+                'latency_p50': percentile(latencies, 0.5),
+                'latency_p95': percentile(latencies, 0.95),
+                'latency_max': round(max(latencies), 4) if latencies else None,
+                'peak_mb': round(self.peak_bytes / 1024 ** 2, 2) if self.peak_bytes is not None else None,
+            }
+
+    def close(self):
+        summary = self.summary()
+        self.emit('summary', **summary)
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+        if self.prom_path:
+            write_prometheus(self.prom_path, [(self.labels, summary)])
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ''
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def write_prometheus(path, summaries):
+    """
+    把一组 (labels, summary) 写成 Prometheus textfile 格式。
+    先写临时文件再替换，采集器不会读到写了一半的文件。
+    """
+    gauges = [
+        ('seconds', 'seconds', '整个流程的耗时（秒）'),
+        ('images', 'images', '处理的图片数'),
+        ('failed', 'failed_images', '失败的图片数'),
+        ('cached', 'cached_images', '使用本地缓存的图片数'),
+        ('bytes', 'downloaded_bytes', '下载的字节数'),
+        ('retries', 'retries', '重试次数'),
+        ('disk_seconds', 'disk_write_seconds', '写盘耗时（秒）'),
+        ('mb_per_s', 'throughput_mb_per_second', '下载吞吐（MB/s）'),
+        ('latency_p50', 'image_latency_p50_seconds', '单张图片耗时中位数（秒）'),
+        ('latency_p95', 'image_latency_p95_seconds', '单张图片耗时 95 分位（秒）'),
+        ('peak_mb', 'peak_memory_mb', 'tracemalloc 统计的内存峰值（MB）'),
+    ]
+    lines = []
+    for key, name, help_text in gauges:
+        lines.append(f'# HELP {PROM_PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PROM_PREFIX}_{name} gauge')
+        for labels, summary in summaries:
+            if summary.get(key) is not None:
+                lines.append(f'{PROM_PREFIX}_{name}{_prom_labels(labels)} {summary[key]}')
+    name = f'{PROM_PREFIX}_stage_seconds'
+    lines.append(f'# HELP {name} 各阶段耗时（秒）')
+    lines.append(f'# TYPE {name} gauge')
+    for labels, summary in summaries:
+        for stage, seconds in summary.get('stages', {}).items():
+            lines.append(f'{name}{_prom_labels(dict(labels, stage=stage))} {seconds}')
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp, path)
@@ -1,5 +1,14 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# 用不到的大模块：PyInstaller 的依赖分析会把它们拉进来，单文件 exe 每次启动都要解压
+EXCLUDES = [
+    'tkinter', 'matplotlib', 'IPython', 'jupyter_client', 'pytest', 'scipy', 'pandas',
+    'lxml', 'html5lib', 'img2pdf',
+    'PyQt6.QtNetwork', 'PyQt6.QtQml', 'PyQt6.QtQuick', 'PyQt6.QtSql', 'PyQt6.QtOpenGL',
+    'PyQt6.QtOpenGLWidgets', 'PyQt6.QtMultimedia', 'PyQt6.QtPdf', 'PyQt6.QtWebEngineCore',
+    'PyQt6.QtWebEngineWidgets', 'PyQt6.QtBluetooth', 'PyQt6.QtDBus', 'PyQt6.QtDesigner',
+    'PyQt6.QtHelp', 'PyQt6.QtPrintSupport', 'PyQt6.QtSvg', 'PyQt6.QtTest', 'PyQt6.QtXml',
+]
 
 a = Analysis(
     ['mian.py'],
@@ -10,7 +19,7 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=0,
 )
@@ -0,0 +1,57 @@
+# -*- mode: python ; coding: utf-8 -*-
+
+# 目录版：不必像单文件 exe 那样每次启动都解压到临时目录，启动更快。
+# pyinstaller mian_onedir.spec，结果在 dist/mian/ 下，整个目录一起分发。
+# 排除的模块与 mian.spec 相同。
+EXCLUDES = [
+    'tkinter', 'matplotlib', 'IPython', 'jupyter_client', 'pytest', 'scipy', 'pandas',
+    'lxml', 'html5lib', 'img2pdf',
+    'PyQt6.QtNetwork', 'PyQt6.QtQml', 'PyQt6.QtQuick', 'PyQt6.QtSql', 'PyQt6.QtOpenGL',
+    'PyQt6.QtOpenGLWidgets', 'PyQt6.QtMultimedia', 'PyQt6.QtPdf', 'PyQt6.QtWebEngineCore',
+    'PyQt6.QtWebEngineWidgets', 'PyQt6.QtBluetooth', 'PyQt6.QtDBus', 'PyQt6.QtDesigner',
+    'PyQt6.QtHelp', 'PyQt6.QtPrintSupport', 'PyQt6.QtSvg', 'PyQt6.QtTest', 'PyQt6.QtXml',
+]
+
+a = Analysis(
+    ['mian.py'],
+    pathex=[],
+    binaries=[],
+    datas=[('1.ico', '.')],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=1,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='mian',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    # UPX 压缩的 DLL 每次加载都要先解压，目录版不压缩
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=['3.ico'],
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='mian',
+)
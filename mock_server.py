@@ -0,0 +1,328 @@
+"""
+本地模拟的公众号文章 / 图片 CDN 服务器，供基准测试（bench.py）和离线调试使用，
+不需要访问 mp.weixin.qq.com。
+
+- /s/<任意名称>：合成的文章 HTML，结构仿照公众号页面，图片地址指向本服务器；
+- /mmbiz_<格式>/img<序号>/640?wx_fmt=<格式>：按序号确定性生成的图片，
+  支持 ETag / If-None-Match 与 Range 请求；icon_every 大于 0 时每隔几张
+  换成小图标或又宽又扁的分隔线，模拟文章中的装饰图片；
+- variants 为 True 时模拟 CDN 的变体：文章中的地址以 /0（原图）结尾，
+  路径最后一段的宽度、wx_fmt 与 tp=webp 会按要求缩小、转换图片（见 variants.py），
+  bad_variants 为变体请求返回错误页面的概率。
+
+可以注入延迟（latency）、单个响应的带宽上限（bandwidth，字节/秒）
+以及按概率返回的 429 / 5xx 错误（error_rate）。
+
+单独运行：
+    python mock_server.py --images 100 --latency 0.05 --error-rate 0.05
+"""
+import io
+import sys
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from PIL import Image, ImageDraw
+
+FORMATS = ('jpeg', 'png', 'webp', 'gif')
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp', 'gif': 'image/gif'}
+SEND_CHUNK = 16 * 1024
+
+
+def synthetic_image(idx, fmt='jpeg', size=(1080, 1440), seed=0):
+    """按序号生成内容固定的图片：渐变底色加随机色块，压缩率接近真实配图。"""
+    rng = random.Random(seed * 100003 + idx)
+    width, height = size
+    im = Image.linear_gradient('L').resize(size).convert('RGB')
+    draw = ImageDraw.Draw(im)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        max_w, max_h = max(1, width // 3), max(1, height // 4)
+        w, h = rng.randint(min(20, max_w), max_w), rng.randint(min(20, max_h), max_h)
+        draw.rectangle((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+    draw.text((20, 20), f'mock image {idx}', fill=(0, 0, 0))
+
+    buf = io.BytesIO()
+    if fmt == 'jpeg':
+        im.save(buf, 'JPEG', quality=85)
+    elif fmt == 'png':
+        im.save(buf, 'PNG')
+    elif fmt == 'webp':
+        im.save(buf, 'WEBP', quality=80)
+    else:
+        im.convert('P', palette=Image.Palette.ADAPTIVE).save(buf, 'GIF')
+    return buf.getvalue()
+
+
+def variant_image(body, width=0, fmt='jpeg'):
+    """把图片缩小到不超过 width 像素宽（0 为不缩小）并转为 fmt 格式。"""
+    with Image.open(io.BytesIO(body)) as im:
+        im = im.convert('RGB')
+    if width and im.width > width:
+        im = im.resize((width, max(1, im.height * width // im.width)), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    if fmt == 'png':
+        im.save(buf, 'PNG')
+    elif fmt == 'webp':
+        im.save(buf, 'WEBP', quality=80)
+    elif fmt == 'gif':
+        im.convert('P', palette=Image.Palette.ADAPTIVE).save(buf, 'GIF')
+    else:
+        im.save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+
+def article_html(base_url, images, formats=FORMATS, title='模拟 测试 文章', paragraphs_per_image=2,
+                 suffix='640?wx_fmt={fmt}&amp;from=appmsg&amp;tp=webp'):
+    # 与 bench_extract.synthetic_article 类似，但图片地址指向本地服务器
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8">',
+             '<script>' + 'var x = "<img src=fake>";' * 200 + '</script></head><body>',
+             f'<h1 class="rich_media_title">{title}</h1><div id="js_content">']
+    for i in range(1, images + 1):
+        fmt = formats[(i - 1) % len(formats)]
+        for _ in range(paragraphs_per_image):
+            parts.append('<section><p><span style="font-size: 15px;">这是一段用于测试的正文内容。</span></p></section>')
+        parts.append(f'<p><img class="rich_pages wxw-img" data-type="{fmt}" '
+                     f'data-src="{base_url}/mmbiz_{fmt}/img{i}/{suffix.format(fmt=fmt)}"></p>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def parse_range(value, length):
+    # 只支持单个 bytes=start-end / bytes=start- 区间
+    if not value or not value.startswith('bytes=') or ',' in value:
+        return None
+    start, _, end = value[6:].partition('-')
+    if not start.isdigit():
+        return None
+    start = int(start)
+    end = min(int(end), length - 1) if end.isdigit() else length - 1
+    return (start, end) if start <= end else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server.mock
+        server.count('requests')
+        if server.latency:
+            time.sleep(server.latency)
+
+        path, _, query = self.path.partition('?')
+        if path.startswith('/s/'):
+            suffix = '0?wx_fmt={fmt}&amp;from=appmsg' if server.variants else \
+                '640?wx_fmt={fmt}&amp;from=appmsg&amp;tp=webp'
+            body = article_html(server.base_url, server.images, server.formats, suffix=suffix).encode('utf-8')
+            return self._send(200, body, 'text/html; charset=utf-8')
+
+        parts = path.strip('/').split('/')
+        if len(parts) < 2 or not parts[0].startswith('mmbiz_') or not parts[1].startswith('img'):
+            return self._send(404, b'not found', 'text/plain')
+        fmt = parts[0][len('mmbiz_'):]
+        try:
+            idx = int(parts[1][3:])
+        except ValueError:
+            return self._send(404, b'not found', 'text/plain')
+        if fmt not in CONTENT_TYPES or not 1 <= idx <= server.images:
+            return self._send(404, b'not found', 'text/plain')
+
+        status = server.inject_error()
+        if status:
+            server.count('errors')
+            headers = {}
+            if status == 429 and server.retry_after is not None:
+                headers['Retry-After'] = str(server.retry_after)
+            return self._send(status, b'busy', 'text/plain', headers)
+
+        width, out = 0, fmt
+        if server.variants:
+            params = dict(parse_qsl(query))
+            width = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+            if params.get('tp') == 'webp':
+                out = 'webp'
+            elif params.get('wx_fmt') in CONTENT_TYPES:
+                out = params['wx_fmt']
+            if (width or out != fmt) and server.bad_variant():
+                server.count('bad_variants')
+                return self._send(200, b'<html>error</html>', 'text/html')
+
+        body, etag = server.image(idx, fmt, width, out)
+        fmt = out
+        if self.headers.get('If-None-Match') == etag:
+            server.count('not_modified')
+            return self._send(304, b'', None, {'ETag': etag})
+        byte_range = parse_range(self.headers.get('Range'), len(body))
+        if byte_range:
+            server.count('ranges')
+            start, end = byte_range
+            headers = {'ETag': etag, 'Content-Range': f'bytes {start}-{end}/{len(body)}'}
+            return self._send(206, body[start:end + 1], CONTENT_TYPES[fmt], headers, server.bandwidth)
+        self._send(200, body, CONTENT_TYPES[fmt], {'ETag': etag}, server.bandwidth)
+
+    def _send(self, status, body, content_type, headers=None, bandwidth=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if status == 304:
+            return
+        try:
+            if not bandwidth:
+                self.wfile.write(body)
+            else:
+                # 按带宽上限分块发送
+                start = time.monotonic()
+                for pos in range(0, len(body), SEND_CHUNK):
+                    self.wfile.write(body[pos:pos + SEND_CHUNK])
+                    ahead = (pos + SEND_CHUNK) / bandwidth - (time.monotonic() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        self.server.mock.count('bytes_sent', len(body))
+
+
+class MockWechatServer:
+    """
+    在后台线程中运行的模拟服务器，可以用作上下文管理器：
+
+        with MockWechatServer(images=50, latency=0.02) as server:
+            download_article(server.article_url, folder)
+    """
+
+    def __init__(self, images=50, formats=FORMATS, image_size=(1080, 1440), latency=0.0,
+                 bandwidth=None, error_rate=0.0, error_statuses=(429, 503), retry_after=None,
+                 seed=0, icon_every=0, variants=False, bad_variants=0.0, host='127.0.0.1', port=0):
+        self.images = images
+        self.formats = tuple(formats)
+        self.image_size = image_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.retry_after = retry_after
+        self.seed = seed
+        self.icon_every = icon_every
+        self.variants = variants
+        self.bad_variants = bad_variants
+        self.stats = {'requests': 0, 'errors': 0, 'not_modified': 0, 'ranges': 0, 'bytes_sent': 0,
+                      'bad_variants': 0}
+        self._images = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def article_url(self):
+        return f'{self.base_url}/s/mock-{self.seed}-{self.images}'
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def inject_error(self):
+        # 返回要注入的错误状态码，不注入时返回 None；随机序列由 seed 决定
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._rng.random() < self.error_rate:
+                return self._rng.choice(self.error_statuses)
+        return None
+
+    def bad_variant(self):
+        if not self.bad_variants:
+            return False
+        with self._lock:
+            return self._rng.random() < self.bad_variants
+
+    def image(self, idx, fmt, width=0, out=None):
+        key = (idx, fmt, width, out or fmt)
+        with self._lock:
+            cached = self._images.get(key)
+        if cached is None:
+            body = synthetic_image(idx, fmt, self.size_for(idx), self.seed)
+            if width or (out or fmt) != fmt:
+                body = variant_image(body, width, out or fmt)
+            cached = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+            with self._lock:
+                self._images[key] = cached
+        return cached
+
+    def size_for(self, idx):
+        # 装饰图片：奇数轮是 40x40 的小图标，偶数轮是 1080x24 的分隔线
+        if self.icon_every and idx % self.icon_every == 0:
+            return (40, 40) if (idx // self.icon_every) % 2 else (1080, 24)
+        return self.image_size
+
+    def warm(self):
+        """预先生成全部图片，避免把生成图片的时间算进下载耗时。"""
+        for i in range(1, self.images + 1):
+            self.image(i, self.formats[(i - 1) % len(self.formats)])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地模拟公众号文章 / 图片服务器')
+    parser.add_argument('--images', type=int, default=50, help='文章中的图片数')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='图片格式，逗号分隔，轮流使用')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的延迟（秒）')
+    parser.add_argument('--bandwidth', type=float, default=0, help='单个响应的带宽上限（KB/s），0 为不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='图片请求返回 429 / 503 的概率')
+    parser.add_argument('--retry-after', type=float, default=None, help='429 响应的 Retry-After（秒）')
+    parser.add_argument('--icon-every', type=int, default=0, help='每隔几张换成小图标 / 分隔线，0 为不插入')
+    parser.add_argument('--variants', action='store_true', help='模拟 CDN 的宽度 / 格式变体')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    server = MockWechatServer(images=args.images, formats=args.formats.split(','),
+                              latency=args.latency, bandwidth=args.bandwidth * 1024 or None,
+                              error_rate=args.error_rate, retry_after=args.retry_after,
+                              icon_every=args.icon_every, variants=args.variants, port=args.port)
+    server.warm()
+    print(f'文章地址: {server.article_url}')
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+生成 PDF 前的图片规范化：
+
+- JPEG（灰度 / RGB / CMYK）以及不透明的灰度 / RGB PNG 原样使用，不做任何处理；
+- 有损 WebP 转成 JPEG，无损 WebP 转成 PNG；
+- GIF（包括动图）只取第一帧；
+- 透明通道铺到白色背景上去掉；
+- 转换后的图片按 EXIF 方向转正。
+
+转换结果按源文件的 sha256 缓存在 cache_dir 中，重复运行时直接复用。
+多张图片通过进程池并行处理。
+"""
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from img_cache import DEFAULT_CACHE_DIR
+from manifest import file_sha256
+
+DEFAULT_NORMALIZE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'normalized')
+NORMALIZE_VERSION = 2       # 转换规则变化时加一，旧的缓存结果自动失效
+JPEG_QUALITY = 95
+PASSTHROUGH = {'JPEG': ('L', 'RGB', 'CMYK'), 'PNG': ('L', 'RGB')}
+
+
+def is_lossless_webp(path):
+    # 无损 WebP 使用 VP8L 编码块，有损的是 VP8
+    with open(path, 'rb') as f:
+        return b'VP8L' in f.read(64 * 1024)
+
+
+def needs_normalize(path):
+    with Image.open(path) as im:
+        return im.mode not in PASSTHROUGH.get(im.format, ())
+
+
+def flatten(im):
+    """动图取第一帧，透明部分铺白底，结果为 L 或 RGB。"""
+    if getattr(im, 'is_animated', False):
+        im.seek(0)
+    if im.mode in ('RGBA', 'LA', 'PA') or (im.mode == 'P' and 'transparency' in im.info):
+        rgba = im.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if im.mode in ('1', 'L') or im.mode.startswith('I') or im.mode == 'F':
+        return im.convert('L')
+    return im.convert('RGB')
+
+
+def normalize_one(path, cache_dir=DEFAULT_NORMALIZE_DIR):
+    """返回可以直接写入 PDF 的图片路径：无需处理时就是 path 本身。"""
+    if not needs_normalize(path):
+        return path
+
+    digest = file_sha256(path)
+    base = os.path.join(cache_dir, digest[:2], f'{digest}-v{NORMALIZE_VERSION}')
+    for ext in ('.jpg', '.png'):
+        if os.path.exists(base + ext):
+            return base + ext
+
+    with Image.open(path) as im:
+        lossy = im.format == 'WEBP' and not is_lossless_webp(path)
+        # 转换结果不带 EXIF，先按方向转正
+        flat = flatten(ImageOps.exif_transpose(im))
+
+    target = base + ('.jpg' if lossy else '.png')
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+    os.close(fd)
+    try:
+        if lossy:
+            flat.save(tmp, 'JPEG', quality=JPEG_QUALITY)
+        else:
+            flat.save(tmp, 'PNG')
+        os.replace(tmp, target)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return target
+
+
+def _normalize_or_keep(path, cache_dir):
+    # 规范化失败时保留原图，交给 PDF 生成阶段决定如何处理
+    try:
+        return normalize_one(path, cache_dir)
+    except Exception as e:
+        print(f'无法规范化图片 {path}: {e}')
+        return path
+
+
+def normalize_images(img_paths, processes=None, cache_dir=DEFAULT_NORMALIZE_DIR, pool=None):
+    """
+    并行规范化一组图片，返回顺序不变的路径列表。
+    processes 为 1 时在当前进程内处理；传入 pool 时复用已有的进程池。
+    """
+    if not img_paths:
+        return []
+    if pool is not None:
+        return list(pool.map(_normalize_or_keep, img_paths, [cache_dir] * len(img_paths)))
+    if processes == 1 or len(img_paths) == 1:
+        return [_normalize_or_keep(path, cache_dir) for path in img_paths]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        chunksize = max(1, len(img_paths) // ((processes or os.cpu_count() or 1) * 4))
+        return list(pool.map(_normalize_or_keep, img_paths, [cache_dir] * len(img_paths),
+                             chunksize=chunksize))
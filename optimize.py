@@ -0,0 +1,114 @@
+"""
+把生成的 PDF 改写成便于快速打开的形式（需要 pikepdf，未安装时不可用）：
+
+- 线性化（“快速 Web 查看”）：第一页需要的对象和提示表放在文件开头，
+  阅读器或文档服务器读到前面一小部分就能显示第一页，不必等整个文件；
+- 对象流与 xref 流：页面字典等小对象压缩后存放，目录更小；
+- 每页附带一张小缩略图（/Thumb），阅读器的缩略图栏不必解码整页大图；
+- 书签：每张来源图片或每篇文章一项。
+
+图片流原样保留，不重新编码。
+"""
+import io
+import os
+import re
+import tempfile
+import importlib.util
+
+from PIL import Image
+
+THUMB_SIZE = 128
+THUMB_QUALITY = 70
+LINEARIZED_RE = re.compile(rb'/Linearized\b.*?/E\s+(\d+)', re.S)
+
+
+def available():
+    # 只查找，不导入：界面启动时调用也不会拖慢
+    return importlib.util.find_spec('pikepdf') is not None
+
+
+def _page_image(page):
+    xobjects = page.obj.get('/Resources', {}).get('/XObject', {})
+    for key in xobjects.keys():
+        if xobjects[key].get('/Subtype') == '/Image':
+            return xobjects[key]
+    return None
+
+
+def _thumbnail(pdf, image):
+    import pikepdf
+
+    raw = image.read_raw_bytes()
+    if image.get('/Filter') == pikepdf.Name.DCTDecode:
+        # JPEG 用 draft 模式按缩小后的尺寸解码，比完整解码快得多
+        im = Image.open(io.BytesIO(raw))
+        im.draft('RGB', (THUMB_SIZE, THUMB_SIZE))
+    else:
+        im = pikepdf.PdfImage(image).as_pil_image()
+    im = im.convert('L' if im.mode in ('1', 'L') else 'RGB')
+    im.thumbnail((THUMB_SIZE, THUMB_SIZE))
+    buf = io.BytesIO()
+    im.save(buf, 'JPEG', quality=THUMB_QUALITY)
+    return pdf.make_stream(buf.getvalue(), Width=im.size[0], Height=im.size[1],
+                           ColorSpace=pikepdf.Name.DeviceGray if im.mode == 'L' else pikepdf.Name.DeviceRGB,
+                           BitsPerComponent=8, Filter=pikepdf.Name.DCTDecode)
+
+
+def optimize_pdf(pdf_path, outline=None, title=None, thumbnails=True, linearize=True):
+    """
+    原地改写 pdf_path。outline 为书签标题列表（每页一项，None 表示该页没有书签），
+    title 不为空时作为顶层书签，outline 中的各项放在它下面，同时写入文档标题。
+    返回页数。
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        raise RuntimeError('优化 PDF 需要安装 pikepdf（pip install pikepdf）')
+
+    folder = os.path.dirname(os.path.abspath(pdf_path))
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+    os.close(fd)
+    try:
+        with pikepdf.open(pdf_path) as pdf:
+            pages = len(pdf.pages)
+            if thumbnails:
+                for page in pdf.pages:
+                    image = _page_image(page)
+                    if image is not None:
+                        try:
+                            page.obj.Thumb = _thumbnail(pdf, image)
+                        except Exception as e:
+                            print(f'无法生成缩略图: {e}')
+            if outline or title:
+                with pdf.open_outline() as tree:
+                    items = [pikepdf.OutlineItem(str(name), i)
+                             for i, name in enumerate(outline or []) if name and i < pages]
+                    if title:
+                        root = pikepdf.OutlineItem(title, 0)
+                        root.children.extend(items)
+                        items = [root]
+                    tree.root.extend(items)
+                pdf.Root.PageMode = pikepdf.Name.UseOutlines
+            if title:
+                with pdf.open_metadata(set_pikepdf_as_editor=False) as meta:
+                    meta['dc:title'] = title
+            pdf.save(tmp, linearize=linearize, object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                     compress_streams=True)
+        os.replace(tmp, pdf_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return pages
+
+
+def first_page_bytes(pdf_path):
+    """
+    阅读器顺序读取时，显示第一页之前必须读到的字节数：
+    线性化文件为第一页部分的结尾（/E），普通文件要读到末尾的 xref，即整个文件。
+    """
+    with open(pdf_path, 'rb') as f:
+        head = f.read(2048)
+    match = LINEARIZED_RE.search(head)
+    if match:
+        return int(match.group(1))
+    return os.path.getsize(pdf_path)
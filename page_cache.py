@@ -0,0 +1,218 @@
+"""
+跨多次生成复用的页面对象缓存：同一批图片先生成每篇文章的 PDF，
+之后又合订成周刊、月刊时，不必再把每张图片重新解码、压缩一遍。
+
+PdfWriter 写好一页后，把这一页的对象（图片 XObject 流、SMask、内容流与页面字典，
+其中已经包含尺寸、色彩空间与压缩方式）原样存成一个文件，按图片内容的 sha256 命名；
+以后任何 PDF 遇到内容相同的图片，直接用 PdfWriter.copy_page 把这些对象复制进去，
+只重写对象编号。缓存文件的格式：页面对象 + 布局的 JSON + 4 字节的 JSON 长度。
+布局中记录页面对象部分的 sha256，复制前先校验，截断或内容损坏的文件删掉后重新生成，
+不会把坏对象写进 PDF（校验只是顺序读一遍文件，比重新解码、压缩图片快得多）。
+
+JPEG 本来就是原样嵌入的，复用省不了什么，反而要多存一份，因此不进缓存。
+磁盘总大小超过上限时按最近使用时间淘汰（与 thumbs.py 相同）。
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+
+from img_cache import DEFAULT_CACHE_DIR
+from manifest import file_sha256
+
+DEFAULT_PAGE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'pages')
+PAGE_VERSION = 3        # PdfWriter 的写法变化时加一，旧的页面自动失效
+DEFAULT_MAX_BYTES = 1024 ** 3
+EVICT_EVERY = 64        # 每存入这么多页检查一次磁盘缓存的大小
+TRAILER = struct.Struct('>I')
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+STAT_KEYS = ('hits', 'misses', 'bypassed', 'stored', 'evicted', 'bytes_reused')
+READ_CHUNK = 1024 * 1024
+
+
+def _is_jpeg(path):
+    with open(path, 'rb') as f:
+        return f.read(3) == JPEG_SIGNATURE
+
+
+def _read_layout(f):
+    """读取缓存文件末尾的布局并校验页面对象；文件不完整或内容损坏时抛出 ValueError。"""
+    size = f.seek(0, os.SEEK_END)
+    if size < TRAILER.size:
+        raise ValueError('页面缓存文件不完整')
+    f.seek(size - TRAILER.size)
+    length, = TRAILER.unpack(f.read(TRAILER.size))
+    if length > size - TRAILER.size:
+        raise ValueError('页面缓存文件不完整')
+    f.seek(size - TRAILER.size - length)
+    page = json.loads(f.read(length).decode('utf-8'))
+    if page['end'] != size - TRAILER.size - length:
+        raise ValueError('页面缓存文件不完整')
+    if _objects_sha256(f, page['end']) != page['sha256']:
+        raise ValueError('页面缓存文件校验失败')
+    return page
+
+
+def _objects_sha256(f, end):
+    # 文件开头 end 个字节（页面对象部分）的 sha256
+    digest = hashlib.sha256()
+    f.seek(0)
+    left = end
+    while left:
+        chunk = f.read(min(READ_CHUNK, left))
+        if not chunk:
+            break
+        digest.update(chunk)
+        left -= len(chunk)
+    return digest.hexdigest()
+
+
+class PageCache:
+    """
+    可以被多个线程同时使用。传给分片进程时复制出一个共用同一目录的新实例，
+    各进程的统计用 merge() 加回来（见 shards.py）。
+    """
+
+    def __init__(self, root=DEFAULT_PAGE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._hashes = {}       # (路径, 大小, 修改时间) -> sha256
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(STAT_KEYS, 0)
+
+    def __getstate__(self):
+        # 传给分片进程时只带上目录与上限，统计从零开始，由 merge() 加回来
+        return {'root': self.root, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], f'{digest}-v{PAGE_VERSION}.page')
+
+    def _count(self, **counts):
+        with self._lock:
+            for key, n in counts.items():
+                self._stats[key] += n
+
+    def digest(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            digest = file_sha256(path)
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    def add_image(self, writer, path):
+        """
+        把 path 作为新的一页写入 writer（PdfWriter），返回页码：缓存中有内容相同的图片时
+        直接复制缓存的页面对象，否则正常写入，再把这一页存进缓存。
+        """
+        if _is_jpeg(path):
+            self._count(bypassed=1)
+            return writer.add_image(path)
+        target = self._path(self.digest(path))
+        try:
+            f = open(target, 'rb')
+        except FileNotFoundError:
+            f = None
+        if f is not None:
+            with f:
+                try:
+                    page = _read_layout(f)
+                except (ValueError, KeyError) as e:
+                    # 布局在复制之前检查，坏文件还没有写进 writer，删掉后按未命中处理
+                    print(f'页面缓存已损坏，重新生成 {path}: {e}')
+                    page = None
+                if page is not None:
+                    number = writer.copy_page(f, page)
+            if page is None:
+                try:
+                    os.remove(target)
+                except FileNotFoundError:
+                    pass
+            else:
+                try:
+                    os.utime(target)    # 修改时间作为最近使用时间
+                except FileNotFoundError:
+                    pass                # 刚好被另一个进程淘汰
+                self._count(hits=1, bytes_reused=page['end'])
+                return number
+
+        number = writer.add_image(path)
+        self._count(misses=1)
+        try:
+            self._store(target, writer, number - 1)
+        except OSError as e:
+            print(f'无法写入页面缓存 {path}: {e}')
+        return number
+
+    def _store(self, target, writer, index):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+        try:
+            with os.fdopen(fd, 'w+b') as f:
+                page = writer.save_page(index, f)
+                page['sha256'] = _objects_sha256(f, page['end'])
+                f.seek(page['end'])
+                data = json.dumps(page).encode('utf-8')
+                f.write(data)
+                f.write(TRAILER.pack(len(data)))
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self._stats['stored'] += 1
+            check = self._stats['stored'] % EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """磁盘缓存超过 max_bytes 时按最近使用时间从旧到新删除。"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.page'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self._count(evicted=1)
+
+    def merge(self, stats):
+        """加上另一个实例（例如分片进程中的）的统计。"""
+        self._count(**{key: stats[key] for key in STAT_KEYS})
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def stats_delta(before, after):
+    """两次 stats() 之间的差值，即这段时间内的命中情况。"""
+    stats = {key: after[key] - before[key] for key in STAT_KEYS}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
@@ -0,0 +1,385 @@
+"""
+逐页写出的 PDF 生成器。
+
+每加入一张图片就立即把该页的对象写进输出文件，页面树、目录和 xref
+在 close() 时补上，因此可以边下载边组装 PDF。JPEG 原样嵌入（DCTDecode），
+其他格式用 Pillow 解码后 Flate 压缩，带透明通道的图片使用 SMask。
+页面尺寸与 img2pdf 的默认行为一致：按图片自带的 DPI（没有时按 96）换算。
+EXIF 方向也与 img2pdf 相同：只是旋转的 JPEG 原样嵌入，页面加上 /Rotate；
+带镜像的方向与解码后写入的图片直接转正。
+
+写入是流式的：JPEG 通过 mmap 直接写进输出文件，解码后的图片按行条带
+分块压缩写出，内存里只保留每个对象的偏移量，峰值内存与页数无关。
+某一页写到一半出错（图片损坏、分片文件不完整）时整页撤销：截掉这一页已经写出的字节，
+文件中不会留下残缺的对象，之后的页面照常写入。
+
+PdfWriter.resume() 以 PDF 增量更新的方式在已有文件末尾追加页面：
+旧页面的对象原封不动，只追加新对象、新的页面树和一段新的 xref。
+
+layout() 记录每一页的对象在文件中的位置，copy_page() 据此把另一个
+PdfWriter 写出的页面复制过来：只重写对象编号，流数据原样复制（见 shards.py）。
+save_page() 把一页的对象单独保存下来，供以后的 PDF 直接复用（见 page_cache.py）。
+"""
+import os
+import re
+import mmap
+import zlib
+
+from PIL import Image, ImageOps
+
+DEFAULT_DPI = 96
+MIN_DPI = 10                # 低于它的 DPI 视为无效，按 DEFAULT_DPI 换算
+STRIP_BYTES = 1024 * 1024   # 解码后的图片每次压缩约 1 MB 原始数据
+COLORSPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+COPY_CHUNK = 1024 * 1024
+REF_RE = re.compile(rb'(?<![\d.])(\d+) 0 (obj|R)\b')
+ORIENTATION = 0x0112
+EXIF_ROTATE = {3: 180, 6: 90, 8: 270}   # 不带镜像的 EXIF 方向 -> 页面顺时针旋转的角度
+
+
+def exif_orientation(im):
+    """图片的 EXIF 方向（1~8），没有或无法解析时为 1。"""
+    try:
+        value = im.getexif().get(ORIENTATION, 1)
+    except Exception:
+        return 1
+    return value if value in range(1, 9) else 1
+
+
+def page_dpi(info):
+    """换算页面尺寸实际使用的 (水平, 垂直) DPI：没有或无效时按 DEFAULT_DPI。"""
+    dpi = info.get('dpi') or (DEFAULT_DPI, DEFAULT_DPI)
+    try:
+        xdpi, ydpi = (float(d) or DEFAULT_DPI for d in dpi)
+    except (TypeError, ValueError):
+        xdpi = ydpi = DEFAULT_DPI
+    # 有些图片把 DPI 写成 1，按此换算会得到巨大的页面
+    if xdpi < MIN_DPI or ydpi < MIN_DPI:
+        xdpi = ydpi = DEFAULT_DPI
+    return xdpi, ydpi
+
+
+def _page_size(size, info):
+    xdpi, ydpi = page_dpi(info)
+    return size[0] * 72.0 / xdpi, size[1] * 72.0 / ydpi
+
+
+def _deflate_strips(im):
+    # 按行条带取出原始像素并增量压缩，避免一次性生成整张图的 bytes 与压缩结果
+    width, height = im.size
+    row_bytes = max(1, width * len(im.getbands()))
+    rows = max(1, STRIP_BYTES // row_bytes)
+    compressor = zlib.compressobj(6)
+    for top in range(0, height, rows):
+        strip = im.crop((0, top, width, min(height, top + rows)))
+        chunk = compressor.compress(strip.tobytes())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class PdfWriter:
+
+    def __init__(self, path, _state=None):
+        self.path = path
+        self._offsets = {}
+        self._written = []      # 按写出顺序：[编号, 偏移, 流数据开始位置（非流对象为 None）]
+        self._layout = []       # 每页一项，见 layout()
+        self._prev = None       # 增量更新时上一段 xref 的偏移
+        if _state is None:
+            self._f = open(path, 'wb')
+            self._next_id = 3       # 1: Catalog, 2: Pages
+            self._pages = []
+            self._first_new = 1
+            self._base_size = 0
+            self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        else:
+            self._f = open(path, 'r+b')
+            self._f.truncate(_state['size'])
+            self._f.seek(_state['size'])
+            self._next_id = _state['next_id']
+            self._pages = list(_state['pages'])
+            self._first_new = self._next_id
+            self._base_size = _state['size']
+            self._prev = _state['xref']
+        self._xref_offset = None
+
+    @classmethod
+    def resume(cls, path, state):
+        """在 state（上次 close() 后 state() 的结果）描述的文件末尾追加页面。"""
+        return cls(path, _state=state)
+
+    def state(self):
+        """close() 之后调用，返回下次增量追加所需的信息。"""
+        return {
+            'next_id': self._next_id,
+            'pages': list(self._pages),
+            'xref': self._xref_offset,
+            'size': os.path.getsize(self.path),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    def _write(self, data):
+        self._f.write(data)
+
+    def _alloc(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _begin(self, obj_id):
+        self._offsets[obj_id] = self._f.tell()
+        self._written.append([obj_id, self._offsets[obj_id], None])
+        self._write(f'{obj_id} 0 obj\n'.encode('ascii'))
+
+    def _rollback(self, mark, start):
+        # 写到一半失败的页面整个撤销：截掉已经写出的字节，分配过的编号在 xref 中记为空闲
+        for obj_id, _, _ in self._written[mark:]:
+            del self._offsets[obj_id]
+        del self._written[mark:]
+        self._f.seek(start)
+        self._f.truncate()
+
+    def _stream_begun(self):
+        # 流字典已写完，记下流数据的起点：copy_page 只改写这之前的部分
+        self._written[-1][2] = self._f.tell()
+
+    def _object(self, obj_id, body):
+        self._begin(obj_id)
+        self._write(body.encode('latin-1') + b'\nendobj\n')
+
+    def _stream(self, obj_id, dictionary, data):
+        self._begin(obj_id)
+        self._write(f'<< {dictionary} /Length {len(data)} >>\nstream\n'.encode('latin-1'))
+        self._stream_begun()
+        self._write(data)
+        self._write(b'\nendstream\nendobj\n')
+
+    def _stream_chunks(self, obj_id, dictionary, chunks):
+        """写出长度事先未知的流：/Length 指向一个在流之后写出的间接对象。"""
+        length_id = self._alloc()
+        self._begin(obj_id)
+        self._write(f'<< {dictionary} /Length {length_id} 0 R >>\nstream\n'.encode('latin-1'))
+        self._stream_begun()
+        length = 0
+        for chunk in chunks:
+            self._write(chunk)
+            length += len(chunk)
+        self._write(b'\nendstream\nendobj\n')
+        self._object(length_id, str(length))
+
+    def add_image(self, path, cache=None):
+        """
+        把一张图片作为新的一页写入文件，返回页码（从 1 开始）。
+        cache 为 PageCache 时按图片内容复用以前写好的页面对象（见 page_cache.py）。
+        """
+        if cache is not None:
+            return cache.add_image(self, path)
+        mark, start = len(self._written), self._f.tell()
+        try:
+            rotate = ''
+            with Image.open(path) as im:
+                orientation = exif_orientation(im)
+                page_w, page_h = _page_size(im.size, im.info)
+                # 带镜像的方向无法用 /Rotate 表示，与其他格式一样解码后转正
+                if im.format == 'JPEG' and im.mode in COLORSPACES and orientation in (1, *EXIF_ROTATE):
+                    image_id = self._add_jpeg(path, im)
+                    if orientation in EXIF_ROTATE:
+                        rotate = f' /Rotate {EXIF_ROTATE[orientation]}'
+                else:
+                    if orientation != 1:
+                        im = ImageOps.exif_transpose(im)
+                        if orientation >= 5:
+                            page_w, page_h = page_h, page_w
+                    image_id = self._add_decoded(im)
+
+            content = f'q {page_w:.4f} 0 0 {page_h:.4f} 0 0 cm /Im0 Do Q'.encode('ascii')
+            content_id = self._alloc()
+            self._stream(content_id, '', content)
+            page_id = self._alloc()
+            self._object(page_id, f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.4f} {page_h:.4f}] '
+                                  f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> '
+                                  f'/Contents {content_id} 0 R{rotate} >>')
+            self._pages.append(page_id)
+            self._layout.append({'page': page_id, 'objects': self._written[mark:], 'end': self._f.tell()})
+        except BaseException:
+            self._rollback(mark, start)
+            raise
+        return len(self._pages)
+
+    def layout(self):
+        """
+        每页一项：{'page': 页面对象编号, 'objects': [[编号, 偏移, 流数据起点], ...], 'end': 结束位置}。
+        一页的对象在文件中是连续的，从第一个对象的偏移到 end。
+        """
+        return [dict(page, objects=[list(obj) for obj in page['objects']]) for page in self._layout]
+
+    def copy_page(self, src, page):
+        """
+        从另一个 PdfWriter 写出的文件（已打开的二进制文件 src）复制一页，page 为其 layout() 中的一项。
+        对象按本文件重新编号，流数据原样复制，不重新解码或压缩。
+        """
+        mapping = {2: 2}    # 页面树固定是 2 号对象
+        for obj_id, _, _ in page['objects']:
+            mapping[obj_id] = self._alloc()
+
+        def renumber(match):
+            return b'%d 0 %s' % (mapping[int(match.group(1))], match.group(2))
+
+        mark, start = len(self._written), self._f.tell()
+        try:
+            objects = page['objects']
+            for i, (obj_id, offset, data_start) in enumerate(objects):
+                end = objects[i + 1][1] if i + 1 < len(objects) else page['end']
+                src.seek(offset)
+                head = src.read((data_start or end) - offset)
+                self._offsets[mapping[obj_id]] = self._f.tell()
+                self._written.append([mapping[obj_id], self._offsets[mapping[obj_id]], None])
+                self._write(REF_RE.sub(renumber, head))
+                if data_start:
+                    self._stream_begun()
+                    remaining = end - data_start
+                    while remaining > 0:
+                        chunk = src.read(min(COPY_CHUNK, remaining))
+                        if not chunk:
+                            raise ValueError('分片文件不完整')
+                        self._write(chunk)
+                        remaining -= len(chunk)
+            self._pages.append(mapping[page['page']])
+            self._layout.append({'page': mapping[page['page']], 'objects': self._written[mark:], 'end': self._f.tell()})
+        except BaseException:
+            self._rollback(mark, start)
+            raise
+        return len(self._pages)
+
+    def save_page(self, index, f):
+        """
+        把第 index 页的对象原样写进已打开的二进制文件 f（从当前位置开始），
+        返回该页在 f 中的布局（格式同 layout()），可以交给 copy_page() 复制。
+        """
+        page = self._layout[index]
+        start = page['objects'][0][1]
+        shift = f.tell() - start
+        self._f.flush()
+        with open(self.path, 'rb') as src:
+            src.seek(start)
+            remaining = page['end'] - start
+            while remaining > 0:
+                chunk = src.read(min(COPY_CHUNK, remaining))
+                if not chunk:
+                    raise ValueError('PDF 文件不完整')
+                f.write(chunk)
+                remaining -= len(chunk)
+        return {
+            'page': page['page'],
+            'objects': [[obj_id, offset + shift, data_start + shift if data_start else None]
+                        for obj_id, offset, data_start in page['objects']],
+            'end': page['end'] + shift,
+        }
+
+    def _add_jpeg(self, path, im):
+        # JPEG 直接嵌入原始字节，不重新编码；用 mmap 写出，不在内存里复制整个文件
+        decode = ''
+        if im.mode == 'CMYK' and 'adobe' in im.info:
+            # Adobe 写出的 CMYK JPEG 是反相存储的
+            decode = ' /Decode [1 0 1 0 1 0 1 0]'
+        image_id = self._alloc()
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            self._begin(image_id)
+            self._write(f'<< /Type /XObject /Subtype /Image /Width {im.size[0]} /Height {im.size[1]} '
+                        f'/ColorSpace {COLORSPACES[im.mode]} /BitsPerComponent 8 '
+                        f'/Filter /DCTDecode{decode} /Length {len(data)} >>\nstream\n'.encode('latin-1'))
+            self._stream_begun()
+            self._write(data)
+            self._write(b'\nendstream\nendobj\n')
+        return image_id
+
+    def _add_decoded(self, im):
+        if getattr(im, 'is_animated', False):
+            im.seek(0)      # 动图只取第一帧
+        alpha = None
+        if im.mode in ('RGBA', 'LA', 'PA') or (im.mode == 'P' and 'transparency' in im.info):
+            im = im.convert('RGBA')
+            alpha = im.getchannel('A')
+            im = im.convert('RGB')
+        elif im.mode == '1' or im.mode.startswith('I') or im.mode == 'F':
+            im = im.convert('L')
+        elif im.mode not in COLORSPACES:
+            im = im.convert('RGB')
+
+        im.load()
+        smask = ''
+        if alpha is not None and alpha.getextrema() != (255, 255):
+            smask_id = self._alloc()
+            self._stream_chunks(smask_id, f'/Type /XObject /Subtype /Image /Width {im.size[0]} '
+                                          f'/Height {im.size[1]} /ColorSpace /DeviceGray '
+                                          f'/BitsPerComponent 8 /Filter /FlateDecode',
+                                _deflate_strips(alpha))
+            smask = f' /SMask {smask_id} 0 R'
+
+        image_id = self._alloc()
+        self._stream_chunks(image_id, f'/Type /XObject /Subtype /Image /Width {im.size[0]} /Height {im.size[1]} '
+                                      f'/ColorSpace {COLORSPACES[im.mode]} /BitsPerComponent 8 '
+                                      f'/Filter /FlateDecode{smask}', _deflate_strips(im))
+        return image_id
+
+    def abort(self):
+        """放弃写入：新文件直接删除，增量追加则截回追加前的长度。"""
+        if self._f.closed:
+            return
+        if self._prev is None:
+            self._f.close()
+            os.remove(self.path)
+        else:
+            self._f.truncate(self._base_size)
+            self._f.close()
+
+    def _xref_entry(self, obj_id):
+        if obj_id in self._offsets:
+            return f'{self._offsets[obj_id]:010d} 00000 n \n'
+        # 分配了编号但图片解码失败、没有写出的对象
+        return '0000000000 00001 f \n'
+
+    def close(self):
+        if self._f.closed:
+            return
+        kids = ' '.join(f'{p} 0 R' for p in self._pages)
+        self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>')
+        if self._prev is None:
+            self._object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+
+        self._xref_offset = self._f.tell()
+        size = self._next_id
+        if self._prev is None:
+            lines = [f'xref\n0 {size}\n', '0000000000 65535 f \n']
+            lines.extend(self._xref_entry(obj_id) for obj_id in range(1, size))
+            trailer = f'<< /Size {size} /Root 1 0 R >>'
+        else:
+            # 增量更新：只列出新的页面树和新追加的对象
+            lines = ['xref\n2 1\n', self._xref_entry(2)]
+            if size > self._first_new:
+                lines.append(f'{self._first_new} {size - self._first_new}\n')
+                lines.extend(self._xref_entry(obj_id) for obj_id in range(self._first_new, size))
+            trailer = f'<< /Size {size} /Root 1 0 R /Prev {self._prev} >>'
+        lines.append(f'trailer\n{trailer}\nstartxref\n{self._xref_offset}\n%%EOF\n')
+        self._write(''.join(lines).encode('ascii'))
+        self._f.close()
+
+
+def write_pdf(img_paths, pdf_path):
+    with PdfWriter(pdf_path) as writer:
+        for path in img_paths:
+            writer.add_image(path)
+    return pdf_path
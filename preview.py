@@ -0,0 +1,174 @@
+"""
+“转成PDF”之前的页面预览：缩略图网格，可以拖动调整页序，取消勾选的图片不放进 PDF。
+
+缩略图只为当前可见的（以及上下各一屏的）图片生成，在线程池中进行，
+结果来自 thumbs.ThumbnailCache（内存 + 磁盘 LRU）。已显示的图标同样有上限（ICON_ITEMS），
+滚出视野最久的图标换回占位图，再次滚到时从缓存中取回，上千张图片的文件夹也能流畅浏览。
+"""
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QSize, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QIcon, QPixmap
+from PyQt6.QtWidgets import (
+    QAbstractItemView, QDialog, QDialogButtonBox, QHBoxLayout, QLabel, QListView, QListWidget,
+    QListWidgetItem, QPushButton, QVBoxLayout,
+)
+
+from thumbs import THUMB_SIZE, ThumbnailCache
+
+THUMB_WORKERS = min(4, os.cpu_count() or 1)
+ICON_ITEMS = 600        # 同时持有真实图标的条目数
+PATH_ROLE = Qt.ItemDataRole.UserRole
+
+
+class PreviewDialog(QDialog):
+    # 工作线程生成缩略图后发出（路径, JPEG 字节；失败时为空），在界面线程中设置图标
+    loaded = pyqtSignal(str, bytes)
+
+    def __init__(self, img_paths, parent=None, cache=None):
+        super().__init__(parent)
+        self.setWindowTitle(f'预览（{len(img_paths)} 张）')
+        self.resize(760, 560)
+        self.cache = cache or ThumbnailCache()
+        self.pool = ThreadPoolExecutor(max_workers=THUMB_WORKERS)
+        self.requested = {}         # 路径 -> Future，已提交但还没显示的缩略图
+        self.icons = OrderedDict()  # 路径 -> None，持有真实图标的条目，按最近显示的顺序
+        self.items = {}             # 路径 -> QListWidgetItem
+
+        placeholder = QPixmap(THUMB_SIZE, THUMB_SIZE)
+        placeholder.fill(QColor(230, 230, 230))
+        self.placeholder = QIcon(placeholder)
+
+        self.grid = QListWidget(self)
+        self.grid.setViewMode(QListView.ViewMode.IconMode)
+        self.grid.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.grid.setGridSize(QSize(THUMB_SIZE + 24, THUMB_SIZE + 40))
+        self.grid.setResizeMode(QListView.ResizeMode.Adjust)
+        # Static：拖放时真正移动条目的顺序（Snap / Free 在图标模式下只改变显示位置）
+        self.grid.setMovement(QListView.Movement.Static)
+        self.grid.setUniformItemSizes(True)
+        self.grid.setWordWrap(False)
+        self.grid.setDragDropMode(QAbstractItemView.DragDropMode.InternalMove)
+        self.grid.setDefaultDropAction(Qt.DropAction.MoveAction)
+        # setMovement(Static) 会关掉视口的 acceptDrops，拖动时放不下去，这里重新打开
+        self.grid.viewport().setAcceptDrops(True)
+        self.grid.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        for number, path in enumerate(img_paths, 1):
+            item = QListWidgetItem(self.placeholder, f'{number}. {os.path.basename(path)}')
+            item.setData(PATH_ROLE, path)
+            item.setToolTip(path)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            self.grid.addItem(item)
+            self.items[path] = item
+
+        # 滚动、缩放窗口时稍等片刻再请求可见范围内的缩略图，避免拖动滚动条时提交大量任务
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(50)
+        self.timer.timeout.connect(self.request_visible)
+        self.grid.verticalScrollBar().valueChanged.connect(self.timer.start)
+        self.grid.model().rowsMoved.connect(self.renumber)
+        self.loaded.connect(self.on_loaded)
+
+        exclude_button = QPushButton('排除所选', self)
+        exclude_button.clicked.connect(lambda: self.set_selected(Qt.CheckState.Unchecked))
+        include_button = QPushButton('恢复所选', self)
+        include_button.clicked.connect(lambda: self.set_selected(Qt.CheckState.Checked))
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel,
+                                   self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        tool_layout = QHBoxLayout()
+        tool_layout.addWidget(QLabel('拖动调整页序，取消勾选的图片不会放进 PDF', self))
+        tool_layout.addStretch()
+        tool_layout.addWidget(exclude_button)
+        tool_layout.addWidget(include_button)
+
+        layout = QVBoxLayout()
+        layout.addLayout(tool_layout)
+        layout.addWidget(self.grid)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def paths(self):
+        """按当前页序返回勾选的图片路径。"""
+        items = (self.grid.item(row) for row in range(self.grid.count()))
+        return [item.data(PATH_ROLE) for item in items if item.checkState() == Qt.CheckState.Checked]
+
+    def set_selected(self, state):
+        for item in self.grid.selectedItems():
+            item.setCheckState(state)
+
+    def renumber(self, *args):
+        for row in range(self.grid.count()):
+            item = self.grid.item(row)
+            item.setText(f'{row + 1}. {os.path.basename(item.data(PATH_ROLE))}')
+        self.timer.start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.timer.start()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.timer.start()
+
+    def request_visible(self):
+        # 可见区域上下各扩展一屏，滚动时下一屏的缩略图通常已经准备好
+        viewport = self.grid.viewport().rect()
+        area = viewport.adjusted(0, -viewport.height(), 0, viewport.height())
+        wanted = []
+        for row in range(self.grid.count()):
+            item = self.grid.item(row)
+            if self.grid.visualItemRect(item).intersects(area):
+                wanted.append(item.data(PATH_ROLE))
+        wanted_set = set(wanted)
+        # 已经滚出范围、还没开始生成的任务取消掉
+        for path, future in list(self.requested.items()):
+            if path not in wanted_set and future.cancel():
+                del self.requested[path]
+        for path in wanted:
+            if path in self.icons:
+                self.icons.move_to_end(path)
+            elif path not in self.requested:
+                future = self.pool.submit(self.cache.get, path)
+                future.add_done_callback(lambda f, path=path: self._emit(path, f))
+                self.requested[path] = future
+
+    def _emit(self, path, future):
+        # 在工作线程中调用；信号会排队交给界面线程处理
+        if future.cancelled():
+            return
+        try:
+            data = future.result()
+        except Exception as e:
+            print(f'无法生成缩略图 {path}: {e}')
+            data = b''
+        try:
+            self.loaded.emit(path, data)
+        except RuntimeError:
+            pass    # 对话框已经关闭
+
+    def on_loaded(self, path, data):
+        self.requested.pop(path, None)
+        item = self.items[path]
+        pixmap = QPixmap()
+        if data and pixmap.loadFromData(data, 'JPEG'):
+            item.setIcon(QIcon(pixmap))
+        else:
+            item.setIcon(self.placeholder)
+            item.setForeground(QColor(200, 0, 0))
+        self.icons[path] = None
+        self.icons.move_to_end(path)
+        while len(self.icons) > ICON_ITEMS:
+            old, _ = self.icons.popitem(last=False)
+            self.items[old].setIcon(self.placeholder)
+
+    def done(self, result):
+        self.timer.stop()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        super().done(result)
@@ -0,0 +1,191 @@
+"""
+下载前探测图片尺寸，跳过图标、表情、1 像素占位图、头像和分隔线。
+
+对每张图片发一个 Range 请求，只取开头几 KB，从 JPEG / PNG / GIF / WebP 的文件头中
+解析出宽高；宽或高小于下限、或者宽高比过大（又宽又扁的分隔线）的图片不再完整下载。
+探测并发进行，结果按 URL 缓存（进程内，以及可选的 ImageCache）。
+解析不出尺寸的图片一律保留，交给正常的下载流程。
+"""
+import struct
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from downloader import DEFAULT_WORKERS, fetch
+
+PROBE_BYTES = 16 * 1024
+DEFAULT_MIN_WIDTH = 120
+DEFAULT_MIN_HEIGHT = 60
+DEFAULT_MAX_ASPECT = 12.0   # 宽 / 高超过它视为分隔线；长图（高远大于宽）不受影响
+
+# width / height: 像素尺寸（解析失败为 None）, format: jpeg / png / gif / webp, size: 完整文件的字节数
+ProbeResult = namedtuple('ProbeResult', ['width', 'height', 'format', 'size'])
+
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_size(data):
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # 填充字节
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker in JPEG_SOF:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _webp_size(data):
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30 and data[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25 and data[20] == 0x2F:
+        bits = int.from_bytes(data[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+    return None
+
+
+def image_size(data):
+    """从文件开头的字节解析 (格式, 宽, 高)，不认识或数据不够时返回 None。"""
+    size = None
+    if data[:2] == b'\xff\xd8':
+        fmt, size = 'jpeg', _jpeg_size(data)
+    elif data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR' and len(data) >= 24:
+        fmt, size = 'png', struct.unpack('>II', data[16:24])
+    elif data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        fmt, size = 'gif', struct.unpack('<HH', data[6:10])
+    elif data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        fmt, size = 'webp', _webp_size(data)
+    if size is None:
+        return None
+    return (fmt,) + tuple(size)
+
+
+def _total_size(resp):
+    # 206 响应的 Content-Range: bytes 0-16383/123456；服务器不支持 Range 时是完整的 Content-Length
+    content_range = resp.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    length = resp.headers.get('Content-Length')
+    return int(length) if resp.status_code == 200 and length and length.isdigit() else None
+
+
+class Prober:
+    """
+    探测并过滤图片：同一个 Prober 可以在多篇文章之间复用，已经探测过的 URL 不再请求。
+    cache 为 ImageCache 时探测结果也会持久化，下次运行直接使用。
+    """
+
+    def __init__(self, min_width=DEFAULT_MIN_WIDTH, min_height=DEFAULT_MIN_HEIGHT,
+                 max_aspect=DEFAULT_MAX_ASPECT, cache=None, probe_bytes=PROBE_BYTES):
+        self.min_width = min_width
+        self.min_height = min_height
+        self.max_aspect = max_aspect
+        self.cache = cache
+        self.probe_bytes = probe_bytes
+        self._results = {}
+        self._lock = threading.Lock()
+        self.stats = {'probed': 0, 'cached': 0, 'skipped': 0, 'bytes_skipped': 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def probe(self, sessions, url, throttler=None, retry=None):
+        with self._lock:
+            result = self._results.get(url)
+        if result is None and self.cache is not None:
+            result = self.cache.lookup_probe(url)
+            if result is not None:
+                result = ProbeResult(**result)
+        if result is not None:
+            self._count('cached')
+            with self._lock:
+                self._results[url] = result
+            return result
+
+        resp = fetch(sessions, url, throttler, retry, stream=True,
+                     headers={'Range': f'bytes=0-{self.probe_bytes - 1}'})
+        try:
+            # 无论哪种结果都要关闭响应，把连接还给 pool_block 的连接池
+            if resp.status_code not in (200, 206):
+                raise requests.HTTPError(f'探测返回 {resp.status_code}: {url}', response=resp)
+            data = b''
+            for chunk in resp.iter_content(4096):
+                data += chunk
+                if len(data) >= self.probe_bytes:
+                    # 服务器忽略 Range 时也只读这么多，随后关闭连接
+                    break
+            total = _total_size(resp)
+        finally:
+            resp.close()
+        parsed = image_size(data)
+        fmt, width, height = parsed if parsed else (None, None, None)
+        result = ProbeResult(width, height, fmt, total)
+        self._count('probed')
+        with self._lock:
+            self._results[url] = result
+        if self.cache is not None and parsed:
+            self.cache.store_probe(url, width, height, fmt, total)
+        return result
+
+    def reason(self, result):
+        """返回跳过的原因（'small' / 'aspect'），需要下载时返回 None。"""
+        if not result.width or not result.height:
+            return None
+        if result.width < self.min_width or result.height < self.min_height:
+            return 'small'
+        if self.max_aspect and result.width / result.height > self.max_aspect:
+            return 'aspect'
+        return None
+
+    def _probe_or_none(self, sessions, url, throttler, retry):
+        try:
+            return self.probe(sessions, url, throttler, retry)
+        except Exception as e:
+            print(f'无法探测图片 {url}: {e}')
+            return None
+
+    def filter(self, jobs, sessions, workers=DEFAULT_WORKERS, throttler=None, retry=None, executor=None):
+        """
+        并发探测 jobs（[(idx, url), ...]），返回 (要下载的 jobs, 跳过的记录列表)。
+        探测失败的图片保留。executor 为共享线程池时在其中探测，不另建线程池。
+        """
+        if not jobs:
+            return [], []
+        if executor is not None:
+            futures = [executor.submit(self._probe_or_none, sessions, url, throttler, retry) for _, url in jobs]
+            results = [f.result() for f in futures]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                results = list(pool.map(lambda job: self._probe_or_none(sessions, job[1], throttler, retry), jobs))
+
+        kept, skipped = [], []
+        for (idx, url), result in zip(jobs, results):
+            reason = self.reason(result) if result else None
+            if reason is None:
+                kept.append((idx, url))
+                continue
+            skipped.append({'idx': idx, 'url': url, 'reason': reason, 'width': result.width,
+                            'height': result.height, 'size': result.size})
+            self._count('skipped')
+            self._count('bytes_skipped', result.size or 0)
+        return kept, skipped
@@ -0,0 +1,134 @@
+"""
+输出体积配置：把图片缩到最大宽度并按质量重新编码，减小生成的 PDF。
+
+- screen：适合屏幕阅读，最宽 1000 像素，JPEG 质量 70；
+- print：适合打印，最宽 2000 像素，JPEG 质量 85；
+- archive：保留原图，不做任何处理。
+
+缩小后会相应调整图片的 DPI，PDF 页面的物理尺寸保持不变。缩小后的 DPI 不能低于
+pdf_writer.MIN_DPI（否则会被当作无效 DPI 改按 96 换算），物理尺寸很大的图片因此少缩一些。
+宽度本来就不超过上限的图片只读文件头，不解码、不重新编码。
+"""
+import math
+import os
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from manifest import file_sha256
+from normalize import DEFAULT_NORMALIZE_DIR
+from pdf_writer import MIN_DPI, ORIENTATION, exif_orientation, page_dpi
+
+Profile = namedtuple('Profile', ['name', 'max_width', 'quality'])
+
+PROFILES = {
+    'screen': Profile('screen', 1000, 70),
+    'print': Profile('print', 2000, 85),
+    'archive': Profile('archive', None, None),
+}
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(DEFAULT_NORMALIZE_DIR), 'profiles')
+PROFILE_VERSION = 3     # 处理规则变化时加一，旧的缓存结果自动失效
+
+# src: 原图, path: 实际写入 PDF 的图片, before / after: 处理前后的字节数, resized: 是否重新编码
+ProfileResult = namedtuple('ProfileResult', ['src', 'path', 'before', 'after', 'resized'])
+
+
+def get_profile(profile):
+    if profile is None or isinstance(profile, Profile):
+        return profile
+    return PROFILES[profile]
+
+
+def apply_profile(path, profile, cache_dir=DEFAULT_PROFILE_DIR):
+    """按 profile 处理一张图片，返回 ProfileResult。"""
+    profile = get_profile(profile)
+    before = os.path.getsize(path)
+    if profile is None or profile.max_width is None:
+        return ProfileResult(path, path, before, before, False)
+
+    with Image.open(path) as im:
+        # 只读了文件头，宽度不超限时直接跳过
+        if im.size[0] <= profile.max_width:
+            return ProfileResult(path, path, before, before, False)
+        width, height = im.size
+        xdpi, ydpi = page_dpi(im.info)
+        new_width = max(profile.max_width, math.ceil(width * MIN_DPI / min(xdpi, ydpi)))
+        if new_width >= width:
+            return ProfileResult(path, path, before, before, False)
+        fmt = 'JPEG' if im.format == 'JPEG' else 'PNG'
+        ext = '.jpg' if fmt == 'JPEG' else '.png'
+        digest = file_sha256(path)
+        target = os.path.join(cache_dir, profile.name, digest[:2],
+                              f'{digest}-w{profile.max_width}q{profile.quality}-v{PROFILE_VERSION}{ext}')
+        if not os.path.exists(target):
+            new_size = (new_width, max(1, round(height * new_width / width)))
+            if fmt == 'JPEG':
+                # JPEG 可以在解码时直接按 1/2、1/4、1/8 缩小，省掉大部分解码开销
+                im.draft(im.mode, new_size)
+            # 重新编码不带原来的 EXIF，只保留方向，写 PDF 时照样转正
+            options = {}
+            orientation = exif_orientation(im)
+            if orientation != 1:
+                exif = Image.Exif()
+                exif[ORIENTATION] = orientation
+                options['exif'] = exif
+            scale = new_size[0] / width
+            small = im.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+            os.close(fd)
+            try:
+                dpi = (xdpi * scale, ydpi * scale)
+                if fmt == 'JPEG':
+                    small.save(tmp, 'JPEG', quality=profile.quality, optimize=True, dpi=dpi, **options)
+                else:
+                    small.save(tmp, 'PNG', optimize=True, dpi=dpi, **options)
+                os.replace(tmp, target)
+            except BaseException:
+                os.remove(tmp)
+                raise
+
+    after = os.path.getsize(target)
+    if after >= before:
+        # 重新编码反而更大（例如已经高度压缩的 PNG），保留原图
+        return ProfileResult(path, path, before, before, False)
+    return ProfileResult(path, target, before, after, True)
+
+
+def _apply_or_keep(path, profile, cache_dir):
+    try:
+        return apply_profile(path, profile, cache_dir)
+    except Exception as e:
+        print(f'无法压缩图片 {path}: {e}')
+        size = os.path.getsize(path)
+        return ProfileResult(path, path, size, size, False)
+
+
+def apply_profile_all(img_paths, profile, processes=None, cache_dir=DEFAULT_PROFILE_DIR):
+    """用进程池（占满所有核心）处理一组图片，返回顺序不变的 ProfileResult 列表。"""
+    profile = get_profile(profile)
+    if not img_paths:
+        return []
+    n = len(img_paths)
+    if processes == 1 or n == 1 or profile is None or profile.max_width is None:
+        return [_apply_or_keep(path, profile, cache_dir) for path in img_paths]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_apply_or_keep, img_paths, [profile] * n, [cache_dir] * n))
+
+
+def summarize(results):
+    before = sum(r.before for r in results)
+    after = sum(r.after for r in results)
+    return {
+        'images': len(results),
+        'resized': sum(1 for r in results if r.resized),
+        'bytes_before': before,
+        'bytes_after': after,
+        'saved_ratio': round(1 - after / before, 4) if before else 0.0,
+        'per_image': [{'src': r.src, 'before': r.before, 'after': r.after, 'resized': r.resized}
+                      for r in results],
+    }
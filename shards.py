@@ -0,0 +1,134 @@
+"""
+并行分片生成 PDF，以及按页数 / 体积分卷。
+
+图片很多时，单个 PdfWriter 只用一个核心压缩（PNG / 透明图要解码后 Flate 压缩）。
+这里把页面列表切成若干分片，在进程池中各自写成一个临时 PDF，
+再按文档顺序把各页复制进最终文件（PdfWriter.copy_page）：只重写对象编号，
+图片流原样复制，不重新编码。分卷时按每页在分片中实际占用的字节数切分，
+每卷各自编号，互不依赖。
+
+传入 page_cache（见 page_cache.py）时各分片进程共用同一个缓存目录，
+内容相同的图片直接复制以前写好的页面对象，各进程的命中统计加回到 page_cache。
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_writer import PdfWriter
+
+SHARD_PAGES = 64        # 每个分片最多的页数
+MIN_SHARDED = 32        # 页数少于它时不分片，直接写
+XREF_ENTRY = 20         # xref 中每个对象占用的字节数，估算分卷体积时计入
+
+
+def _write_shard(task):
+    shard_path, img_paths, page_cache = task
+    with PdfWriter(shard_path) as writer:
+        for path in img_paths:
+            writer.add_image(path, cache=page_cache)
+    return writer.layout(), page_cache.stats() if page_cache is not None else None
+
+
+@contextmanager
+def build_shards(img_paths, folder, processes=None, shard_pages=SHARD_PAGES, page_cache=None):
+    """
+    在 folder 下的临时文件夹中并行生成分片，产出按文档顺序排列的
+    [(分片路径, 页面布局), ...]（每页一项，见 PdfWriter.layout），退出时删除分片。
+    """
+    tmp = tempfile.mkdtemp(prefix='.shards_', dir=folder)
+    try:
+        workers = processes or os.cpu_count() or 1
+        size = max(1, min(shard_pages, -(-len(img_paths) // workers)))
+        tasks = [(os.path.join(tmp, f'{i}.pdf'), img_paths[start:start + size], page_cache)
+                 for i, start in enumerate(range(0, len(img_paths), size))]
+        if workers == 1 or len(tasks) < 2:
+            layouts = [_write_shard(task)[0] for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                layouts = []
+                for layout, stats in pool.map(_write_shard, tasks):
+                    layouts.append(layout)
+                    if stats is not None:
+                        page_cache.merge(stats)
+        yield [(shard_path, page) for (shard_path, _, _), pages in zip(tasks, layouts) for page in pages]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def copy_pages(writer, pages):
+    """按顺序把分片中的页面复制进 writer。"""
+    src = None
+    try:
+        for shard_path, page in pages:
+            if src is None or src.name != shard_path:
+                if src is not None:
+                    src.close()
+                src = open(shard_path, 'rb')
+            writer.copy_page(src, page)
+    finally:
+        if src is not None:
+            src.close()
+
+
+def write_pages(writer, img_paths, processes=None, shard_pages=SHARD_PAGES, page_cache=None):
+    """把图片依次写入 writer：页数多时先并行生成分片再合并，否则直接写。"""
+    if processes == 1 or len(img_paths) < MIN_SHARDED:
+        for path in img_paths:
+            writer.add_image(path, cache=page_cache)
+        return
+    folder = os.path.dirname(os.path.abspath(writer.path))
+    with build_shards(img_paths, folder, processes, shard_pages, page_cache) as pages:
+        copy_pages(writer, pages)
+
+
+def page_bytes(page):
+    """一页在输出文件中大约占用的字节数（对象本身加上 xref 项）。"""
+    return page['end'] - page['objects'][0][1] + XREF_ENTRY * len(page['objects'])
+
+
+def plan_volumes(sizes, max_pages=None, max_bytes=None):
+    """
+    按顺序把页面分卷，返回每卷的 (起始页, 结束页) 区间（不含结束页）。
+    单页超过 max_bytes 时单独成卷。
+    """
+    volumes = []
+    start, total = 0, 0
+    for i, size in enumerate(sizes):
+        count = i - start
+        if count and ((max_pages and count >= max_pages) or (max_bytes and total + size > max_bytes)):
+            volumes.append((start, i))
+            start, total = i, 0
+        total += size
+    volumes.append((start, len(sizes)))
+    return volumes
+
+
+def volume_path(pdf_path, number):
+    root, ext = os.path.splitext(pdf_path)
+    return f'{root}_{number}{ext}'
+
+
+def write_volumes(img_paths, pdf_path, processes=None, max_pages=None, max_bytes=None,
+                  shard_pages=SHARD_PAGES, page_cache=None):
+    """
+    生成 PDF，返回写出的文件列表。设置 max_pages / max_bytes 时按页数 / 体积分卷，
+    多于一卷时依次命名为 <名称>_1.pdf、<名称>_2.pdf ……
+    page_cache 为 PageCache 时复用以前写好的页面对象（见 page_cache.py）。
+    """
+    if not max_pages and not max_bytes:
+        with PdfWriter(pdf_path) as writer:
+            write_pages(writer, img_paths, processes, shard_pages, page_cache)
+        return [pdf_path]
+
+    folder = os.path.dirname(os.path.abspath(pdf_path))
+    with build_shards(img_paths, folder, processes, shard_pages, page_cache) as pages:
+        volumes = plan_volumes([page_bytes(page) for _, page in pages], max_pages, max_bytes)
+        paths = []
+        for number, (start, end) in enumerate(volumes, 1):
+            path = pdf_path if len(volumes) == 1 else volume_path(pdf_path, number)
+            with PdfWriter(path) as writer:
+                copy_pages(writer, pages[start:end])
+            paths.append(path)
+    return paths
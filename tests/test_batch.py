@@ -0,0 +1,29 @@
+import json
+
+import batch
+from mock_server import MockWechatServer
+
+
+def _run(tmp_path, urls):
+    source = tmp_path / 'urls.txt'
+    source.write_text('\n'.join(urls) + '\n', encoding='utf-8')
+    out = tmp_path / 'out'
+    rc = batch.main([str(source), '-o', str(out), '-j', '1', '-w', '1', '--no-cache'])
+    with open(out / 'summary.json', encoding='utf-8') as f:
+        return rc, json.load(f)
+
+
+def test_summary_marks_partial_and_failed_articles(tmp_path):
+    # 404 不重试：部分图片下载失败，文章仍然生成 PDF
+    with MockWechatServer(images=6, image_size=(200, 150), seed=1) as clean, \
+            MockWechatServer(images=6, image_size=(200, 150), error_rate=0.3, error_statuses=(404,),
+                             seed=1) as flaky, \
+            MockWechatServer(images=6, error_rate=1.0, error_statuses=(404,)) as broken:
+        rc, report = _run(tmp_path, [clean.article_url, flaky.article_url, broken.article_url])
+    assert rc == 2
+    ok, partial, failed = report['articles']
+    assert ok['ok'] and not ok['partial'] and ok['pages'] == 6
+    assert partial['ok'] and partial['partial']
+    assert partial['pages'] == 6 - len(partial['failed']) > 0
+    assert not failed['ok'] and failed['error']
+    assert (report['succeeded'], report['partial'], report['failed']) == (2, 1, 1)
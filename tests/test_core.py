@@ -0,0 +1,49 @@
+import pikepdf
+
+from core import download_article_to_pdf, list_images
+from manifest import DONE, FAILED, Manifest
+from mock_server import MockWechatServer
+from pdf_writer import PdfWriter
+
+
+def test_list_images_appends_files_missing_from_manifest(tmp_path):
+    for name in ('1.jpg', '2.png', '10.jpg', 'cover.png', 'notes.txt'):
+        (tmp_path / name).write_bytes(b'x')
+    manifest = Manifest(str(tmp_path), 'https://mp.weixin.qq.com/s/test')
+    manifest.images = {
+        1: {'url': 'a', 'status': DONE, 'file': '2.png'},
+        2: {'url': 'b', 'status': DONE, 'file': '1.jpg'},
+        3: {'url': 'c', 'status': FAILED, 'error': '404'},
+    }
+    manifest.save()
+    names = [path.rsplit('/', 1)[1] for path in list_images(str(tmp_path))]
+    # 清单的页序在前，清单里没有的图片按文件名排序接在后面
+    assert names == ['2.png', '1.jpg', '10.jpg', 'cover.png']
+
+
+def test_list_images_without_manifest_sorts_by_name(tmp_path):
+    for name in ('10.jpg', '2.jpg', '1.jpg'):
+        (tmp_path / name).write_bytes(b'x')
+    assert [path.rsplit('/', 1)[1] for path in list_images(str(tmp_path))] == ['1.jpg', '2.jpg', '10.jpg']
+
+
+def test_pipelined_report_only_counts_written_pages(tmp_path, monkeypatch):
+    add_image = PdfWriter.add_image
+    calls = []
+
+    def flaky(writer, path, cache=None):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError('写入失败')
+        return add_image(writer, path, cache)
+
+    monkeypatch.setattr(PdfWriter, 'add_image', flaky)
+    with MockWechatServer(images=4) as server:
+        results, pages, report = download_article_to_pdf(server.article_url, str(tmp_path / 'img'),
+                                                         str(tmp_path / 'a.pdf'), normalize_processes=1)
+    assert len(results) == 4 and pages == 3
+    # 写入失败的图片不计入体积统计，报告与 PDF 的页面一一对应
+    assert report['images'] == 3
+    assert len(report['per_image']) == 3
+    with pikepdf.open(tmp_path / 'a.pdf') as pdf:
+        assert pdf.check_pdf_syntax() == [] and len(pdf.pages) == 3
@@ -0,0 +1,86 @@
+import http.client
+import json
+import os
+import time
+
+import pytest
+
+import daemon
+from daemon import ConversionServer, DaemonClient
+from mock_server import MockWechatServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    with ConversionServer(str(tmp_path / 'out'), port=0, use_cache=False, processes=1,
+                          allowed_dirs=[str(tmp_path / 'extra')]) as server:
+        yield server
+
+
+def _post(server, path, data, host=None):
+    port = int(server.url.rsplit(':', 1)[1])
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    headers = {'Content-Type': 'application/json'}
+    if host:
+        headers['Host'] = host
+    conn.request('POST', path, json.dumps(data), headers)
+    resp = conn.getresponse()
+    body = json.loads(resp.read())
+    conn.close()
+    return resp.status, body
+
+
+def test_foreign_host_header_is_rejected(server):
+    status, _ = _post(server, '/jobs', {'url': 'http://127.0.0.1:1/s/x'}, host='evil.example:8766')
+    assert status == 403
+    assert server.service.jobs == {}
+
+
+@pytest.mark.parametrize('options', [
+    {'dedup': 'false'},
+    {'near_dup': 'yes'},
+    {'pdf': 1},
+    {'profile': 'huge'},
+    {'variant': 'tiny'},
+    {'out_dir': 5},
+    {'unknown': True},
+])
+def test_invalid_options_are_rejected(server, options):
+    status, body = _post(server, '/jobs', dict(options, url='http://127.0.0.1:1/s/x'))
+    assert status == 400, body
+    assert server.service.jobs == {}
+
+
+def test_out_dir_must_stay_inside_allowed_dirs(server, tmp_path):
+    outside = str(tmp_path / 'elsewhere')
+    status, _ = _post(server, '/jobs', {'url': 'http://127.0.0.1:1/s/x', 'out_dir': outside})
+    assert status == 400
+    status, _ = _post(server, '/jobs', {'url': 'http://127.0.0.1:1/s/x', 'out_dir': '../elsewhere'})
+    assert status == 400
+
+    status, job = _post(server, '/jobs', {'url': 'http://127.0.0.1:1/s/x', 'out_dir': 'sub', 'pdf': False})
+    assert status == 202 and job['out_dir'] == os.path.join(server.service.out_dir, 'sub')
+    status, job = _post(server, '/jobs', {'url': 'http://127.0.0.1:1/s/x', 'pdf': False,
+                                          'out_dir': str(tmp_path / 'extra' / 'a')})
+    assert status == 202
+
+    client = DaemonClient(server.url)
+    assert client.available(out_dir=str(tmp_path / 'extra' / 'b'))
+    assert not client.available(out_dir=outside)
+
+
+def test_finished_jobs_are_evicted(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, 'MAX_FINISHED_JOBS', 2)
+    client = DaemonClient(server.url)
+    with MockWechatServer(images=1) as mock:
+        ids = [client.submit(mock.article_url, pdf=False, skip_small=False)['id'] for _ in range(4)]
+        for job_id in ids:
+            try:
+                client.wait(job_id, timeout=30)
+            except RuntimeError:
+                pass    # 已经被删除的任务
+        # 任务状态先变为 done，随后才清理
+        deadline = time.monotonic() + 10
+        while len(server.service.jobs) > 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    assert list(server.service.jobs) == ids[-2:]
@@ -0,0 +1,54 @@
+import random
+
+from PIL import Image
+
+from dedup import DEFAULT_THRESHOLD, dedup_images, hash_from_json, hash_image, hash_to_json
+
+
+def _photo(seed, size=(160, 120)):
+    # 平滑的随机色块，缩放、重新压缩后 dHash 基本不变
+    rng = random.Random(seed)
+    return Image.frombytes('RGB', (8, 6), rng.randbytes(8 * 6 * 3)).resize(size, Image.Resampling.BICUBIC)
+
+
+def test_flat_colours_are_not_similar(tmp_path):
+    paths = []
+    for name, colour in [('red', (220, 30, 30)), ('green', (30, 200, 60)), ('blue', (20, 40, 210)),
+                         ('yellow', (240, 220, 20)), ('grey', (128, 128, 128))]:
+        path = str(tmp_path / f'{name}.png')
+        Image.new('RGB', (300, 200), colour).save(path)
+        paths.append(path)
+    kept, removed = dedup_images(paths, DEFAULT_THRESHOLD, blocklist=None, processes=1)
+    assert kept == paths and removed == []
+
+
+def test_same_hash_different_colours_are_kept(tmp_path):
+    # 同一张图换了色调：明暗变化相同，dHash 相同，缩略图不同
+    im = _photo(1)
+    a, b = str(tmp_path / 'a.png'), str(tmp_path / 'b.png')
+    im.save(a)
+    im.convert('L').convert('RGB').save(b)
+    assert (hash_image(a).phash != hash_image(b).phash).sum() <= 2
+    kept, removed = dedup_images([a, b], DEFAULT_THRESHOLD, blocklist=None, processes=1)
+    assert kept == [a, b]
+
+
+def test_rescaled_copy_is_similar(tmp_path):
+    im = _photo(2)
+    paths = [str(tmp_path / name) for name in ('a.png', 'b.jpg', 'c.png', 'd.png')]
+    im.save(paths[0])
+    im.resize((320, 240)).save(paths[1], quality=85)
+    _photo(3).save(paths[2])
+    Image.new('RGB', im.size, 'white').save(paths[3])
+    kept, removed = dedup_images(paths, DEFAULT_THRESHOLD, blocklist=None, processes=1)
+    assert kept == [paths[0], paths[2], paths[3]]
+    assert removed[0]['reason'] == 'similar' and removed[0]['duplicate_of'] == paths[0]
+
+
+def test_hash_json_round_trip(tmp_path):
+    path = str(tmp_path / 'a.png')
+    _photo(4).save(path)
+    h = hash_image(path)
+    restored = hash_from_json(hash_to_json(h))
+    assert restored.sha256 == h.sha256 and restored.aspect == h.aspect
+    assert (restored.phash == h.phash).all() and (restored.thumb == h.thumb).all()
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+import requests
+
+from downloader import SessionPool, download_images, fetch
+from mock_server import MockWechatServer
+from throttle import RetryPolicy
+
+
+def _run_with_timeout(func, timeout=20):
+    # 连接泄漏时请求会在 pool_block 上永远等待，放在线程里运行并限时
+    result = {}
+
+    def target():
+        try:
+            result['value'] = func()
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), '请求卡住了：出错的响应没有把连接还给连接池'
+    return result
+
+
+def test_fetch_error_responses_release_connections():
+    with MockWechatServer(images=1) as server:
+        sessions = SessionPool(per_host=2)
+        url = f'{server.base_url}/mmbiz_png/img99/640'     # 不存在的图片，返回 404
+
+        def run():
+            for _ in range(6):
+                with pytest.raises(requests.HTTPError):
+                    fetch(sessions, url, retry=RetryPolicy(retries=0), stream=True)
+
+        result = _run_with_timeout(run)
+        sessions.close()
+    assert 'error' not in result, result.get('error')
+
+
+def test_fetch_exhausted_retries_release_connections():
+    with MockWechatServer(images=1, error_rate=1.0, error_statuses=(503,)) as server:
+        sessions = SessionPool(per_host=2)
+        url = f'{server.base_url}/mmbiz_png/img1/640'
+
+        def run():
+            for _ in range(4):
+                with pytest.raises(requests.HTTPError):
+                    fetch(sessions, url, retry=RetryPolicy(retries=1, base=0.001, cap=0.001), stream=True)
+
+        result = _run_with_timeout(run)
+        sessions.close()
+    assert 'error' not in result, result.get('error')
+
+
+def test_download_images_with_dead_urls_does_not_hang(tmp_path):
+    with MockWechatServer(images=2) as server:
+        sessions = SessionPool(per_host=2)
+        jobs = [(i, f'{server.base_url}/mmbiz_png/img{100 + i}/640') for i in range(1, 7)]
+        jobs.append((7, f'{server.base_url}/mmbiz_png/img1/640'))
+
+        result = _run_with_timeout(lambda: download_images(jobs, str(tmp_path), workers=4, sessions=sessions,
+                                                           retry=RetryPolicy(retries=0)))
+        sessions.close()
+    results = result['value']
+    assert [r.error is not None for r in results] == [True] * 6 + [False]
@@ -0,0 +1,35 @@
+import json
+
+from metrics import Metrics
+
+
+def _run(path, max_bytes, n=50):
+    with Metrics(str(path), max_bytes=max_bytes) as metrics:
+        for i in range(n):
+            metrics.emit('span', stage='test', i=i)
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+def test_default_log_is_rotated_when_too_large(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    _run(path, max_bytes=1024)
+    assert path.stat().st_size > 1024
+    first = path.read_bytes()
+    _run(path, max_bytes=1024)
+    # 打开时超过上限：旧内容改名为 .1，新文件只有这一次的事件
+    assert (tmp_path / 'metrics.jsonl.1').read_bytes() == first
+    assert len(_records(path)) == 51
+    _run(path, max_bytes=1024)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['metrics.jsonl', 'metrics.jsonl.1']
+    assert len(_records(path)) == 51
+
+
+def test_log_without_max_bytes_keeps_appending(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    _run(path, max_bytes=None, n=5)
+    _run(path, max_bytes=None, n=5)
+    assert [r['type'] for r in _records(path)].count('summary') == 2
+    assert not (tmp_path / 'metrics.jsonl.1').exists()
@@ -0,0 +1,42 @@
+import glob
+
+import pikepdf
+from PIL import Image
+
+from page_cache import PageCache
+from pdf_writer import PdfWriter
+
+
+def _write(cache, src, out):
+    with PdfWriter(out) as writer:
+        cache.add_image(writer, src)
+    return out
+
+
+def _pixels(path):
+    with pikepdf.open(path) as pdf:
+        return pikepdf.PdfImage(pdf.pages[0].Resources.XObject.Im0).as_pil_image().tobytes()
+
+
+def test_corrupt_page_file_is_regenerated(tmp_path):
+    src = str(tmp_path / 'a.png')
+    Image.radial_gradient('L').convert('RGB').save(src)
+    cache = PageCache(str(tmp_path / 'pages'))
+    first = _write(cache, src, str(tmp_path / 'first.pdf'))
+    page_file, = glob.glob(str(tmp_path / 'pages' / '*' / '*.page'))
+
+    # 改掉图片流中的一个字节：长度和布局都不变，只有校验能发现
+    with open(page_file, 'r+b') as f:
+        f.seek(200)
+        byte = f.read(1)
+        f.seek(200)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    second = _write(cache, src, str(tmp_path / 'second.pdf'))
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 2
+    assert _pixels(second) == _pixels(first)
+
+    # 重新生成的缓存文件完好，第三次直接复用
+    third = _write(cache, src, str(tmp_path / 'third.pdf'))
+    assert cache.stats()['hits'] == 1
+    assert _pixels(third) == _pixels(first)
@@ -0,0 +1,210 @@
+import io
+import random
+
+import pikepdf
+import pytest
+from PIL import Image
+
+import pdf_writer
+from pdf_writer import ORIENTATION, PdfWriter, write_pdf
+
+
+def _save(path, size=(400, 200), orientation=None, fmt='JPEG'):
+    im = Image.new('RGB', size, (200, 10, 10))
+    im.paste((10, 10, 200), (0, 0, size[0] // 4, size[1] // 4))     # 左上角做记号
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        options['exif'] = exif
+    im.save(path, fmt, **options)
+    return str(path)
+
+
+@pytest.mark.parametrize('orientation, rotate', [(1, None), (3, 180), (6, 90), (8, 270)])
+def test_jpeg_orientation_becomes_page_rotate(tmp_path, orientation, rotate):
+    src = _save(tmp_path / 'a.jpg', orientation=orientation)
+    out = write_pdf([src], str(tmp_path / 'a.pdf'))
+    with pikepdf.open(out) as pdf:
+        page = pdf.pages[0]
+        # 与 img2pdf 相同：JPEG 原样嵌入，MediaBox 按原始像素，用 /Rotate 转正
+        assert [float(v) for v in page.MediaBox] == [0, 0, 400, 200]
+        assert page.obj.get('/Rotate') == rotate
+        assert page.Resources.XObject.Im0.Filter == '/DCTDecode'
+
+
+@pytest.mark.parametrize('orientation', [2, 5, 7])
+def test_mirrored_orientation_is_transposed(tmp_path, orientation):
+    src = _save(tmp_path / 'a.jpg', orientation=orientation)
+    out = write_pdf([src], str(tmp_path / 'a.pdf'))
+    with pikepdf.open(out) as pdf:
+        page = pdf.pages[0]
+        assert '/Rotate' not in page.obj
+        image = page.Resources.XObject.Im0
+        size = (400, 200) if orientation == 2 else (200, 400)
+        assert (image.Width, image.Height) == size
+        assert [float(v) for v in page.MediaBox] == [0, 0, *size]
+
+
+def test_decoded_image_orientation_is_transposed(tmp_path):
+    src = _save(tmp_path / 'a.png', orientation=6, fmt='PNG')
+    out = write_pdf([src], str(tmp_path / 'a.pdf'))
+    with pikepdf.open(out) as pdf:
+        page = pdf.pages[0]
+        im = pikepdf.PdfImage(page.Resources.XObject.Im0).as_pil_image()
+    assert im.size == (200, 400)
+    # 方向 6 要顺时针转 90 度，原来左上角的记号转到右上角
+    assert im.getpixel((199, 0)) == (10, 10, 200)
+    assert im.getpixel((0, 0)) == (200, 10, 10)
+
+
+def _noise(mode, size=(61, 47), seed=0):
+    # 随机像素：Flate 压缩、条带拼接有任何错位都会改变像素
+    rng = random.Random(seed)
+    im = Image.frombytes('RGBA', size, rng.randbytes(size[0] * size[1] * 4))
+    if mode == 'P':
+        return im.convert('RGB').quantize(64)
+    return im.convert(mode)
+
+
+def _expected(im):
+    # PdfWriter 对各种模式的处理：透明通道拆成 SMask（pikepdf 解码时再合成 RGBA），其余转成 L / RGB
+    if im.mode in ('RGBA', 'LA'):
+        return im.convert('RGBA')
+    return im.convert('L' if im.mode in ('1', 'L') else 'RGB')
+
+
+def _page_image(page):
+    return pikepdf.PdfImage(page.Resources.XObject.Im0).as_pil_image()
+
+
+@pytest.mark.parametrize('mode, fmt', [('RGB', 'PNG'), ('L', 'PNG'), ('P', 'PNG'), ('RGBA', 'PNG'),
+                                       ('LA', 'PNG'), ('1', 'PNG'), ('P', 'GIF'), ('RGB', 'WEBP')])
+def test_decoded_pages_round_trip(tmp_path, monkeypatch, mode, fmt):
+    # 条带很小，每张图片都要分成许多块压缩
+    monkeypatch.setattr(pdf_writer, 'STRIP_BYTES', 500)
+    src = str(tmp_path / f'a.{fmt.lower()}')
+    _noise(mode).save(src, fmt, **({'lossless': True} if fmt == 'WEBP' else {}))
+    out = write_pdf([src], str(tmp_path / 'a.pdf'))
+    with pikepdf.open(out) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        image = pdf.pages[0].Resources.XObject.Im0
+        assert ('/SMask' in image) == (mode in ('RGBA', 'LA'))
+        pixels = _page_image(pdf.pages[0])
+    with Image.open(src) as im:
+        expected = _expected(im)
+    assert pixels.mode == expected.mode and pixels.tobytes() == expected.tobytes()
+
+
+def test_jpeg_bytes_are_embedded_unchanged(tmp_path):
+    src = _save(tmp_path / 'a.jpg')
+    out = write_pdf([src], str(tmp_path / 'a.pdf'))
+    with pikepdf.open(out) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        data = pdf.pages[0].Resources.XObject.Im0.read_raw_bytes()
+    with open(src, 'rb') as f:
+        assert data == f.read()
+
+
+def _pages(path):
+    with pikepdf.open(path) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        return [_page_image(page).tobytes() for page in pdf.pages]
+
+
+def test_resume_appends_incremental_update(tmp_path):
+    srcs = []
+    for i, mode in enumerate(('RGB', 'RGBA', 'L', 'P', 'RGB')):
+        srcs.append(str(tmp_path / f'{i}.png'))
+        _noise(mode, seed=i).save(srcs[-1])
+    out = str(tmp_path / 'a.pdf')
+    with PdfWriter(out) as writer:
+        writer.add_image(srcs[0])
+        writer.add_image(srcs[1])
+    state = writer.state()
+    with open(out, 'rb') as f:
+        original = f.read()
+
+    with PdfWriter.resume(out, state) as writer:
+        writer.add_image(srcs[2])
+    state = writer.state()
+    with PdfWriter.resume(out, state) as writer:
+        writer.add_image(srcs[3])
+        writer.add_image(srcs[4])
+
+    with open(out, 'rb') as f:
+        data = f.read()
+    # 旧内容原封不动，后面是两段增量更新，各自用 /Prev 指向上一段 xref
+    assert data.startswith(original)
+    assert data.count(b'startxref') == 3 and data.count(b'/Prev ') == 2
+    assert _pages(out) == [_expected(Image.open(src)).tobytes() for src in srcs]
+
+
+def test_aborted_append_restores_file(tmp_path):
+    src = str(tmp_path / 'a.png')
+    _noise('RGB').save(src)
+    out = str(tmp_path / 'a.pdf')
+    with PdfWriter(out) as writer:
+        writer.add_image(src)
+    state = writer.state()
+    with open(out, 'rb') as f:
+        original = f.read()
+    with pytest.raises(RuntimeError):
+        with PdfWriter.resume(out, state) as writer:
+            writer.add_image(src)
+            raise RuntimeError('中途失败')
+    with open(out, 'rb') as f:
+        assert f.read() == original
+
+
+def test_failed_page_leaves_no_partial_objects(tmp_path, monkeypatch):
+    srcs = []
+    for i in range(3):
+        srcs.append(str(tmp_path / f'{i}.png'))
+        _noise('RGBA', size=(200, 150), seed=i).save(srcs[-1])
+    strips = pdf_writer._deflate_strips
+
+    def broken(im):
+        # 写出一部分压缩数据后才失败，模拟解码到一半的坏图片
+        chunks = strips(im)
+        yield next(chunks)
+        raise OSError('图片数据损坏')
+
+    monkeypatch.setattr(pdf_writer, 'STRIP_BYTES', 1000)
+    out = str(tmp_path / 'a.pdf')
+    with PdfWriter(out) as writer:
+        writer.add_image(srcs[0])
+        size = writer._f.tell()
+        monkeypatch.setattr(pdf_writer, '_deflate_strips', broken)
+        with pytest.raises(OSError):
+            writer.add_image(srcs[1])
+        assert writer._f.tell() == size and writer.page_count == 1
+        monkeypatch.setattr(pdf_writer, '_deflate_strips', strips)
+        writer.add_image(srcs[2])
+
+    with pikepdf.open(out) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        assert [_page_image(page).tobytes() for page in pdf.pages] == \
+            [_expected(Image.open(src)).tobytes() for src in (srcs[0], srcs[2])]
+
+
+def test_failed_copy_leaves_no_partial_objects(tmp_path):
+    src = str(tmp_path / 'a.png')
+    _noise('RGB', size=(200, 150)).save(src)
+    shard = str(tmp_path / 'shard.pdf')
+    with PdfWriter(shard) as writer:
+        writer.add_image(src)
+    page = writer.layout()[0]
+    with open(shard, 'rb') as f:
+        # 在图片流的中间截断
+        truncated = io.BytesIO(f.read()[:page['objects'][0][2] + 100])
+
+    out = str(tmp_path / 'out.pdf')
+    with PdfWriter(out) as writer:
+        with pytest.raises(ValueError):
+            writer.copy_page(truncated, page)
+        with open(shard, 'rb') as f:
+            writer.copy_page(f, page)
+    with pikepdf.open(out) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        assert len(pdf.pages) == 1
@@ -0,0 +1,56 @@
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+from PIL import Image
+from PyQt6.QtCore import QModelIndex, Qt
+from PyQt6.QtTest import QTest
+from PyQt6.QtWidgets import QApplication
+
+from preview import PreviewDialog
+from thumbs import ThumbnailCache
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def dialog(app, tmp_path):
+    paths = []
+    for i in range(4):
+        path = str(tmp_path / f'{i}.png')
+        Image.new('RGB', (40, 30), (i * 60, 0, 0)).save(path)
+        paths.append(path)
+    dialog = PreviewDialog(paths, cache=ThumbnailCache(str(tmp_path / 'thumbs')))
+    dialog.show()
+    assert QTest.qWaitForWindowExposed(dialog)
+    yield dialog
+    dialog.done(0)
+
+
+def _labels(dialog):
+    return [dialog.grid.item(row).text() for row in range(dialog.grid.count())]
+
+
+def test_drag_moves_rows_and_renumbers(dialog):
+    grid = dialog.grid
+    # Static 会关掉视口的 acceptDrops，没有重新打开时拖动的条目放不下去
+    assert grid.viewport().acceptDrops() and grid.dragEnabled()
+    QTest.mouseClick(grid.viewport(), Qt.MouseButton.LeftButton, pos=grid.visualItemRect(grid.item(0)).center())
+    assert grid.currentRow() == 0
+    # offscreen 平台不能真正执行拖放，按放下时的方式移动模型中的行
+    assert grid.model().moveRow(QModelIndex(), 0, QModelIndex(), 4)
+    assert [os.path.basename(path) for path in dialog.paths()] == ['1.png', '2.png', '3.png', '0.png']
+    assert _labels(dialog) == ['1. 1.png', '2. 2.png', '3. 3.png', '4. 0.png']
+
+
+def test_unchecked_rows_are_left_out(dialog):
+    grid = dialog.grid
+    grid.item(1).setSelected(True)
+    grid.item(2).setSelected(True)
+    dialog.set_selected(Qt.CheckState.Unchecked)
+    assert [os.path.basename(path) for path in dialog.paths()] == ['0.png', '3.png']
+    assert _labels(dialog) == ['1. 0.png', '2. 1.png', '3. 2.png', '4. 3.png']
@@ -0,0 +1,67 @@
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from downloader import SessionPool
+from mock_server import MockWechatServer
+from probe import PROBE_BYTES, Prober, image_size
+from throttle import RetryPolicy
+
+
+def test_probe_dead_urls_release_connections():
+    with MockWechatServer(images=2) as server:
+        sessions = SessionPool(per_host=2)
+        jobs = [(i, f'{server.base_url}/mmbiz_png/img{100 + i}/640') for i in range(1, 7)]
+        jobs.append((7, f'{server.base_url}/mmbiz_png/img1/640'))
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(value=Prober().filter(
+            jobs, sessions, workers=4, retry=RetryPolicy(retries=0))), daemon=True)
+        thread.start()
+        thread.join(20)
+        sessions.close()
+    assert not thread.is_alive(), '探测卡住了：出错的响应没有把连接还给连接池'
+    kept, skipped = result['value']
+    # 探测失败的图片保留，交给正常的下载流程
+    assert kept == jobs and skipped == []
+
+
+def _encode(fmt, mode='RGB', size=(321, 123), **options):
+    buf = io.BytesIO()
+    Image.new(mode, size, (10, 200, 30) if mode == 'RGB' else None).save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+HEADERS = {
+    'jpeg': _encode('JPEG'),
+    'jpeg_progressive': _encode('JPEG', progressive=True),
+    # 很大的 APP1 段把 SOF 推到 16 KB 之后，探测到的字节不够时应返回 None
+    'jpeg_exif': _encode('JPEG', exif=b'Exif\x00\x00' + b'\x00' * 20000),
+    'png': _encode('PNG'),
+    'gif': _encode('GIF'),
+    'webp_lossy': _encode('WEBP'),
+    'webp_lossless': _encode('WEBP', lossless=True),
+    'webp_alpha': _encode('WEBP', mode='RGBA'),
+}
+
+
+@pytest.mark.parametrize('name', sorted(HEADERS))
+def test_image_size_parses_full_headers(name):
+    assert image_size(HEADERS[name]) == (name.split('_')[0], 321, 123)
+
+
+@pytest.mark.parametrize('name', sorted(HEADERS))
+def test_image_size_on_truncated_data(name):
+    data = HEADERS[name]
+    expected = (name.split('_')[0], 321, 123)
+    for end in range(min(len(data), 22000)):
+        # 数据不够时返回 None，不能抛出异常，也不能解析出错误的尺寸
+        assert image_size(data[:end]) in (None, expected), end
+    assert image_size(data[:PROBE_BYTES]) == (None if name == 'jpeg_exif' else expected)
+
+
+def test_image_size_rejects_garbage():
+    for data in (b'', b'\xff\xd8', b'\xff\xd8\x00\x00\x00\x00', b'GIF89a', b'RIFF\x00\x00\x00\x00WEBPVP8 ',
+                 b'\x89PNG\r\n\x1a\n' + b'\x00' * 30, b'<html>not an image</html>'):
+        assert image_size(data) is None
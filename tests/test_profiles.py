@@ -0,0 +1,41 @@
+import pikepdf
+import pytest
+from PIL import Image
+
+from pdf_writer import MIN_DPI, page_dpi, write_pdf
+from profiles import apply_profile
+
+
+def _media_box(tmp_path, path, name):
+    out = write_pdf([path], str(tmp_path / f'{name}.pdf'))
+    with pikepdf.open(out) as pdf:
+        return [float(v) for v in pdf.pages[0].MediaBox]
+
+
+@pytest.mark.parametrize('size, dpi', [
+    ((2000, 300), (96, 96)),        # 普通情况：缩到 1000 像素宽，DPI 减半
+    ((8000, 300), (72, 72)),        # 按比例缩放 DPI 会低于 MIN_DPI
+    ((4000, 300), (1, 1)),          # 原图的 DPI 本身无效，按 96 换算
+    ((3000, 300), (300, 20)),       # 两个方向的 DPI 不同
+    ((3000, 300), None),
+])
+def test_profile_keeps_page_size(tmp_path, size, dpi):
+    src = str(tmp_path / 'a.png')
+    Image.linear_gradient('L').resize(size).convert('RGB').save(src, **({'dpi': dpi} if dpi else {}))
+    result = apply_profile(src, 'screen', str(tmp_path / 'profiles'))
+    assert result.resized
+    with Image.open(result.path) as im:
+        assert im.size[0] < size[0]
+        assert min(page_dpi(im.info)) >= MIN_DPI
+    before = _media_box(tmp_path, src, 'before')
+    after = _media_box(tmp_path, result.path, 'after')
+    assert after[2] == pytest.approx(before[2], rel=1e-3)
+    assert after[3] == pytest.approx(before[3], rel=0.01)
+
+
+def test_profile_skips_images_that_cannot_shrink(tmp_path):
+    # 原图已经是 MIN_DPI，再缩小页面尺寸就保不住了
+    src = str(tmp_path / 'a.png')
+    Image.new('RGB', (1100, 50)).save(src, dpi=(MIN_DPI, MIN_DPI))
+    result = apply_profile(src, 'screen', str(tmp_path / 'profiles'))
+    assert not result.resized and result.path == src
@@ -0,0 +1,64 @@
+import random
+
+import pikepdf
+import pytest
+from PIL import Image
+
+import shards
+from pdf_writer import PdfWriter, write_pdf
+from shards import write_volumes
+
+
+def _image(path, mode, seed, size=(40, 30)):
+    rng = random.Random(seed)
+    im = Image.frombytes('RGBA', size, rng.randbytes(size[0] * size[1] * 4))
+    im.convert(mode).save(path)
+    return str(path)
+
+
+def _pages(path):
+    with pikepdf.open(path) as pdf:
+        assert pdf.check_pdf_syntax() == []
+        return [pikepdf.PdfImage(page.Resources.XObject.Im0).as_pil_image().tobytes() for page in pdf.pages]
+
+
+def test_copy_page_renumbers_references(tmp_path):
+    srcs = [_image(tmp_path / f'{i}.png', mode, i) for i, mode in enumerate(('RGB', 'RGBA', 'L', 'RGBA'))]
+    shard = str(tmp_path / 'shard.pdf')
+    with PdfWriter(shard) as writer:
+        writer.add_image(srcs[1])     # 带 SMask：图片字典引用另一个对象
+        writer.add_image(srcs[2])
+    layout = writer.layout()
+
+    # 目标文件里先有自己的页面，复制来的对象编号必须全部改写，不能与已有对象冲突
+    out = str(tmp_path / 'out.pdf')
+    with PdfWriter(out) as writer, open(shard, 'rb') as src:
+        writer.add_image(srcs[0])
+        writer.copy_page(src, layout[1])
+        writer.copy_page(src, layout[0])
+        writer.copy_page(src, layout[0])
+        writer.add_image(srcs[3])
+
+    expected = _pages(write_pdf([srcs[0], srcs[2], srcs[1], srcs[1], srcs[3]], str(tmp_path / 'direct.pdf')))
+    assert _pages(out) == expected
+    with pikepdf.open(out) as pdf:
+        smasks = [page.Resources.XObject.Im0.SMask.objgen for page in pdf.pages if
+                  '/SMask' in page.Resources.XObject.Im0]
+    # 同一页复制两次得到两组独立的对象
+    assert len(smasks) == 3 and len(set(smasks)) == 3
+
+
+@pytest.mark.parametrize('max_pages, max_bytes', [(None, None), (4, None), (None, 8000)])
+def test_sharded_output_matches_direct_write(tmp_path, monkeypatch, max_pages, max_bytes):
+    monkeypatch.setattr(shards, 'MIN_SHARDED', 2)
+    srcs = [_image(tmp_path / f'{i}.png', ('RGB', 'RGBA', 'L', 'P')[i % 4], i) for i in range(11)]
+    expected = _pages(write_pdf(srcs, str(tmp_path / 'direct.pdf')))
+    volumes = write_volumes(srcs, str(tmp_path / 'out.pdf'), processes=2, max_pages=max_pages,
+                            max_bytes=max_bytes, shard_pages=3)
+    pages = [page for path in volumes for page in _pages(path)]
+    assert pages == expected
+    if max_pages or max_bytes:
+        assert len(volumes) > 1
+    # 分片的临时文件都已删除
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == '.pdf' or p.name.startswith('.')) == \
+        sorted(['direct.pdf'] + [path.rsplit('/', 1)[1] for path in volumes])
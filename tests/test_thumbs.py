@@ -0,0 +1,73 @@
+import os
+
+from PIL import Image
+
+from thumbs import ThumbnailCache
+
+
+def _images(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / f'{i}.png')
+        Image.new('RGB', (400, 300), (i * 40, 100, 200)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_memory_and_disk_hits(tmp_path):
+    src, = _images(tmp_path, 1)
+    root = str(tmp_path / 'thumbs')
+    cache = ThumbnailCache(root)
+    data = cache.get(src)
+    assert data[:2] == b'\xff\xd8'
+    assert cache.get(src) == data
+    assert cache.stats()['generated'] == 1 and cache.stats()['memory_hits'] == 1
+
+    # 新实例内存为空，从磁盘取回
+    other = ThumbnailCache(root)
+    assert other.get(src) == data
+    stats = other.stats()
+    assert stats['disk_hits'] == 1 and stats['generated'] == 0 and stats['hit_rate'] == 1.0
+
+
+def test_changed_file_misses(tmp_path):
+    src, = _images(tmp_path, 1)
+    cache = ThumbnailCache(str(tmp_path / 'thumbs'))
+    before = cache.get(src)
+    Image.new('RGB', (400, 300), 'black').save(src)
+    assert cache.get(src) != before
+    assert cache.stats()['generated'] == 2
+
+
+def test_memory_is_lru(tmp_path):
+    a, b, c = _images(tmp_path, 3)
+    cache = ThumbnailCache(str(tmp_path / 'thumbs'), memory_items=2)
+    cache.get(a)
+    cache.get(b)
+    cache.get(a)        # a 最近用过，超出上限时淘汰 b
+    cache.get(c)
+    assert cache.stats()['memory_items'] == 2
+    cache.get(a)
+    cache.get(b)
+    stats = cache.stats()
+    assert stats['memory_hits'] == 2 and stats['disk_hits'] == 1
+
+
+def test_disk_eviction_removes_least_recently_used(tmp_path):
+    paths = _images(tmp_path, 4)
+    root = str(tmp_path / 'thumbs')
+    cache = ThumbnailCache(root)
+    files = []
+    for i, path in enumerate(paths):
+        cache.get(path)
+        target = cache._path(cache.digest(path))
+        os.utime(target, (1000 + i, 1000 + i))
+        files.append(target)
+    cache.max_bytes = sum(os.path.getsize(f) for f in files[2:])
+    cache.evict()
+    assert [os.path.exists(f) for f in files] == [False, False, True, True]
+    assert cache.stats()['evicted'] == 2
+    # 淘汰后再次读取会重新生成
+    fresh = ThumbnailCache(root)
+    fresh.get(paths[0])
+    assert fresh.stats()['generated'] == 1
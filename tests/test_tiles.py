@@ -0,0 +1,102 @@
+import random
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+from PIL.JpegImagePlugin import get_sampling
+
+import tiles
+from normalize import flatten
+from pdf_writer import ORIENTATION
+from tiles import TILE_RATIO, split_tall
+
+
+def _tall(mode, size=(120, 1500), seed=0):
+    # 随机像素中间隔一段空白行，切分点会落在空白处，也可能落在内容中
+    rng = random.Random(seed)
+    im = Image.frombytes('RGBA', size, rng.randbytes(size[0] * size[1] * 4))
+    for top in range(150, size[1], 260):
+        im.paste((255, 255, 255, 255), (0, top, size[0], top + 6))
+    if mode == 'P':
+        return im.convert('RGB').quantize(200)
+    return im.convert(mode)
+
+
+def _check_tiles(paths, expected):
+    width, height = expected.size
+    top = 0
+    for path in paths:
+        with Image.open(path) as tile:
+            assert tile.size[0] == width and tile.size[1] <= int(width * TILE_RATIO)
+            crop = expected.crop((0, top, width, top + tile.size[1]))
+            assert tile.convert(crop.mode).tobytes() == crop.tobytes()
+            top += tile.size[1]
+    assert top == height
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA', 'L', 'LA', 'P'])
+def test_png_strips_equal_crops_of_original(tmp_path, monkeypatch, mode):
+    # 每次只读很少的压缩数据，条带边界与 IDAT / 解压缓冲区的边界错开
+    monkeypatch.setattr(tiles, 'READ_CHUNK', 997)
+    src = str(tmp_path / 'tall.png')
+    _tall(mode).save(src)
+    assert tiles._png_header(src) is not None
+    paths = split_tall(src, str(tmp_path / 'tiles'))
+    assert len(paths) > 5 and all(path.endswith('.png') for path in paths)
+    with Image.open(src) as im:
+        _check_tiles(paths, flatten(im))
+
+
+def test_streamed_and_decoded_paths_agree(tmp_path):
+    im = _tall('RGB', seed=1)
+    streamed, decoded = str(tmp_path / 'a.png'), str(tmp_path / 'b.webp')
+    im.save(streamed)
+    im.save(decoded, lossless=True)     # WebP 不能按行解码，整张解码后裁切
+    assert tiles._png_header(decoded) is None
+    a = split_tall(streamed, str(tmp_path / 'tiles'))
+    b = split_tall(decoded, str(tmp_path / 'tiles'))
+    assert len(a) == len(b)
+    for x, y in zip(a, b):
+        with Image.open(x) as tx, Image.open(y) as ty:
+            assert tx.tobytes() == ty.tobytes()
+
+
+def test_png_with_exif_orientation_is_transposed(tmp_path):
+    im = _tall('RGB', size=(1500, 120), seed=2)
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    src = str(tmp_path / 'rotated.png')
+    im.save(src, exif=exif)
+    assert tiles._png_header(src) is None
+    paths = split_tall(src, str(tmp_path / 'tiles'))
+    _check_tiles(paths, im.transpose(Image.Transpose.ROTATE_270))
+
+
+def test_short_image_is_kept(tmp_path):
+    src = str(tmp_path / 'short.png')
+    _tall('RGB', size=(120, 300)).save(src)
+    assert split_tall(src, str(tmp_path / 'tiles')) == [src]
+
+
+@pytest.mark.parametrize('subsampling, mcu', [(0, 8), (2, 16)])
+def test_jpeg_tiles_reuse_source_encoding(tmp_path, subsampling, mcu):
+    src = str(tmp_path / 'tall.jpg')
+    _tall('RGB', size=(200, 1500), seed=3).save(src, quality=80, subsampling=subsampling)
+    paths = split_tall(src, str(tmp_path / 'tiles'))
+    assert len(paths) > 3
+    with Image.open(src) as im:
+        original = im.convert('RGB')
+        tables = im.quantization
+    top = 0
+    for path in paths:
+        with Image.open(path) as tile:
+            # 切分点在 MCU 边界上，沿用原图的量化表与色度抽样
+            assert top % mcu == 0
+            assert tile.quantization == tables
+            assert get_sampling(tile) == subsampling
+            crop = original.crop((0, top, tile.size[0], top + tile.size[1]))
+            if subsampling == 0:
+                # 与原图的 DCT 块一一对应，重新量化后几乎没有误差
+                diff = ImageChops.difference(tile.convert('RGB'), crop)
+                assert max(ImageStat.Stat(diff).mean) < 1
+            top += tile.size[1]
+    assert top == original.size[1]
@@ -0,0 +1,56 @@
+from urllib.parse import urlparse
+
+from downloader import SessionPool
+from mock_server import MockWechatServer
+from throttle import RetryPolicy
+from variants import MMBIZ_HOSTS, VariantPolicy, variant_url
+
+
+def test_only_mmbiz_hosts_are_rewritten():
+    url = 'https://mmbiz.qpic.cn/mmbiz_png/abc/0?wx_fmt=png'
+    assert variant_url(url, 'screen') == 'https://mmbiz.qpic.cn/mmbiz_png/abc/640?wx_fmt=png&tp=webp'
+    for other in ('https://res.wx.qq.com/mmbizappmsg/zh_CN/x.png',
+                  'https://example.com/mmbiz_png/abc/0?wx_fmt=png'):
+        assert variant_url(other, 'screen') == other
+
+
+def _policy(server, **kwargs):
+    return VariantPolicy('screen', hosts=MMBIZ_HOSTS + (urlparse(server.base_url).hostname,), **kwargs)
+
+
+def _download_all(server, policy, folder, count):
+    sessions = SessionPool()
+    try:
+        for i in range(1, count + 1):
+            url = f'{server.base_url}/mmbiz_png/img{i}/0?wx_fmt=png'
+            policy.download(sessions, i, url, str(folder), retry=RetryPolicy(retries=0))
+    finally:
+        sessions.close()
+
+
+def test_no_extra_range_request_by_default(tmp_path):
+    with MockWechatServer(images=3, formats=('png',), image_size=(800, 600), variants=True) as server:
+        policy = _policy(server)
+        _download_all(server, policy, tmp_path, 3)
+        assert server.stats['ranges'] == 0
+        assert server.stats['requests'] == 3
+    summary = policy.summary()
+    assert summary['images'] == 3 and summary['measured'] == 0
+
+    with MockWechatServer(images=3, formats=('png',), image_size=(800, 600), variants=True) as server:
+        policy = _policy(server, measure=True)
+        _download_all(server, policy, tmp_path, 3)
+        assert server.stats['ranges'] == 3
+    assert policy.summary()['measured'] == 3
+
+
+def test_fallbacks_are_counted_in_bytes_saved(tmp_path):
+    with MockWechatServer(images=2, formats=('png',), image_size=(800, 600), variants=True,
+                          bad_variants=1.0) as server:
+        policy = _policy(server)
+        _download_all(server, policy, tmp_path, 2)
+    summary = policy.summary()
+    assert summary['fallbacks'] == 2 and summary['measured'] == 2
+    # 退回原图没有节省，失败的变体还多下载了错误页面
+    assert summary['bytes_downloaded'] > summary['bytes_original'] > 0
+    assert summary['bytes_saved'] < 0
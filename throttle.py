@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)     # 这两类状态码说明 CDN 在限流，需要降速
+
+
+class HostThrottle:
+    """
+    单个主机的令牌桶限速器，速率按 AIMD 调整：
+    请求成功且延迟低于 latency_target 时每次加 increase（加性增），
+    遇到 429 / 503 / 超时时乘以 decrease（乘性减）。
+    """
+
+    def __init__(self, rate=4.0, min_rate=0.5, max_rate=50.0, increase=0.5,
+                 decrease=0.5, latency_target=1.5, burst=4):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        # 阻塞直到拿到一个令牌
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self, latency):
+        with self._lock:
+            if latency <= self.latency_target:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+
+class Throttler:
+    """按主机维护 HostThrottle，参数对所有主机相同。"""
+
+    def __init__(self, **options):
+        self.options = options
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            throttle = self._hosts.get(host)
+            if throttle is None:
+                throttle = self._hosts[host] = HostThrottle(**self.options)
+            return throttle
+
+    def rates(self):
+        with self._lock:
+            return {host: t.rate for host, t in self._hosts.items()}
+
+
+class RetryPolicy:
+    """带抖动的指数退避（full jitter）：第 n 次重试等待 uniform(0, min(cap, base * 2**n)) 秒。"""
+
+    def __init__(self, retries=4, base=0.5, cap=30.0, statuses=RETRY_STATUSES):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.statuses = statuses
+
+    def delay(self, attempt, retry_after=None):
+        backoff = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        if retry_after:
+            return max(backoff, min(self.cap, retry_after))
+        return backoff
+
+
+def parse_retry_after(value):
+    # 只支持秒数形式的 Retry-After，HTTP 日期形式直接忽略
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
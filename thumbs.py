@@ -0,0 +1,140 @@
+"""
+预览用的缩略图，按图片内容的 sha256 缓存在内存（LRU）和磁盘上。
+
+JPEG 用 draft 模式解码：libjpeg 直接按 1/2 ~ 1/8 的尺寸输出，比完整解码快得多。
+磁盘上存的是小 JPEG，再次打开同一文件夹时不必重新解码原图；总大小超过上限时
+按最近使用时间淘汰。内容哈希按 (路径, 大小, 修改时间) 记在内存里，同一文件只读一次。
+ThumbnailCache 可以被多个线程同时使用（界面在线程池中生成缩略图，见 preview.py）。
+"""
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from img_cache import DEFAULT_CACHE_DIR
+from manifest import file_sha256
+from normalize import flatten
+
+DEFAULT_THUMB_DIR = os.path.join(DEFAULT_CACHE_DIR, 'thumbs')
+THUMB_VERSION = 2
+THUMB_SIZE = 160
+THUMB_QUALITY = 80
+MEMORY_ITEMS = 512                  # 内存中最多保留的缩略图数
+DEFAULT_MAX_BYTES = 200 * 1024 ** 2     # 磁盘缓存上限
+EVICT_EVERY = 256                   # 每新生成这么多张检查一次磁盘缓存的大小
+
+
+def make_thumbnail(path, size=THUMB_SIZE):
+    """返回缩略图的 JPEG 字节，长边不超过 size。"""
+    with Image.open(path) as im:
+        if im.format == 'JPEG':
+            im.draft('RGB', (size, size))
+        # 按 EXIF 方向转正，与 PDF 中的页面一致
+        flat = flatten(ImageOps.exif_transpose(im))
+    flat.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    buf = io.BytesIO()
+    flat.save(buf, 'JPEG', quality=THUMB_QUALITY)
+    return buf.getvalue()
+
+
+class ThumbnailCache:
+
+    def __init__(self, root=DEFAULT_THUMB_DIR, memory_items=MEMORY_ITEMS, max_bytes=DEFAULT_MAX_BYTES,
+                 size=THUMB_SIZE):
+        self.root = root
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.size = size
+        self._memory = OrderedDict()    # sha256 -> JPEG 字节
+        self._hashes = {}               # (路径, 大小, 修改时间) -> sha256
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'generated': 0, 'evicted': 0}
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], f'{digest}-s{self.size}-v{THUMB_VERSION}.jpg')
+
+    def digest(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            digest = file_sha256(path)
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    def _remember(self, digest, data):
+        with self._lock:
+            self._memory[digest] = data
+            self._memory.move_to_end(digest)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, path):
+        """返回 path 的缩略图（JPEG 字节）：依次查内存、磁盘，都没有时生成并写入磁盘。"""
+        digest = self.digest(path)
+        with self._lock:
+            data = self._memory.get(digest)
+            if data is not None:
+                self._memory.move_to_end(digest)
+                self._stats['memory_hits'] += 1
+                return data
+
+        target = self._path(digest)
+        try:
+            with open(target, 'rb') as f:
+                data = f.read()
+            os.utime(target)    # 修改时间作为磁盘上的最近使用时间
+            with self._lock:
+                self._stats['disk_hits'] += 1
+        except FileNotFoundError:
+            data = make_thumbnail(path, self.size)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target)
+            with self._lock:
+                self._stats['generated'] += 1
+                check = self._stats['generated'] % EVICT_EVERY == 0
+            if check:
+                self.evict()
+        self._remember(digest, data)
+        return data
+
+    def evict(self):
+        """磁盘缓存超过 max_bytes 时按最近使用时间从旧到新删除。"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.jpg'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self._stats['evicted'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_items'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['generated']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
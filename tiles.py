@@ -0,0 +1,314 @@
+"""
+超长图切分：公众号里的长图、信息图常见 1080×30000 像素以上，整张解码要占用几百 MB 内存，
+写成一页时阅读器显示也非常慢。高度超过宽度 TALL_RATIO 倍的图片按页高切成若干块，
+每块作为单独的一页。
+
+只有一部分图片能按行条带解码、内存中只保留一块的像素：
+
+- 非隔行的 8 位 PNG：边解压 IDAT 边取出各行的数据，每凑够一块就拼成一张小 PNG
+  （开头放上一块已还原的最后一行，供 Up / Paeth 等过滤方式参考）交给 Pillow 解码，
+  峰值内存只与块的大小有关，与图片总高度无关；
+- 其他格式（JPEG、WebP、GIF、隔行或 16 位 PNG，以及带 EXIF 方向需要转正的图片）
+  Pillow 无法从中间继续解码，只能整张解码一次，再逐块裁切。
+
+切分点选在每块末尾 SEARCH_RATIO 范围内内容最少的行（空白、纯色的分隔处），
+尽量不把文字拦腰切断。透明部分铺白底（与 normalize.py 相同），有损格式的块存为 JPEG，
+其余存为 PNG。结果按源文件的 sha256 缓存在 cache_dir 中，重复运行时直接复用。
+
+JPEG 块要重新编码（Pillow 不能在 DCT 系数上无损裁切）。源图是 JPEG 时切分点对齐到
+MCU 行（8 或 16 像素），各块沿用原图的量化表与色度抽样：块内的 8×8 DCT 块与原图一一对应，
+重新量化基本还原出原来的系数，体积也与原图相当。4:4:4 抽样几乎无损；4:2:0 的色度要
+重新抽样，仍有少量损失，但比按质量 95 重新编码更接近原图（按质量 95 编码的块还要大约一半）。
+有损 WebP、需要按 EXIF 转正的 JPEG 没有可以沿用的网格，按质量 JPEG_QUALITY（95）编码。
+"""
+import io
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageChops, ImageOps
+from PIL.JpegImagePlugin import get_sampling
+
+from img_cache import DEFAULT_CACHE_DIR
+from manifest import file_sha256
+from normalize import JPEG_QUALITY, flatten, is_lossless_webp
+from pdf_writer import ORIENTATION, exif_orientation
+
+DEFAULT_TILE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'tiles')
+TILE_VERSION = 3        # 切分规则变化时加一，旧的缓存结果自动失效
+TALL_RATIO = 3.0        # 高度超过宽度的这个倍数才切分
+TILE_RATIO = 1.5        # 每块的最大高度 / 宽度（比 A4 略高）
+SEARCH_RATIO = 0.25     # 在每块末尾这一比例的行中寻找切分点
+BLANK_ENERGY = 0.5      # 一行中相邻像素的平均差值不超过它就算空白行
+READ_CHUNK = 64 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}     # 颜色类型 -> 每个像素的字节数（8 位）
+
+
+def _png_chunk(ctype, data):
+    return struct.pack('>I', len(data)) + ctype + data + struct.pack('>I', zlib.crc32(ctype + data))
+
+
+def _png_header(path):
+    """可以按行流式解码的 PNG 返回 (宽, 高, 颜色类型)，否则返回 None。"""
+    with open(path, 'rb') as f:
+        head = f.read(29)
+        if len(head) < 29 or head[:8] != PNG_SIGNATURE or head[12:16] != b'IHDR':
+            return None
+        width, height, depth, color, _, _, interlace = struct.unpack('>IIBBBBB', head[16:29])
+        if depth != 8 or interlace or color not in PNG_CHANNELS or _png_orientation(f) != 1:
+            return None
+    return width, height, color
+
+
+def _png_orientation(f):
+    # 在 IDAT 之前的块中查找 eXIf，返回其中的方向；f 位于 IHDR 的 CRC 处
+    f.seek(4, os.SEEK_CUR)
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            return 1
+        length, ctype = struct.unpack('>I4s', head)
+        if ctype in (b'IDAT', b'IEND'):
+            return 1
+        if ctype == b'eXIf':
+            exif = Image.Exif()
+            try:
+                exif.load(f.read(length))
+            except Exception:
+                return 1
+            return exif.get(ORIENTATION, 1)
+        f.seek(length + 4, os.SEEK_CUR)
+
+
+class _PngRows:
+    """
+    按行流式读取非隔行的 8 位 PNG，read(n) 返回接下来 n 行解码后的图片。
+    压缩数据每次只读 READ_CHUNK 字节，解压结果只保留这 n 行需要的部分。
+    """
+
+    def __init__(self, f, width, height, color):
+        self.width, self.height, self._color = width, height, color
+        self._row_bytes = 1 + width * PNG_CHANNELS[color]
+        self._f = f
+        self._inflater = zlib.decompressobj()
+        self._buffer = bytearray()
+        self._last_row = None
+        self._rows_left = height
+        self.dpi = None
+        # IHDR 之后、IDAT 之前的块（调色板、透明色、DPI 等）原样放进每张小 PNG
+        self._chunks = []
+        f.seek(8)
+        while True:
+            length, ctype = struct.unpack('>I4s', f.read(8))
+            if ctype == b'IDAT':
+                self._idat_left = length
+                break
+            if ctype == b'IEND':
+                raise ValueError('PNG 没有图像数据')
+            data = f.read(length)
+            f.read(4)
+            if ctype == b'pHYs':
+                x, y, unit = struct.unpack('>IIB', data)
+                if unit == 1:   # 每米像素数
+                    self.dpi = (x * 0.0254, y * 0.0254)
+            if ctype != b'IHDR':
+                self._chunks.append(_png_chunk(ctype, data))
+
+    def _compressed(self):
+        # 当前 IDAT 读完后接着读下一个（跳过上一个的 CRC）
+        while not self._idat_left:
+            self._f.read(4)
+            length, ctype = struct.unpack('>I4s', self._f.read(8))
+            if ctype != b'IDAT':
+                raise ValueError('PNG 图像数据不完整')
+            self._idat_left = length
+        data = self._f.read(min(READ_CHUNK, self._idat_left))
+        if not data:
+            raise ValueError('PNG 文件不完整')
+        self._idat_left -= len(data)
+        return data
+
+    def _filtered(self, rows):
+        # 接下来 rows 行未还原的数据（每行开头一个过滤方式字节）
+        need = rows * self._row_bytes
+        while len(self._buffer) < need:
+            data = self._inflater.unconsumed_tail or self._compressed()
+            self._buffer += self._inflater.decompress(data, max(READ_CHUNK, need - len(self._buffer)))
+        data = bytes(self._buffer[:need])
+        del self._buffer[:need]
+        return data
+
+    def read(self, rows):
+        rows = min(rows, self._rows_left)
+        self._rows_left -= rows
+        data = self._filtered(rows)
+        height = rows
+        if self._last_row is not None:
+            data = b'\x00' + self._last_row + data
+            height += 1
+        ihdr = struct.pack('>IIBBBBB', self.width, height, 8, self._color, 0, 0, 0)
+        png = b''.join([PNG_SIGNATURE, _png_chunk(b'IHDR', ihdr), *self._chunks,
+                        _png_chunk(b'IDAT', zlib.compress(data, 0)), _png_chunk(b'IEND', b'')])
+        im = Image.open(io.BytesIO(png))
+        im.load()
+        if self._last_row is not None:
+            im = im.crop((0, 1, self.width, height))
+        self._last_row = im.crop((0, rows - 1, self.width, rows)).tobytes()
+        if len(self._last_row) != self._row_bytes - 1:
+            raise ValueError(f'无法按行解码 {im.mode} 模式的 PNG')
+        return im
+
+
+class _ImageRows:
+    """Pillow 无法按行继续解码的格式：第一次 read 时整张解码，之后逐块裁切。"""
+
+    def __init__(self, im):
+        if getattr(im, 'is_animated', False):
+            im.seek(0)
+        self.dpi = im.info.get('dpi')
+        orientation = exif_orientation(im)
+        if orientation != 1:
+            # 切出的块不带 EXIF，先整张转正
+            im = ImageOps.exif_transpose(im)
+            if orientation >= 5 and self.dpi:
+                self.dpi = self.dpi[::-1]
+        self._im = im
+        self.width, self.height = im.size
+        self._top = 0
+
+    def read(self, rows):
+        bottom = min(self.height, self._top + rows)
+        band = self._im.crop((0, self._top, self.width, bottom))
+        self._top = bottom
+        return band
+
+
+def _cut_row(im, start, top=0, align=1):
+    """
+    在 im 的 start 行之后找切分位置：取最靠下的空白行，没有空白行时取内容最少的行，
+    返回切分后上一块的高度。im 的第一行是原图的第 top 行；align 大于 1 时只在
+    原图中 align 的整数倍处切分（JPEG 的 MCU 边界），范围内没有这样的行时不限制。
+    """
+    width, height = im.size
+    band = im.crop((0, start, width, height)).convert('L')
+    edges = ImageChops.difference(band, ImageChops.offset(band, 1, 0))
+    energy = np.asarray(edges.convert('F').resize((1, height - start), Image.Resampling.BOX)).ravel()
+    rows = [i for i in range(len(energy)) if (top + start + i + 1) % align == 0] or range(len(energy))
+    blank = [i for i in rows if energy[i] <= BLANK_ENERGY]
+    row = blank[-1] if blank else min(rows, key=lambda i: (energy[i], -i))
+    return start + row + 1
+
+
+def _tiles(rows, tile_height, search, align=1):
+    """从行来源中依次切出各块（已铺白底），每块不高于 tile_height；切分点见 _cut_row。"""
+    pending = None
+    consumed = 0
+    top = 0         # pending 第一行在原图中的位置
+    while True:
+        have = pending.size[1] if pending is not None else 0
+        band = flatten(rows.read(tile_height - have))
+        consumed += band.size[1]
+        if pending is None:
+            pending = band
+        else:
+            stacked = Image.new(pending.mode, (rows.width, have + band.size[1]))
+            stacked.paste(pending, (0, 0))
+            stacked.paste(band.convert(pending.mode), (0, have))
+            pending = stacked
+        if consumed >= rows.height:
+            yield pending
+            return
+        cut = _cut_row(pending, tile_height - search, top, align)
+        yield pending.crop((0, 0, rows.width, cut))
+        pending = pending.crop((0, cut, rows.width, tile_height))
+        top += cut
+
+
+def split_tall(path, cache_dir=DEFAULT_TILE_DIR):
+    """
+    返回切分后各块的路径（按从上到下的顺序）；不够长的图片返回 [path]。
+    只有非隔行的 8 位 PNG 是流式解码的；JPEG、WebP、GIF、隔行或 16 位 PNG 仍要整张解码，
+    峰值内存与整张图片相同，切分只减轻写入 PDF 与阅读器显示的负担。
+    """
+    png = _png_header(path)
+    jpeg = {}       # 沿用原图编码参数时 JPEG 块的保存选项
+    align = 1
+    if png:
+        width, height, fmt = png[0], png[1], 'PNG'
+    else:
+        with Image.open(path) as im:
+            (width, height), fmt = im.size, im.format
+            orientation = exif_orientation(im)
+            if orientation >= 5:
+                width, height = height, width
+            if fmt == 'JPEG' and orientation == 1 and im.mode in ('L', 'RGB'):
+                jpeg['qtables'] = im.quantization
+                sampling = get_sampling(im)
+                if sampling != -1:
+                    jpeg['subsampling'] = sampling
+                # 4:2:0 抽样的 MCU 高 16 像素，其余 8 像素
+                align = 16 if sampling in (-1, 2) and im.mode == 'RGB' else 8
+    if height <= width * TALL_RATIO:
+        return [path]
+
+    digest = file_sha256(path)
+    target = os.path.join(cache_dir, digest[:2], f'{digest}-v{TILE_VERSION}')
+    if not os.path.isdir(target):
+        lossy = fmt == 'JPEG' or (fmt == 'WEBP' and not is_lossless_webp(path))
+        ext = '.jpg' if lossy else '.png'
+        tile_height = max(1, int(width * TILE_RATIO))
+        search = max(1, int(tile_height * SEARCH_RATIO))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(target), suffix='.part')
+        try:
+            with open(path, 'rb') as f:
+                # PNG 不经过 Image.open，超过 Pillow 像素上限的长图也能处理
+                rows = _PngRows(f, width, height, png[2]) if png else _ImageRows(Image.open(f))
+                options = {'dpi': rows.dpi} if rows.dpi else {}
+                for i, tile in enumerate(_tiles(rows, tile_height, search, align), 1):
+                    name = os.path.join(tmp, f'{i:04d}{ext}')
+                    if jpeg:
+                        tile.save(name, 'JPEG', **jpeg, **options)
+                    elif lossy:
+                        tile.save(name, 'JPEG', quality=JPEG_QUALITY, **options)
+                    else:
+                        # 只是中间结果，写 PDF 时还会重新压缩，这里用最快的压缩级别
+                        tile.save(name, 'PNG', compress_level=1, **options)
+            try:
+                os.rename(tmp, target)
+            except OSError:
+                # 另一个进程已经切好了同一张图片
+                if not os.path.isdir(target):
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return [os.path.join(target, name) for name in sorted(os.listdir(target))]
+
+
+def _split_or_keep(path, cache_dir):
+    # 切分失败时保留原图，整张作为一页
+    try:
+        return split_tall(path, cache_dir)
+    except Exception as e:
+        print(f'无法切分长图 {path}: {e}')
+        return [path]
+
+
+def split_images(img_paths, processes=None, cache_dir=DEFAULT_TILE_DIR, pool=None):
+    """
+    并行切分一组图片，返回与 img_paths 一一对应的路径列表（不需要切分的图片为 [原路径]）。
+    processes 为 1 时在当前进程内处理；传入 pool 时复用已有的进程池。
+    """
+    if not img_paths:
+        return []
+    if pool is not None:
+        return list(pool.map(_split_or_keep, img_paths, [cache_dir] * len(img_paths)))
+    if processes == 1 or len(img_paths) == 1:
+        return [_split_or_keep(path, cache_dir) for path in img_paths]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_split_or_keep, img_paths, [cache_dir] * len(img_paths)))
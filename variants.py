@@ -0,0 +1,190 @@
+"""
+按配置改写 mmbiz 图片地址，请求更小的格式或宽度，减少下载量。
+
+公众号图片 CDN 的地址形如 https://mmbiz.qpic.cn/mmbiz_png/<id>/640?wx_fmt=png&tp=webp：
+路径最后一段是宽度（0 为原图，640 等为按宽度缩小的版本），wx_fmt 为图片格式，
+tp=webp 时返回 WebP。只改写 MMBIZ_HOSTS 上的地址（res.wx.qq.com 等其他主机的
+/mmbizappmsg/ 路径不是图片 CDN）。变体下载失败（HTTP 错误、内容不是可以解码的图片）
+时自动改用原地址。
+
+- original：不改写；
+- webp：原尺寸的 WebP，保留透明度，传输量最少；
+- jpeg：GIF 改为 JPEG（PNG 可能带透明度，保持原格式）；
+- screen：最宽 640 像素的 WebP，适合屏幕阅读。
+
+页面尺寸按实际下载到的像素计算，缩小宽度的变体生成的 PDF 页面也相应变小。
+"""
+import os
+import threading
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from PIL import Image
+
+from downloader import download_one, fetch
+from probe import _total_size
+
+Variant = namedtuple('Variant', ['name', 'width', 'fmt'])
+
+MMBIZ_HOSTS = ('mmbiz.qpic.cn', 'mmbiz.qlogo.cn')
+
+VARIANTS = {
+    'original': Variant('original', None, None),
+    'webp': Variant('webp', None, 'webp'),
+    'jpeg': Variant('jpeg', None, 'jpeg'),
+    'screen': Variant('screen', 640, 'webp'),
+}
+
+
+def get_variant(variant):
+    if variant is None or isinstance(variant, Variant):
+        return variant
+    return VARIANTS[variant]
+
+
+def make_policy(variant, cache=None, prober=None):
+    """
+    variant 为变体名；None 或 'original' 时不改写，返回 None。
+    variant 已经是 VariantPolicy 时直接使用（例如基准测试中改写模拟服务器的地址）。
+    """
+    if isinstance(variant, VariantPolicy):
+        return variant
+    if variant is None or get_variant(variant).name == 'original':
+        return None
+    return VariantPolicy(variant, cache=cache, prober=prober)
+
+
+def describe(summary):
+    """变体统计的一行说明。"""
+    text = f"变体 {summary['variant']}：{summary['images']} 张"
+    if summary['fallbacks']:
+        text += f"，{summary['fallbacks']} 张退回原图"
+    if summary['measured']:
+        text += (f"，原图 {summary['bytes_original'] / 1024 ** 2:.1f} MB → "
+                 f"{summary['bytes_measured'] / 1024 ** 2:.1f} MB，节省 {summary['saved_ratio']:.0%}")
+    return text
+
+
+def variant_url(url, variant, hosts=MMBIZ_HOSTS):
+    """按 variant 改写 mmbiz 图片地址；不是 hosts 上的 mmbiz 地址或不需要改写时原样返回。"""
+    variant = get_variant(variant)
+    if variant is None or (variant.width is None and variant.fmt is None):
+        return url
+    parsed = urlparse(url)
+    if parsed.hostname not in hosts:
+        return url
+    parts = parsed.path.strip('/').split('/')
+    # 路径为 /mmbiz_<格式>/<id>[/<宽度>]，新地址也有 /sz_mmbiz_<格式>/ 的形式
+    if len(parts) < 2 or 'mmbiz' not in parts[0]:
+        return url
+    source_fmt = parts[0].rsplit('_', 1)[-1]
+    query = dict(parse_qsl(parsed.query))
+
+    if variant.width:
+        if len(parts) >= 3 and parts[-1].isdigit():
+            width = int(parts[-1])
+            # 0 是原图；已经比上限窄的版本不再改
+            if width == 0 or width > variant.width:
+                parts[-1] = str(variant.width)
+        else:
+            parts.append(str(variant.width))
+    if variant.fmt == 'webp':
+        query['tp'] = 'webp'
+    elif variant.fmt == 'jpeg' and source_fmt == 'gif':
+        query['wx_fmt'] = 'jpeg'
+        query.pop('tp', None)
+
+    new = parsed._replace(path='/' + '/'.join(parts), query=urlencode(query))
+    return urlunparse(new)
+
+
+def _check_image(path):
+    # CDN 不支持某个变体时可能返回错误页面或残缺的数据
+    with Image.open(path) as im:
+        im.size
+
+
+class VariantPolicy:
+    """
+    下载 mmbiz 图片时先请求变体，失败时退回原地址，并统计节省的字节数。
+    原图大小取自探测结果（prober 为 Prober 时，跳过小图标时已经探测过，不再请求；
+    或 cache 中持久化的探测结果，见 probe.py）；都没有时只统计下载量，
+    measure 为 True 时才额外发一个 1 字节的 Range 请求读取（请求数翻倍，默认不读）。
+    退回原图的图片按原图大小计入，失败的变体下载量也算在内（节省为负）。
+    每篇文章用一个新的 VariantPolicy，summary() 即为这篇文章的统计。
+    """
+
+    def __init__(self, variant='screen', measure=False, cache=None, prober=None, hosts=MMBIZ_HOSTS):
+        self.variant = get_variant(variant)
+        self.measure = measure
+        self.cache = cache
+        self.prober = prober
+        self.hosts = hosts
+        self._lock = threading.Lock()
+        self.stats = {'images': 0, 'fallbacks': 0, 'bytes_downloaded': 0,
+                      'measured': 0, 'bytes_measured': 0, 'bytes_original': 0}
+
+    def _count(self, **counts):
+        with self._lock:
+            for key, n in counts.items():
+                self.stats[key] += n
+
+    def rewrite(self, url):
+        return variant_url(url, self.variant, self.hosts)
+
+    def original_size(self, sessions, url, throttler=None, retry=None):
+        """原图的字节数，没有探测结果且 measure 为 False 时返回 None。"""
+        if self.prober is not None:
+            return self.prober.probe(sessions, url, throttler, retry).size
+        probed = self.cache.lookup_probe(url) if self.cache is not None else None
+        if probed and probed['size']:
+            return probed['size']
+        if not self.measure:
+            return None
+        resp = fetch(sessions, url, throttler, retry, stream=True, headers={'Range': 'bytes=0-0'})
+        try:
+            return _total_size(resp)
+        finally:
+            resp.close()
+
+    def download(self, sessions, idx, url, folder, throttler=None, retry=None, cache=None):
+        """下载 url 的变体，失败时下载原地址，返回值与 downloader.download_one 相同。"""
+        variant = self.rewrite(url)
+        if variant == url:
+            return download_one(sessions, idx, url, folder, throttler, retry, cache)
+        wasted = 0
+        try:
+            result = download_one(sessions, idx, variant, folder, throttler, retry, cache)
+            try:
+                _check_image(result[0])
+            except Exception:
+                wasted = result[1]
+                os.remove(result[0])
+                raise
+        except Exception as e:
+            # 变体的任何错误都退回原地址；原地址再失败时按正常的下载失败处理
+            print(f'变体下载失败，改用原地址 {url}: {e}')
+            result = download_one(sessions, idx, url, folder, throttler, retry, cache)
+            size = wasted + result[1]
+            self._count(images=1, fallbacks=1, bytes_downloaded=size,
+                        measured=1, bytes_measured=size, bytes_original=result[1])
+            return result
+
+        size = result[1]
+        self._count(images=1, bytes_downloaded=size)
+        try:
+            original = self.original_size(sessions, url, throttler, retry)
+        except Exception as e:
+            print(f'无法读取原图大小 {url}: {e}')
+            original = None
+        if original:
+            self._count(measured=1, bytes_measured=size, bytes_original=original)
+        return result
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        saved = stats['bytes_original'] - stats['bytes_measured']
+        stats.update(variant=self.variant.name if self.variant else 'original', bytes_saved=saved,
+                     saved_ratio=round(saved / stats['bytes_original'], 4) if stats['bytes_original'] else 0.0)
+        return stats